@@ -0,0 +1,333 @@
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# Configuration
+# ==============================
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_FOLDER = os.path.join(SCRIPT_DIR, "data")
+BOUNDARY_FILE = os.path.join(DATA_FOLDER, "philippines_Barangay_level_4.geojson")
+CACHE_FOLDER = os.path.join(DATA_FOLDER, "cache")
+
+NAME_PROPERTY = "shape4"        # Barangay name
+MUNICIPALITY_PROPERTY = "shape3"
+PCODE_PROPERTY = "adm4_pcode"
+
+TARGET_FEATURES_PER_CELL = 0.25  # Grid is sized so most cells overlap only a few bounding boxes
+MAX_GRID_CELLS = 4_000_000
+MAX_TEST_ELEMENTS = 4_000_000    # points x edges evaluated per ray-casting chunk
+EDGES_PER_BAND = 16              # Detailed polygons are split into latitude bands of ~this many edges
+MAX_BANDS = 512
+
+
+def normalize_barangay_name(names):
+    """Uppercase/trim names the way the spreadsheets write them ("SAN JOSE")"""
+    return pd.Series(names, copy=False).astype("string").str.strip().str.upper()
+
+
+class BarangayIndex:
+    """Vectorized point-in-polygon lookup over the barangay boundary polygons
+
+    Polygons are flattened into one edge table; a uniform grid over the
+    polygons' bounding boxes narrows every point down to a few candidate
+    barangays, and the even-odd ray-casting test then runs as numpy array
+    operations per candidate barangay.
+    """
+
+    def __init__(self, arrays: dict):
+        self.names = arrays["names"]
+        self.municipalities = arrays["municipalities"]
+        self.pcodes = arrays["pcodes"]
+        self.bboxes = arrays["bboxes"]              # (n_features, 4): minx, miny, maxx, maxy
+        self.areas = arrays["areas"]
+        self.edges = arrays["edges"]                # (n_edges, 4): x1, y1, x2, y2
+        self.edge_offsets = arrays["edge_offsets"]  # feature i owns edges[edge_offsets[i]:edge_offsets[i+1]]
+        self.grid_origin = arrays["grid_origin"]    # minx, miny
+        self.grid_shape = arrays["grid_shape"]      # nx, ny
+        self.cell_size = float(arrays["cell_size"][0])
+        self.cell_offsets = arrays["cell_offsets"]
+        self.cell_features = arrays["cell_features"]
+
+    # ======================================================
+    # BUILD / CACHE
+    # ======================================================
+    @classmethod
+    def build(cls, geojson_path: str = BOUNDARY_FILE) -> "BarangayIndex":
+        """Flatten polygons and build the bounding-box grid"""
+        with open(geojson_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls.from_geojson(data, source=geojson_path)
+
+    @classmethod
+    def from_geojson(cls, data: dict, source: str = "GeoJSON data") -> "BarangayIndex":
+        """Build from an already-loaded FeatureCollection (e.g. decoded simplified boundaries)"""
+        names, municipalities, pcodes, bboxes, areas = [], [], [], [], []
+        edge_chunks, edge_counts = [], []
+
+        for feat in data["features"]:
+            geometry = feat.get("geometry") or {}
+            if geometry.get("type") == "Polygon":
+                polygons = [geometry["coordinates"]]
+            elif geometry.get("type") == "MultiPolygon":
+                polygons = geometry["coordinates"]
+            else:
+                continue
+
+            feature_edges = []
+            area = 0.0
+            for polygon in polygons:
+                for ring_index, ring in enumerate(polygon):
+                    ring = np.asarray(ring, dtype=np.float64)[:, :2]
+                    if len(ring) < 3:
+                        continue
+                    if not np.array_equal(ring[0], ring[-1]):
+                        ring = np.vstack([ring, ring[:1]])
+                    feature_edges.append(np.hstack([ring[:-1], ring[1:]]))
+                    # Shoelace area (holes subtract)
+                    ring_area = 0.5 * abs(np.dot(ring[:-1, 0], ring[1:, 1]) - np.dot(ring[1:, 0], ring[:-1, 1]))
+                    area += ring_area if ring_index == 0 else -ring_area
+
+            if not feature_edges:
+                continue
+
+            edges = np.vstack(feature_edges)
+            properties = feat.get("properties") or {}
+            names.append(str(properties.get(NAME_PROPERTY) or ""))
+            municipalities.append(str(properties.get(MUNICIPALITY_PROPERTY) or ""))
+            pcodes.append(str(properties.get(PCODE_PROPERTY) or ""))
+            bboxes.append([edges[:, [0, 2]].min(), edges[:, [1, 3]].min(), edges[:, [0, 2]].max(), edges[:, [1, 3]].max()])
+            areas.append(area)
+            edge_chunks.append(edges)
+            edge_counts.append(len(edges))
+
+        if not edge_chunks:
+            raise ValueError(f"No polygons found in {source}")
+
+        bboxes = np.asarray(bboxes, dtype=np.float64)
+        arrays = {
+            "names": np.asarray(names, dtype=str),
+            "municipalities": np.asarray(municipalities, dtype=str),
+            "pcodes": np.asarray(pcodes, dtype=str),
+            "bboxes": bboxes,
+            "areas": np.asarray(areas, dtype=np.float64),
+            "edges": np.vstack(edge_chunks),
+            "edge_offsets": np.concatenate([[0], np.cumsum(edge_counts)]).astype(np.int64),
+        }
+        arrays.update(cls._build_grid(bboxes))
+        return cls(arrays)
+
+    @staticmethod
+    def _build_grid(bboxes: np.ndarray) -> dict:
+        """Uniform grid; each cell lists the features whose bounding box overlaps it"""
+        minx, miny = bboxes[:, 0].min(), bboxes[:, 1].min()
+        maxx, maxy = bboxes[:, 2].max(), bboxes[:, 3].max()
+        width, height = max(maxx - minx, 1e-9), max(maxy - miny, 1e-9)
+
+        n_cells = min(MAX_GRID_CELLS, max(1, int(len(bboxes) / TARGET_FEATURES_PER_CELL)))
+        cell_size = max(np.sqrt(width * height / n_cells), 1e-9)
+        nx, ny = int(np.ceil(width / cell_size)) or 1, int(np.ceil(height / cell_size)) or 1
+
+        x0 = np.clip(((bboxes[:, 0] - minx) / cell_size).astype(np.int64), 0, nx - 1)
+        x1 = np.clip(((bboxes[:, 2] - minx) / cell_size).astype(np.int64), 0, nx - 1)
+        y0 = np.clip(((bboxes[:, 1] - miny) / cell_size).astype(np.int64), 0, ny - 1)
+        y1 = np.clip(((bboxes[:, 3] - miny) / cell_size).astype(np.int64), 0, ny - 1)
+
+        cell_ids, feature_ids = [], []
+        for fid in range(len(bboxes)):
+            xs, ys = np.meshgrid(np.arange(x0[fid], x1[fid] + 1), np.arange(y0[fid], y1[fid] + 1))
+            cells = (ys * nx + xs).ravel()
+            cell_ids.append(cells)
+            feature_ids.append(np.full(len(cells), fid, dtype=np.int64))
+
+        cell_ids = np.concatenate(cell_ids)
+        feature_ids = np.concatenate(feature_ids)
+        order = np.argsort(cell_ids, kind="stable")
+        counts = np.bincount(cell_ids, minlength=nx * ny)
+
+        return {
+            "grid_origin": np.array([minx, miny]),
+            "grid_shape": np.array([nx, ny], dtype=np.int64),
+            "cell_size": np.array([cell_size]),
+            "cell_offsets": np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            "cell_features": feature_ids[order],
+        }
+
+    def save(self, cache_path: str):
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = cache_path + ".tmp.npz"
+        np.savez(tmp_path, **{key: value for key, value in vars(self).items() if isinstance(value, np.ndarray)},
+                 cell_size=np.array([self.cell_size]))
+        os.replace(tmp_path, cache_path)
+
+    @classmethod
+    def load(cls, cache_path: str) -> "BarangayIndex":
+        with np.load(cache_path, allow_pickle=False) as cached:
+            return cls({key: cached[key] for key in cached.files})
+
+    # ======================================================
+    # QUERIES
+    # ======================================================
+    def locate(self, lat, lon) -> np.ndarray:
+        """Return the feature index containing each point (-1 where none)"""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        result = np.full(len(lat), -1, dtype=np.int64)
+        if len(lat) == 0:
+            return result
+
+        # 1. Grid cell of every point
+        nx, ny = self.grid_shape
+        cx = np.floor((lon - self.grid_origin[0]) / self.cell_size)
+        cy = np.floor((lat - self.grid_origin[1]) / self.cell_size)
+        inside_grid = (cx >= 0) & (cx < nx) & (cy >= 0) & (cy < ny)
+        point_ids = np.flatnonzero(inside_grid)
+        cells = (cy[point_ids] * nx + cx[point_ids]).astype(np.int64)
+
+        # 2. Expand (point, candidate feature) pairs from the cell lists (CSR gather)
+        starts = self.cell_offsets[cells]
+        counts = self.cell_offsets[cells + 1] - starts
+        pair_points = np.repeat(point_ids, counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_features = self.cell_features[np.repeat(starts, counts) + within]
+
+        # 3. Exact bounding-box filter
+        bbox = self.bboxes[pair_features]
+        px, py = lon[pair_points], lat[pair_points]
+        keep = (px >= bbox[:, 0]) & (px <= bbox[:, 2]) & (py >= bbox[:, 1]) & (py <= bbox[:, 3])
+        pair_points, pair_features = pair_points[keep], pair_features[keep]
+        if len(pair_points) == 0:
+            return result
+
+        # 4. Ray casting per candidate feature; larger features first so that the
+        #    smallest containing polygon wins where boundaries overlap
+        order = np.lexsort((pair_points, -self.areas[pair_features]))
+        pair_points, pair_features = pair_points[order], pair_features[order]
+        boundaries = np.flatnonzero(np.diff(pair_features)) + 1
+        for group in np.split(np.arange(len(pair_features)), boundaries):
+            fid = pair_features[group[0]]
+            points = pair_points[group]
+            inside = self._contains(fid, lon[points], lat[points])
+            result[points[inside]] = fid
+
+        return result
+
+    def _contains(self, fid: int, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Even-odd rule over every ring of the feature (holes included)
+
+        Detailed polygons are cut into horizontal bands so each point is only
+        tested against the edges that span its latitude.
+        """
+        edges = self.edges[self.edge_offsets[fid]:self.edge_offsets[fid + 1]]
+        n_bands = min(MAX_BANDS, len(edges) // EDGES_PER_BAND)
+        if n_bands <= 1:
+            return self._ray_cast(edges, x, y)
+
+        ymin, ymax = self.bboxes[fid, 1], self.bboxes[fid, 3]
+        band_height = max((ymax - ymin) / n_bands, 1e-12)
+        point_band = np.clip(((y - ymin) / band_height).astype(np.int64), 0, n_bands - 1)
+        edge_low = np.clip(((np.minimum(edges[:, 1], edges[:, 3]) - ymin) / band_height).astype(np.int64), 0, n_bands - 1)
+        edge_high = np.clip(((np.maximum(edges[:, 1], edges[:, 3]) - ymin) / band_height).astype(np.int64), 0, n_bands - 1)
+
+        inside = np.zeros(len(x), dtype=bool)
+        order = np.argsort(point_band, kind="stable")
+        bands, starts = np.unique(point_band[order], return_index=True)
+        for band, group in zip(bands, np.split(order, starts[1:])):
+            band_edges = edges[(edge_low <= band) & (edge_high >= band)]
+            inside[group] = self._ray_cast(band_edges, x[group], y[group])
+        return inside
+
+    @staticmethod
+    def _ray_cast(edges: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        inside = np.zeros(len(x), dtype=bool)
+        if len(edges) == 0:
+            return inside
+        x1, y1, x2, y2 = edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = (x2 - x1) / (y2 - y1)
+
+        chunk = max(1, MAX_TEST_ELEMENTS // len(edges))
+        for start in range(0, len(x), chunk):
+            px = x[start:start + chunk, None]
+            py = y[start:start + chunk, None]
+            straddles = (y1 > py) != (y2 > py)
+            crossings = straddles & (px < x1 + (py - y1) * slope)
+            inside[start:start + chunk] = (crossings.sum(axis=1) % 2) == 1
+        return inside
+
+    def assign_names(self, lat, lon) -> pd.Series:
+        """Barangay name (uppercased) for each point, <NA> where no polygon contains it"""
+        fids = self.locate(lat, lon)
+        names = pd.Series(pd.NA, index=range(len(fids)), dtype="string")
+        found = fids >= 0
+        names[found] = normalize_barangay_name(self.names[fids[found]]).to_numpy()
+        return names
+
+    def resolve(self, barangay, lat, lon) -> pd.Series:
+        """Polygon-derived name where available, otherwise the given column value"""
+        original = pd.Series(barangay, copy=False)
+        assigned = self.assign_names(lat, lon)
+        assigned.index = original.index
+        return assigned.fillna(original.astype("string"))
+
+    def validate(self, barangay, lat, lon) -> pd.DataFrame:
+        """Compare a barangay column against the polygons containing the points
+
+        Returns a frame with the given name, the polygon name and a 'status'
+        of 'match', 'mismatch' or 'outside' (no polygon contains the point).
+        """
+        original = normalize_barangay_name(barangay)
+        assigned = self.assign_names(lat, lon)
+        assigned.index = original.index
+        same = (assigned == original).fillna(False).to_numpy(dtype=bool)
+        status = np.where(assigned.isna().to_numpy(), "outside", np.where(same, "match", "mismatch"))
+        return pd.DataFrame({"barangay": original, "polygon_barangay": assigned, "status": status})
+
+
+# ==============================
+# Cached loader
+# ==============================
+_index_cache = {}
+
+
+def _cache_path(geojson_path: str) -> str:
+    stat = os.stat(geojson_path)
+    key = f"{os.path.abspath(geojson_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(CACHE_FOLDER, f"barangay_index_{digest}.npz")
+
+
+def get_barangay_index(geojson_path: str = BOUNDARY_FILE):
+    """Load the index once per process, from the on-disk cache when it is current
+
+    Returns None if the boundary file is missing so callers can fall back to
+    the spreadsheet's barangay column.
+    """
+    if geojson_path in _index_cache:
+        return _index_cache[geojson_path]
+    if not os.path.exists(geojson_path):
+        logger.warning(f"Barangay boundary file not found: {geojson_path}")
+        return None
+
+    cache_path = _cache_path(geojson_path)
+    index = None
+    if os.path.exists(cache_path):
+        try:
+            index = BarangayIndex.load(cache_path)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable barangay index cache: {e}")
+
+    if index is None:
+        index = BarangayIndex.build(geojson_path)
+        try:
+            index.save(cache_path)
+        except OSError as e:
+            logger.warning(f"Could not cache barangay index: {e}")
+
+    _index_cache[geojson_path] = index
+    return index
@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from metrics import emit_metric
+from supabase_io import set_default_io
+from local_supabase import LocalSupabase, local_io, local_bucket
+
+# ==============================
+# Supabase I/O benchmarks (offline)
+# ==============================
+# Runs the three I/O paths against local_supabase's stand-in, once per
+# concurrency limit, under the same simulated network:
+#
+#   fetch    export_geojson.fetch_all_data            (paged select)
+#   upsert   cleaning2.ExcelToSupabase.upsert_data    (batched upsert, bisecting bad rows)
+#   upload   mobile_cluster_fetch.publish_artifacts   (objects + .gz variants + manifest)
+#
+#   python benchmark_io.py                                     # 40 ms latency, 50 Mbit/s
+#   python benchmark_io.py --latency 80 --error-rate 0.02      # flaky link
+#   python benchmark_io.py --concurrency 1,2,4,8,16 --rows 50000
+#
+# Each run starts from a fresh stand-in and checks the result (rows fetched /
+# stored, objects published), so a faster strategy that loses data shows up
+# as ok=False rather than as a win.
+TABLE_NAME = "road_traffic_accident"
+BUCKET_NAME = "geojson"
+BARANGAYS = ["Poblacion", "San Isidro", "San Jose", "Santo Niño", "Bagong Silang", "Dolores"]
+OFFENSES = ["Reckless Imprudence Resulting in Damage to Property",
+            "Reckless Imprudence Resulting in Physical Injury",
+            "Reckless Imprudence Resulting in Homicide"]
+SEVERITIES = ["Minor", "Serious", "Critical"]
+INVALID_SEVERITY = "__invalid__"  # Rows carrying this are rejected by the stand-in
+
+
+def synthetic_rows(count: int, invalid: int = 0, seed: int = 0):
+    """Rows shaped like road_traffic_accident (unique on the natural key), `invalid` of them rejected"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        rows.append({
+            "barangay": rng.choice(BARANGAYS),
+            "lat": round(15.0 + rng.random() * 0.2, 6),
+            "lng": round(120.6 + rng.random() * 0.2, 6),
+            "datecommitted": f"{2016 + i % 9}-{1 + i % 12:02d}-{1 + i % 28:02d}",
+            "timecommitted": f"{i % 24:02d}:{i % 60:02d}:00",
+            "offensetype": rng.choice(OFFENSES),
+            "severity": rng.choice(SEVERITIES),
+            "year": 2016 + i % 9,
+        })
+    for position in rng.sample(range(count), invalid):
+        rows[position]["severity"] = INVALID_SEVERITY
+    return rows
+
+
+def _reject_invalid(row):
+    if row.get("severity") == INVALID_SEVERITY:
+        return f'invalid input value for enum severity_level: "{INVALID_SEVERITY}"'
+    return None
+
+
+def _network(args, root):
+    return LocalSupabase(root=root, latency_ms=args.latency, jitter_ms=args.jitter, bandwidth_mbps=args.bandwidth,
+                         error_rate=args.error_rate, timeout_rate=args.timeout_rate, reject_row=_reject_invalid,
+                         seed=args.seed)
+
+
+def bench_fetch(args, concurrency, root):
+    import export_geojson
+    rows = synthetic_rows(args.rows, seed=args.seed)
+    transport = _network(args, root)
+    transport.seed_rows(TABLE_NAME, rows)
+    set_default_io(local_io(transport, concurrency))
+
+    started = time.perf_counter()
+    fetched = export_geojson.fetch_all_data()
+    elapsed = time.perf_counter() - started
+    return transport, elapsed, len(fetched) == len(rows) and len({row["id"] for row in fetched}) == len(rows)
+
+
+def bench_upsert(args, concurrency, root):
+    import cleaning2
+    rows = synthetic_rows(args.rows, invalid=args.invalid_rows, seed=args.seed)
+    transport = _network(args, root)
+    importer = cleaning2.ExcelToSupabase(None, None, db=local_io(transport, concurrency))
+    importer.update_rollup_cube = lambda: None  # Synthetic rows must not reach the dashboard cube
+    cleaning2.REJECTS_FILE = os.path.join(root, "upload_rejects.jsonl")
+
+    started = time.perf_counter()
+    importer.upsert_data(TABLE_NAME, rows)
+    elapsed = time.perf_counter() - started
+    stored = transport.row_count(TABLE_NAME)
+    return transport, elapsed, stored == len(rows) - args.invalid_rows and len(importer.rejects) == args.invalid_rows
+
+
+def bench_upload(args, concurrency, root):
+    import mobile_cluster_fetch
+    data_folder = os.path.join(root, "artifacts")
+    os.makedirs(data_folder)
+    rng = random.Random(args.seed)
+    artifacts = []
+    for i in range(args.files):
+        name = f"shards/{i:04d}.json"
+        os.makedirs(os.path.dirname(os.path.join(data_folder, name)), exist_ok=True)
+        with open(os.path.join(data_folder, name), "w", encoding="utf-8") as f:
+            json.dump({"features": [rng.random() for _ in range(args.file_kb * 50)]}, f)
+        artifacts.append((name, "application/json"))
+
+    transport = _network(args, root)
+    bucket = local_bucket(transport, BUCKET_NAME, concurrency)
+    upload_workers = mobile_cluster_fetch.MAX_UPLOAD_WORKERS
+    mobile_cluster_fetch.MAX_UPLOAD_WORKERS = concurrency
+    try:
+        started = time.perf_counter()
+        try:
+            published = mobile_cluster_fetch.publish_artifacts(bucket, artifacts=artifacts, data_folder=data_folder,
+                                                               manifest_file=os.path.join(root, "manifest.json"))
+        except mobile_cluster_fetch.PublishError:
+            published = []
+        elapsed = time.perf_counter() - started
+    finally:
+        mobile_cluster_fetch.MAX_UPLOAD_WORKERS = upload_workers
+    return transport, elapsed, len(published) == len(artifacts)
+
+
+BENCHMARKS = {"fetch": bench_fetch, "upsert": bench_upsert, "upload": bench_upload}
+
+
+def run(args):
+    results = []
+    for name in args.paths:
+        for concurrency in args.concurrency:
+            root = tempfile.mkdtemp(prefix=f"benchmark_io_{name}_")
+            try:
+                transport, elapsed, ok = BENCHMARKS[name](args, concurrency, root)
+            finally:
+                shutil.rmtree(root, ignore_errors=True)
+            result = {
+                "path": name,
+                "concurrency": concurrency,
+                "wall_s": round(elapsed, 3),
+                "requests": len(transport.requests),
+                "failed_requests": sum(1 for *_, status in transport.requests if status == "timeout" or status >= 400),
+                "mb_sent": round(transport.bytes_sent / 1e6, 2),
+                "mb_received": round(transport.bytes_received / 1e6, 2),
+                "ok": ok,
+            }
+            emit_metric("benchmark_io", **result)
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Supabase I/O paths against a local stand-in")
+    parser.add_argument("--paths", default="fetch,upsert,upload", type=lambda value: value.split(","),
+                        help="Comma-separated subset of: fetch, upsert, upload")
+    parser.add_argument("--concurrency", default="1,4,8", type=lambda value: [int(v) for v in value.split(",")],
+                        help="Comma-separated concurrency limits to compare")
+    parser.add_argument("--rows", type=int, default=20000, help="Rows for fetch / upsert")
+    parser.add_argument("--invalid-rows", type=int, default=3, help="Upsert rows the database rejects")
+    parser.add_argument("--files", type=int, default=40, help="Objects for upload")
+    parser.add_argument("--file-kb", type=int, default=100, help="Approximate size of each object (KB)")
+    parser.add_argument("--latency", type=float, default=40.0, help="Round-trip latency (ms)")
+    parser.add_argument("--jitter", type=float, default=10.0, help="Latency jitter (ms)")
+    parser.add_argument("--bandwidth", type=float, default=50.0, help="Shared link bandwidth (Mbit/s, 0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered 503")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Share of requests that time out")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'path':<8}{'conc':>6}{'wall_s':>10}{'requests':>10}{'failed':>8}{'MB out':>9}{'MB in':>9}  ok")
+    for result in run(args):
+        print(f"{result['path']:<8}{result['concurrency']:>6}{result['wall_s']:>10}{result['requests']:>10}"
+              f"{result['failed_requests']:>8}{result['mb_sent']:>9}{result['mb_received']:>9}  {result['ok']}")
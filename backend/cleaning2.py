@@ -1,9 +1,19 @@
+import numpy as np
 import pandas as pd
-from supabase import create_client, Client
+from supabase_io import SupabaseIO, SupabaseError
 import os
+import json
 from dotenv import load_dotenv
 import logging
 from typing import Dict, List, Any
+from metrics import instrumented, maybe_start_profiler
+from date_parsing import parse_date_column
+from barangay_index import get_barangay_index
+from rollup_cube import update_cube
+import trend_cube
+from near_duplicates import filter_near_duplicates, load_snapshot_rows, duplicate_count
+from row_fingerprint import add_fingerprints, key_variants, KEY_COLUMNS, KEY_VARIANTS, FINGERPRINT_COLUMN
+from upload_columns import REQUIRED_COLUMNS, SEVERITY_CALC_COLUMNS, ALL_NEEDED_COLUMNS, normalize_column_name, map_columns
 
 load_dotenv()
 
@@ -21,9 +31,14 @@ logging.getLogger("httpcore").setLevel(logging.WARNING)
 # ExcelToSupabase class
 # ==============================
 class ExcelToSupabase:
-    def __init__(self, supabase_url: str, supabase_key: str):
-        self.supabase: Client = create_client(supabase_url, supabase_key)
+    def __init__(self, supabase_url: str, supabase_key: str, db: SupabaseIO = None):
+        # Pooled async client (supabase_io): paged reads and batch writes run concurrently
+        self.db = db or SupabaseIO(supabase_url, supabase_key)
+        self.rejects: List[Dict[str, Any]] = []  # Rows the database refused, with the error message
+        self.inserted_rows: List[Dict[str, Any]] = []  # Rows actually inserted (feeds the rollup cube)
+        self._fingerprint_support = None  # (column, conflict target), probed on first use
 
+    @instrumented()
     def read_all_sheets(self, file_path: str) -> Dict[str, pd.DataFrame]:
         try:
             # Check if file is CSV or Excel
@@ -65,7 +80,9 @@ class ExcelToSupabase:
                     if is_csv:
                         if 'year' not in df_clean.columns and 'datecommitted' in df_clean.columns:
                             # Extract year from datecommitted column
-                            df_clean['year'] = pd.to_datetime(df_clean['datecommitted'], errors='coerce').dt.year
+                            parsed_dates, format_counts = parse_date_column(df_clean['datecommitted'])
+                            df_clean['year'] = parsed_dates.dt.year
+                            logger.info(f"Date formats found: {dict(format_counts)}")
                             logger.info(f"Extracted year from datecommitted column for CSV file")
                         elif 'year' in df_clean.columns:
                             logger.info("CSV already has year column")
@@ -82,6 +99,9 @@ class ExcelToSupabase:
                 logger.info(f"Processed {len(sheet_data)} records from sheet {sheet_name}")
 
             if combined_data:
+                if USE_NEAR_DUPLICATE_FILTER:
+                    combined_data = self.check_near_duplicates(combined_data)
+
                 logger.info(f"Inserting combined data from all sheets ({len(combined_data)} total records)")
                 
                 # Choose insertion method
@@ -100,6 +120,25 @@ class ExcelToSupabase:
             logger.error(f"Error processing sheets: {str(e)}")
             return False
 
+    def check_near_duplicates(self, data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Audit rows that are near duplicates of each other or of the last export snapshot
+
+        Exact duplicates are still left to the upsert; this catches the same
+        accident entered with slightly different coordinates or time. Rows are
+        only dropped with MERGE_NEAR_DUPLICATES.
+        """
+        try:
+            existing = load_snapshot_rows() if NEAR_DUPLICATE_CHECK_SNAPSHOT else None
+            kept, pairs = filter_near_duplicates(data, existing, drop=MERGE_NEAR_DUPLICATES)
+        except Exception as e:
+            logger.warning(f" Near-duplicate check skipped: {e}")
+            return data
+        if MERGE_NEAR_DUPLICATES:
+            print(f"[SUMMARY]NEAR_DUPLICATES:{len(data) - len(kept)}", flush=True)  # Hidden marker
+        else:
+            print(f"[SUMMARY]NEAR_DUPLICATES_FLAGGED:{duplicate_count(pairs)}", flush=True)  # Hidden marker
+        return kept
+
     def extract_year_from_sheet_name(self, sheet_name: str) -> int:
         import re
         year_match = re.search(r'\b(19|20)\d{2}\b', str(sheet_name))
@@ -108,21 +147,13 @@ class ExcelToSupabase:
         logger.warning(f"Could not extract year from sheet name: {sheet_name}")
         return None
 
+    @instrumented()
     def clean_data(self, df: pd.DataFrame) -> pd.DataFrame:
-        df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_').str.replace(r'[^\w]', '', regex=True)
-        required_columns = ['barangay', 'lat', 'lng', 'datecommitted', 'timecommitted', 'offensetype']
-        severity_calc_columns = ['victimcount', 'suspectcount', 'victiminjured', 'victimkilled', 'victimunharmed', 'suspectkilled']
-        all_needed_columns = required_columns + severity_calc_columns
-        available_columns = df.columns.tolist()
-        column_mapping = {}
-        for req_col in all_needed_columns:
-            if req_col in available_columns:
-                column_mapping[req_col] = req_col
-            else:
-                for avail_col in available_columns:
-                    if req_col.replace('_', '').lower() in avail_col.replace('_', '').lower():
-                        column_mapping[req_col] = avail_col
-                        break
+        df.columns = [normalize_column_name(col) for col in df.columns]
+        required_columns = REQUIRED_COLUMNS
+        severity_calc_columns = SEVERITY_CALC_COLUMNS
+        all_needed_columns = ALL_NEEDED_COLUMNS
+        column_mapping = map_columns(df.columns.tolist())
         logger.info(f"Column mapping: {column_mapping}")
         missing_required = [col for col in required_columns if col not in column_mapping]
         missing_severity = [col for col in severity_calc_columns if col not in column_mapping]
@@ -136,6 +167,8 @@ class ExcelToSupabase:
         df_filtered = df_filtered.rename(columns=rename_map)
         initial_rows = len(df_filtered)
         logger.info(f"Initial rows after column selection: {initial_rows}")
+        if USE_BARANGAY_POLYGONS and {'lat', 'lng'}.issubset(df_filtered.columns):
+            df_filtered = self.assign_barangays_from_polygons(df_filtered)
         available_required_columns = [col for col in required_columns if col in df_filtered.columns]
         df_filtered = df_filtered.dropna(subset=available_required_columns)
         for col in severity_calc_columns:
@@ -157,6 +190,20 @@ class ExcelToSupabase:
             logger.info(f"Severity distribution: {severity_dist.to_dict()}")
         return df_final
 
+    def assign_barangays_from_polygons(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Use the barangay polygon containing each point instead of the free-text column"""
+        index = get_barangay_index()
+        if index is None:
+            return df
+        lat = pd.to_numeric(df['lat'], errors='coerce')
+        lng = pd.to_numeric(df['lng'], errors='coerce')
+        original = df['barangay'] if 'barangay' in df.columns else pd.Series(pd.NA, index=df.index, dtype='string')
+        validation = index.validate(original, lat, lng)
+        logger.info(f"Barangay polygon check: {validation['status'].value_counts().to_dict()}")
+        # Points outside every polygon keep the spreadsheet value
+        df['barangay'] = validation['polygon_barangay'].fillna(original.astype('string')).astype(object)
+        return df
+
     def calculate_severity(self, row) -> str:
         try:
             victim_count = int(row.get('victimcount', 0))
@@ -223,142 +270,48 @@ class ExcelToSupabase:
         return cleaned_records
 
     def check_existing_data(self, table_name: str) -> Dict[str, Any]:
-        """Get existing data with optimized duplicate checking using sets - OPTIMIZED VERSION"""
+        """Fingerprints of the rows already in the table, one sorted int64 array per key variant"""
         try:
             logger.info(" Checking for existing data to prevent duplicates...")
-            response = self.supabase.table(table_name).select("*").execute()
+            # Only the key columns, paged (pages fetched concurrently)
+            existing_records = self.db.fetch_all_sync(table_name, select=",".join(KEY_COLUMNS))
             
-            if hasattr(response, 'error') and response.error:
-                logger.warning(f"Could not fetch existing data: {response.error}")
-                return {"signatures": set(), "full_records": []}
-            
-            existing_records = response.data or []
-            
-            # Use set for O(1) lookups
-            existing_signatures = set()
-            
-            # Batch process records to reduce function call overhead
-            for row in existing_records:
-                # Pre-compute and clean values once
-                barangay = str(row.get('barangay', '')).lower().strip()
-                lat = str(row.get('lat', ''))  # Convert to string for consistency
-                lng = str(row.get('lng', ''))
-                date_committed = str(row.get('datecommitted', ''))
-                time_committed = str(row.get('timecommitted', ''))
-                offense_type = str(row.get('offensetype', '')).lower().strip()
-                
-                # Create all signature variations at once and add to set
-                signatures = {
-                    f"{barangay}|{lat}|{lng}|{date_committed}|{time_committed}|{offense_type}",  # primary
-                    f"{barangay}|{lat}|{lng}|{date_committed}|{offense_type}",  # without time
-                    f"{lat}|{lng}|{date_committed}|{offense_type}",  # coordinate + offense
-                }
-                existing_signatures.update(signatures)
+            # OPTIMIZATION: 8 bytes per row and variant instead of three pipe-joined strings
+            fingerprints = {name: np.unique(values) for name, values in key_variants(existing_records).items()}
             
             logger.info(f" Found {len(existing_records)} existing records in database")
-            logger.info(f" Generated {len(existing_signatures)} signature variations for matching")
-            
-            return {
-                "signatures": existing_signatures,
-                "full_records": existing_records,
-                "count": len(existing_records)
-            }
+            return {"fingerprints": fingerprints, "count": len(existing_records)}
             
         except Exception as e:
             logger.error(f" Error checking existing data: {str(e)}")
-            return {"signatures": set(), "full_records": [], "count": 0}
+            return {"fingerprints": {name: np.zeros(0, dtype=np.int64) for name in KEY_VARIANTS}, "count": 0}
 
     def filter_duplicates(self, data: List[Dict[str, Any]], existing_data: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Optimized duplicate filtering with O(n) complexity - OPTIMIZED VERSION"""
-        existing_signatures = existing_data["signatures"]
-        
-        # Use set for current batch signatures for O(1) lookup
-        current_batch_signatures = set()
-        filtered_data = []
-        duplicate_count = 0
-        
-        for record in data:
-            # Pre-compute and clean values once per record
-            barangay = str(record.get('barangay', '')).lower().strip()
-            lat = str(record.get('lat', ''))
-            lng = str(record.get('lng', ''))
-            date_committed = str(record.get('datecommitted', ''))
-            time_committed = str(record.get('timecommitted', ''))
-            offense_type = str(record.get('offensetype', '')).lower().strip()
-            
-            # Create primary signature for current batch tracking
-            primary_sig = f"{barangay}|{lat}|{lng}|{date_committed}|{time_committed}|{offense_type}"
-            
-            # Check current batch first (most likely to hit)
-            if primary_sig in current_batch_signatures:
-                duplicate_count += 1
-                continue
-            
-            # Create signature variations for existing data check
-            signatures_to_check = {
-                primary_sig,
-                f"{barangay}|{lat}|{lng}|{date_committed}|{offense_type}",
-                f"{lat}|{lng}|{date_committed}|{offense_type}",
-            }
-            
-            # Check if any signature exists in existing data using set intersection (very fast)
-            if existing_signatures & signatures_to_check:  # Set intersection
-                duplicate_count += 1
-                logger.debug(f" Duplicate found: {barangay} at ({lat}, {lng}) on {date_committed} - {offense_type}")
-            else:
-                # Not a duplicate - add to results
-                filtered_data.append(record)
-                current_batch_signatures.add(primary_sig)
-        
-        logger.info(f" Filtered out {duplicate_count} duplicate records")
-        logger.info(f" {len(filtered_data)} new unique records ready for insertion")
-        
-        return filtered_data
+        """Drop rows repeated within the upload or matching an existing row on any key variant
 
-    def filter_duplicates_pandas(self, data: List[Dict[str, Any]], existing_data: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Ultra-fast duplicate filtering using pandas for large datasets - ALTERNATIVE OPTIMIZED VERSION"""
+        Vectorized: membership checks are np.isin on int64 fingerprints.
+        """
         if not data:
             return data
         
-        # Convert to DataFrame for vectorized operations
-        df_new = pd.DataFrame(data)
-        
-        # Clean and prepare columns using vectorized operations
-        df_new['barangay_clean'] = df_new['barangay'].astype(str).str.lower().str.strip()
-        df_new['lat_clean'] = df_new['lat'].astype(str)
-        df_new['lng_clean'] = df_new['lng'].astype(str)
-        df_new['date_clean'] = df_new['datecommitted'].astype(str)
-        df_new['time_clean'] = df_new['timecommitted'].astype(str)
-        df_new['offense_clean'] = df_new['offensetype'].astype(str).str.lower().str.strip()
-        
-        # Create signature using vectorized string operations
-        df_new['signature'] = (
-            df_new['barangay_clean'] + '|' + 
-            df_new['lat_clean'] + '|' + 
-            df_new['lng_clean'] + '|' + 
-            df_new['date_clean'] + '|' + 
-            df_new['time_clean'] + '|' + 
-            df_new['offense_clean']
-        )
-        
-        # Remove internal duplicates within the new dataset
-        df_new_unique = df_new.drop_duplicates(subset=['signature'], keep='first')
+        variants = key_variants(data)
+        primary = variants["primary"]
         
-        # Filter against existing signatures using pandas isin() which is highly optimized
-        existing_signatures = existing_data["signatures"]
-        mask_not_duplicate = ~df_new_unique['signature'].isin(existing_signatures)
-        df_filtered = df_new_unique[mask_not_duplicate]
+        # First occurrence of each primary fingerprint within this upload
+        keep = np.zeros(len(data), dtype=bool)
+        keep[np.unique(primary, return_index=True)[1]] = True
         
-        # Convert back to list of dictionaries, excluding our helper columns
-        original_columns = [col for col in df_filtered.columns if not col.endswith('_clean') and col != 'signature']
-        filtered_data = df_filtered[original_columns].to_dict('records')
+        for name, values in variants.items():
+            keep &= ~np.isin(values, existing_data["fingerprints"][name])
         
+        filtered_data = [record for record, kept in zip(data, keep.tolist()) if kept]
         duplicate_count = len(data) - len(filtered_data)
-        logger.info(f" Pandas filtering removed {duplicate_count} duplicate records")
+        logger.info(f" Filtered out {duplicate_count} duplicate records")
         logger.info(f" {len(filtered_data)} new unique records ready for insertion")
         
         return filtered_data
 
+    @instrumented(rows="data")
     def insert_data(self, table_name: str, data: List[Dict[str, Any]], batch_size: int = 1000) -> bool:
         try:
             # Check for existing data first
@@ -367,10 +320,10 @@ class ExcelToSupabase:
             logger.info(f" Original data count: {len(data)}")
             logger.info(f" Existing records in database: {existing_data['count']}")
             
-            # Filter out duplicates - USE OPTIMIZED VERSION
-            # For very large datasets (100K+ records), uncomment the next line instead:
-            # filtered_data = self.filter_duplicates_pandas(data, existing_data)
+            # Filter out duplicates (row fingerprints, see row_fingerprint.py)
             filtered_data = self.filter_duplicates(data, existing_data)
+            if self.fingerprint_support(table_name)[0]:
+                add_fingerprints(filtered_data)
             
             if not filtered_data:
                 logger.info(" No new records to insert - all records already exist in database")
@@ -380,127 +333,194 @@ class ExcelToSupabase:
             logger.info(f" Starting to insert {total_records} new records into {table_name}")
             
             inserted_count = 0
-            for i in range(0, total_records, batch_size):
-                batch = filtered_data[i:i + batch_size]
-                
-                try:
-                    result = self.supabase.table(table_name).insert(batch).execute()
-                    
-                    if hasattr(result, 'error') and result.error:
-                        logger.error(f" Error inserting batch {i//batch_size + 1}: {result.error}")
-                        # Try individual inserts for this batch to see which records are problematic
-                        self.insert_batch_individually(table_name, batch, i//batch_size + 1)
-                    else:
-                        batch_size_actual = len(batch)
-                        inserted_count += batch_size_actual
-                        logger.info(f" Inserted batch {i//batch_size + 1}/{(total_records + batch_size - 1)//batch_size} ({batch_size_actual} records)")
-                        
-                except Exception as e:
-                    logger.error(f" Exception inserting batch {i//batch_size + 1}: {str(e)}")
-                    self.insert_batch_individually(table_name, batch, i//batch_size + 1)
+            batches = [filtered_data[i:i + batch_size] for i in range(0, total_records, batch_size)]
+            # OPTIMIZATION: Batches are sent concurrently over the pooled client
+            results = self.db.write_batches_sync(table_name, batches)
+            for batch_num, (batch, result) in enumerate(zip(batches, results), start=1):
+                if isinstance(result, Exception):
+                    logger.error(f" Exception inserting batch {batch_num}: {str(result)}")
+                    # Split the batch to isolate the problematic records
+                    inserted_count += self.bisect_failed_batch(table_name, batch, batch_num)[0]
+                else:
+                    written, _ = result
+                    self.inserted_rows.extend(written or batch)
+                    inserted_count += len(batch)
+                    logger.info(f" Inserted batch {batch_num}/{len(batches)} ({len(batch)} records)")
             
             logger.info(f" Successfully processed {total_records} records, inserted {inserted_count} new records")
+            self.report_rejects()
+            self.update_rollup_cube()
             return True
             
         except Exception as e:
             logger.error(f" Error in insert_data: {str(e)}")
             return False
 
-    def insert_batch_individually(self, table_name: str, batch: List[Dict[str, Any]], batch_num: int):
-        """Try to insert records individually when batch fails"""
-        logger.info(f" Attempting individual inserts for batch {batch_num}")
-        
-        for i, record in enumerate(batch):
+    def write_batch(self, table_name: str, batch: List[Dict[str, Any]], upsert: bool = False) -> int:
+        """Send one batch; returns rows inserted, raises if the database rejects it"""
+        # Count new inserts (count will be 0 for duplicates); with upsert (ignore
+        # duplicates) the returned rows are only the ones that were actually inserted
+        written, count = self.db.write_batch_sync(table_name, batch, upsert=upsert,
+                                                  on_conflict=self.conflict_target(table_name, upsert), returning=upsert)
+        self.inserted_rows.extend(written or ([] if upsert else batch))
+        return count if upsert else len(batch)
+
+    def fingerprint_support(self, table_name: str):
+        """(has fingerprint column, fingerprint is a conflict target), probed once per run
+
+        migrations/001_row_fingerprint.sql is applied by hand: until the column
+        exists no fingerprints are sent, and until its unique index exists the
+        upsert keeps its old conflict handling instead of failing every batch.
+        """
+        if not USE_ROW_FINGERPRINT:
+            return False, False
+        if self._fingerprint_support is None:
             try:
-                result = self.supabase.table(table_name).insert([record]).execute()
-                if hasattr(result, 'error') and result.error:
-                    logger.warning(f" Failed to insert individual record {i+1}: {result.error}")
-                else:
-                    logger.debug(f" Individual insert successful for record {i+1}")
+                column = self.db.has_column_sync(table_name, FINGERPRINT_COLUMN)
+                unique = False
+                if column:
+                    try:
+                        # Zero-row upsert: rejected (42P10) while the unique index is missing
+                        self.db.write_batch_sync(table_name, [], upsert=True, on_conflict=FINGERPRINT_COLUMN)
+                        unique = True
+                    except SupabaseError as e:
+                        if e.status_code != 400:
+                            raise
+            except SupabaseError as e:
+                logger.warning(f" Could not check for the {FINGERPRINT_COLUMN} column: {e}")
+                column = unique = False
+            if not unique:
+                logger.warning(f" {table_name} has no {'unique ' if column else ''}{FINGERPRINT_COLUMN} "
+                               f"{'index' if column else 'column'} yet - using the old upsert "
+                               "(see migrations/001_row_fingerprint.sql)")
+            self._fingerprint_support = (column, unique)
+        return self._fingerprint_support
+
+    def conflict_target(self, table_name: str, upsert: bool):
+        """Upsert conflict column: the row fingerprint (unique index) once the table has it"""
+        return FINGERPRINT_COLUMN if upsert and self.fingerprint_support(table_name)[1] else None
+
+    def bisect_failed_batch(self, table_name: str, batch: List[Dict[str, Any]], batch_num: int, upsert: bool = False):
+        """Retry a failed batch by splitting it in halves until the bad rows are isolated
+
+        One bad row in a 1000-row batch costs about 2*log2(1000) = 20 requests
+        instead of 1000 single-row ones. Bad rows are added to self.rejects.
+        Returns (inserted, duplicates, requests).
+        """
+        logger.info(f" Splitting failed batch {batch_num} ({len(batch)} records) to isolate bad rows")
+        inserted = duplicates = rejected = requests = 0
+        pending = [batch[:len(batch) // 2], batch[len(batch) // 2:]]
+        while pending:
+            part = pending.pop()
+            if not part:
+                continue
+            requests += 1
+            try:
+                part_inserted = self.write_batch(table_name, part, upsert=upsert)
+                inserted += part_inserted
+                duplicates += len(part) - part_inserted
             except Exception as e:
-                logger.warning(f" Exception inserting individual record {i+1}: {str(e)}")
+                error_str = str(e)
+                if 'duplicate key' in error_str.lower() or '23505' in error_str:
+                    duplicates += len(part)  # Whole part already exists
+                elif len(part) == 1:
+                    self.rejects.append({"batch": batch_num, "error": error_str, "record": part[0]})
+                    rejected += 1
+                else:
+                    pending.extend([part[:len(part) // 2], part[len(part) // 2:]])
+
+        logger.warning(f" Batch {batch_num}: {inserted} inserted, {duplicates} duplicates, "
+                       f"{rejected} rejected ({requests} retry requests)")
+        return inserted, duplicates, requests
+
+    def update_rollup_cube(self):
+        """Add this run's inserted rows to the dashboard rollup and trend cubes (never fails the upload)"""
+        try:
+            update_cube(self.inserted_rows)
+        except Exception as e:
+            logger.warning(f" Could not update rollup cube (rebuilt on next export): {e}")
+        try:
+            trend_cube.update_cube(self.inserted_rows)
+        except Exception as e:
+            logger.warning(f" Could not update trend cube (rebuilt on next export): {e}")
 
+    def report_rejects(self):
+        """Write rejected rows to REJECTS_FILE and print the summary marker for server.js"""
+        print(f"[SUMMARY]REJECTED:{len(self.rejects)}", flush=True)  # Hidden marker
+        if not self.rejects:
+            if os.path.exists(REJECTS_FILE):
+                os.remove(REJECTS_FILE)  # Don't leave a previous upload's rejects behind
+            return
+        tmp_path = REJECTS_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for reject in self.rejects:
+                f.write(json.dumps(reject, default=str) + "\n")
+        os.replace(tmp_path, REJECTS_FILE)
+        logger.warning(f" {len(self.rejects)} rejected records written to {REJECTS_FILE}")
+
+    @instrumented(rows="data")
     def upsert_data(self, table_name: str, data: List[Dict[str, Any]], batch_size: int = 1000) -> bool:
         """Use Supabase upsert with comprehensive conflict resolution including offense type"""
         try:
             total_records = len(data)
+            if self.fingerprint_support(table_name)[0]:
+                add_fingerprints(data)
             
             inserted_count = 0
             duplicate_count = 0
             
-            for i in range(0, total_records, batch_size):
-                batch = data[i:i + batch_size]
-                
-                try:
-                    # OPTIMIZED: Use upsert with count to track new inserts
-                    result = self.supabase.table(table_name).upsert(
-                        batch,
-                        ignore_duplicates=True,  # Skip duplicates silently
-                        count='exact'  # Count affected rows to track new inserts
-                    ).execute()
-                    
-                    # Count new inserts (count will be 0 for duplicates)
-                    batch_inserted = result.count if hasattr(result, 'count') and result.count else 0
+            # OPTIMIZED: Upsert with count to track new inserts; batches are sent
+            # concurrently over the pooled client and handled in order below
+            batches = [data[i:i + batch_size] for i in range(0, total_records, batch_size)]
+            results = self.db.write_batches_sync(table_name, batches, upsert=True,
+                                                 on_conflict=self.conflict_target(table_name, True),
+                                                 returning=True)  # Only the inserted rows come back
+            for batch_num, (batch, result) in enumerate(zip(batches, results), start=1):
+                if not isinstance(result, Exception):
+                    written, batch_inserted = result
+                    self.inserted_rows.extend(written)
                     inserted_count += batch_inserted
                     duplicate_count += (len(batch) - batch_inserted)
-                        
-                except Exception as e:
-                    # Only log if it's NOT a duplicate key error
-                    error_str = str(e)
-                    if 'duplicate key' not in error_str.lower() and '23505' not in error_str:
-                        logger.error(f" Batch {i//batch_size + 1} error: {str(e)}")
-                    else:
-                        # All duplicates in this batch
-                        duplicate_count += len(batch)
+                    continue
+                
+                # Only log if it's NOT a duplicate key error
+                error_str = str(result)
+                if 'duplicate key' not in error_str.lower() and '23505' not in error_str:
+                    logger.error(f" Batch {batch_num} error: {error_str}")
+                    batch_inserted, batch_duplicates, _ = self.bisect_failed_batch(
+                        table_name, batch, batch_num, upsert=True
+                    )
+                    inserted_count += batch_inserted
+                    duplicate_count += batch_duplicates
+                else:
+                    # All duplicates in this batch
+                    duplicate_count += len(batch)
             
             # Output summary for server.js to parse (hidden markers + visible message)
             print(f"[SUMMARY]INSERTED:{inserted_count}", flush=True)  # Hidden marker
             print(f"[SUMMARY]DUPLICATES:{duplicate_count}", flush=True)  # Hidden marker
-            print(f"   Upsert complete: {inserted_count} new, {duplicate_count} duplicates", flush=True)
+            print(f"   Upsert complete: {inserted_count} new, {duplicate_count} duplicates, {len(self.rejects)} rejected", flush=True)
+            self.report_rejects()
+            self.update_rollup_cube()
             return True
             
         except Exception as e:
             logger.error(f" Error upserting data: {str(e)}")
             return False
 
-    def upsert_batch_individually(self, table_name: str, batch: List[Dict[str, Any]], batch_num: int):
-        """Try to upsert records individually when batch fails - DEPRECATED (should not be called)"""
-        # This function is kept for backward compatibility but should not be called
-        # with the optimized batch upsert using ignore_duplicates=True
-        logger.warning(f" Fallback to individual upserts triggered for batch {batch_num} - this is slow!")
-        
-        duplicates = 0
-        errors = 0
-        
-        for i, record in enumerate(batch):
-            try:
-                result = self.supabase.table(table_name).upsert([record], ignore_duplicates=True).execute()
-                if hasattr(result, 'error') and result.error:
-                    # Only log actual errors, not duplicate conflicts
-                    if 'duplicate key' in str(result.error):
-                        duplicates += 1
-                    else:
-                        errors += 1
-                        if errors <= 5:  # Only log first 5 errors
-                            logger.error(f" Record {i+1} error: {result.error}")
-            except Exception as e:
-                if 'duplicate key' not in str(e):
-                    errors += 1
-                    if errors <= 5:
-                        logger.error(f" Record {i+1} exception: {str(e)}")
-                else:
-                    duplicates += 1
-        
-        logger.warning(f" Batch {batch_num}: {duplicates} duplicates skipped, {errors} errors")
-
 # ==============================
 # Configuration
 # ==============================
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 TABLE_NAME = 'road_traffic_accident'
 USE_UPSERT = True  # OPTIMIZED: Use database upsert instead of manual duplicate filtering
+USE_ROW_FINGERPRINT = True  # Send a 64-bit row fingerprint and upsert on it once migrations/001_row_fingerprint.sql is applied (probed per run)
+REJECTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "upload_rejects.jsonl")  # Rows the last upload could not insert
+USE_NEAR_DUPLICATE_FILTER = True  # Flag rows within near_duplicates.DISTANCE_TOLERANCE_M / TIME_TOLERANCE_MINUTES (audit: data/near_duplicates_audit.jsonl)
+MERGE_NEAR_DUPLICATES = False  # Also drop the flagged rows (groups are transitive - review the audit before enabling)
+NEAR_DUPLICATE_CHECK_SNAPSHOT = True  # Also compare against data/accidents.geojson (rows already in the database)
+USE_BARANGAY_POLYGONS = False  # Assign barangay from philippines_Barangay_level_4.geojson instead of the spreadsheet column
 
 def find_latest_excel_file():
     """Find the most recent Excel or CSV file in the data folder"""
@@ -558,4 +578,5 @@ def main():
         return False
 
 if __name__ == "__main__":
+    maybe_start_profiler()
     main()
\ No newline at end of file
@@ -3,6 +3,7 @@ import logging
 from pathlib import Path
 from datetime import datetime
 import shutil
+from metrics import maybe_start_profiler
 
 # ==============================
 # Logging Configuration
@@ -261,4 +262,5 @@ def delete_specific_file(filename: str):
         logger.error(f" Error deleting specific file: {str(e)}")
 
 if __name__ == "__main__":
+    maybe_start_profiler()
     main()
\ No newline at end of file
@@ -0,0 +1,75 @@
+import numpy as np
+from scipy.spatial import ConvexHull, QhullError
+
+# ==============================
+# Cluster footprint polygons
+# ==============================
+# A hotspot's extent as one small polygon instead of all its member points:
+# the convex hull of the members, buffered outward by BUFFER_METERS so that
+# clusters sitting on one road (nearly collinear points) still get an area.
+#
+# Points are sorted by cluster label once and split into contiguous runs, so
+# every cluster's hull is computed from a slice of the sorted arrays.
+BUFFER_METERS = 15.0
+BUFFER_SEGMENTS = 8       # Points per buffered hull vertex (more = rounder corners)
+COORDINATE_DECIMALS = 6   # ~0.1 m
+METERS_PER_DEGREE = 111_320.0
+
+
+def _hull(points: np.ndarray) -> np.ndarray:
+    """Convex hull vertices in counter-clockwise order (degenerate input returns the unique points)"""
+    unique = np.unique(points, axis=0)
+    if len(unique) < 3:
+        return unique
+    try:
+        return unique[ConvexHull(unique).vertices]
+    except QhullError:
+        # All collinear: the two extreme points span the footprint
+        order = np.lexsort((unique[:, 1], unique[:, 0]))
+        return unique[[order[0], order[-1]]]
+
+
+def buffered_hull(points: np.ndarray, buffer_meters: float = BUFFER_METERS) -> np.ndarray:
+    """Convex hull of points (metres) grown outward by buffer_meters, closed ring"""
+    hull = _hull(points)
+    if buffer_meters > 0:
+        angles = np.linspace(0.0, 2.0 * np.pi, BUFFER_SEGMENTS, endpoint=False)
+        circle = np.column_stack([np.cos(angles), np.sin(angles)]) * buffer_meters
+        hull = _hull((hull[:, None, :] + circle[None, :, :]).reshape(-1, 2))
+    return np.vstack([hull, hull[:1]])
+
+
+def polygon_area(ring: np.ndarray) -> float:
+    """Shoelace area of a closed ring (square metres)"""
+    x, y = ring[:, 0], ring[:, 1]
+    return float(abs(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1])) / 2.0)
+
+
+def cluster_footprints(labels, lat, lon, buffer_meters: float = BUFFER_METERS) -> dict:
+    """{cluster id: {"ring": [[lon, lat], ...], "area_m2": float}} for every label >= 0"""
+    labels = np.asarray(labels)
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    clustered = labels >= 0
+    if not clustered.any():
+        return {}
+
+    # Local metric projection so the buffer and the area are in metres
+    lat0 = np.radians(lat[clustered].mean())
+    x_scale, y_scale = METERS_PER_DEGREE * np.cos(lat0), METERS_PER_DEGREE
+    labels, x, y = labels[clustered], lon[clustered] * x_scale, lat[clustered] * y_scale
+
+    order = np.argsort(labels, kind="stable")
+    labels, points = labels[order], np.column_stack([x[order], y[order]])
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    ends = np.r_[starts[1:], len(labels)]
+
+    footprints = {}
+    for start, end in zip(starts, ends):
+        ring = buffered_hull(points[start:end], buffer_meters)
+        coordinates = np.column_stack([ring[:, 0] / x_scale, ring[:, 1] / y_scale]).round(COORDINATE_DECIMALS)
+        footprints[int(labels[start])] = {
+            "ring": coordinates.tolist(),
+            "area_m2": round(polygon_area(ring), 1),
+        }
+    return footprints
@@ -1,5 +1,8 @@
 import os
+import sys
 import json
+import argparse
+import subprocess
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
@@ -7,37 +10,97 @@ from hdbscan import HDBSCAN
 from sklearn.cluster import DBSCAN
 from sklearn.metrics import silhouette_score
 from sklearn.preprocessing import StandardScaler
-from scipy import stats
+from scipy.spatial import cKDTree
 import warnings
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import multiprocessing
+from metrics import instrumented, emit_metric, maybe_start_profiler
+from date_parsing import parse_datetime_columns, as_categorical
+from barangay_index import get_barangay_index
+from tile_pyramid import write_tile_pyramid, TILES_FOLDER
+from partitioned_clustering import partitioned_hdbscan
+from heatmap_rasters import write_heatmaps, HEATMAP_FOLDER
+from cluster_footprints import cluster_footprints
+from geohash_shards import write_shards, SHARDS_FOLDER
+from delta_patches import write_versioned_output, PATCHES_FOLDER
+import trend_cube
+from filter_index import write_filter_index, FILTER_INDEX_FILE
 
 warnings.filterwarnings("ignore", category=FutureWarning, message=".*force_all_finite.*")
 
 # OPTIMIZATION: Use all available CPU cores for parallel processing
 MAX_WORKERS = max(1, multiprocessing.cpu_count() - 1)
 
+# Compact in-memory schema: repeated strings become categoricals. The original
+# date/time strings are kept (as categoricals) so the export reproduces them
+# exactly; 'date' is the parsed value used for analysis
+CATEGORICAL_COLUMNS = ["barangay", "offensetype", "severity"]
+DATE_STRING_COLUMNS = ["datecommitted", "timecommitted"]
+DROPPED_COLUMNS = ["datetime_str"]
+
+# Take cluster barangays from the boundary polygons instead of the free-text column
+USE_BARANGAY_POLYGONS = False
+
+# HDBSCAN parameters for the full dataset (run_analysis)
+MIN_CLUSTER_SIZE = 25
+MIN_SAMPLES = 15
+CLUSTER_SELECTION_EPSILON = 0.0000008
+
+# "monolithic" = one HDBSCAN over all points, "partitioned" = spatial tiles with
+# halos clustered in parallel (partitioned_clustering.py), "auto" = partitioned
+# from PARTITIONED_MIN_POINTS points up. Partitioned labels are close to, not
+# identical with, the monolithic ones, so it is opt-in: check the ARI/NMI from
+# compare_clustering.py on the real data before switching
+CLUSTERING_MODE = "monolithic"
+PARTITIONED_MIN_POINTS = 200_000
+
+# Preview mode: cluster a spatially stratified sample, give every other point
+# the label of its nearest sample point, publish centers flagged
+# "preview": true and leave the full run to a detached background process
+PREVIEW_MIN_POINTS = 50_000         # main() previews automatically from this size up
+PREVIEW_SAMPLE_SIZE = 20_000
+PREVIEW_CELL_METERS = 250           # Strata: sample the same fraction of every grid cell
+PREVIEW_ASSIGN_RADIUS_METERS = 150  # Farther than this from every sample point = noise
+FULL_RUN_LOG = "cluster_full_run.log"
+METERS_PER_DEGREE = 111_320.0
+
+def scaled_density_params(min_cluster_size, min_samples, fraction):
+    """HDBSCAN thresholds for a subset holding `fraction` of the points
+
+    Density thresholds scale with the fraction; the floors keep small subsets
+    from splitting into many unstable micro-clusters.
+    """
+    return max(8, int(round(min_cluster_size * fraction))), max(5, int(round(min_samples * fraction)))
+
 class AccidentClusterAnalyzer:
-    def __init__(self, filename="accidents.geojson"):
-        # Use script_dir + data folder like before
+    def __init__(self, filename="accidents.geojson", use_barangay_polygons=USE_BARANGAY_POLYGONS, data_folder=None):
+        # Use script_dir + data folder like before (input and the file exports)
         script_dir = os.path.dirname(os.path.abspath(__file__))
-        data_folder = os.path.join(script_dir, "data")
-        self.file_path = os.path.join(data_folder, filename)
+        self.data_folder = data_folder or os.path.join(script_dir, "data")
+        self.file_path = os.path.join(self.data_folder, filename)
 
         self.df = None
         self.clustered_df = None
         self.cluster_centers = None
+        self.cluster_footprints = None
         self.temporal_weights = None
         self.trend_scores = None
+        self.date_format_counts = {}
         self.current_date = datetime.now()
         
         # Temporal analysis parameters
         self.decay_rate = 0.15
         self.recent_months = 24
+        
+        self.use_barangay_polygons = use_barangay_polygons
+        self.is_preview = False
+        self._point_features_cache = None
+        self._cell_trends = None
 
     # ======================================================
     # LOAD + PREPROCESS (OPTIMIZED)
     # ======================================================
+    @instrumented(rows="self.df")
     def load_geojson_data(self):
         """OPTIMIZED: Faster JSON loading and processing"""
         if not os.path.exists(self.file_path):
@@ -46,44 +109,70 @@ class AccidentClusterAnalyzer:
         with open(self.file_path, "r", encoding="utf-8") as f:
             data = json.load(f)
 
-        # OPTIMIZATION: Use list comprehension (faster than loop)
-        records = [
-            {
-                "longitude": feat["geometry"]["coordinates"][0],
-                "latitude": feat["geometry"]["coordinates"][1],
-                **feat["properties"]
-            }
-            for feat in data["features"]
-            if feat["geometry"]["type"] == "Point"
-        ]
-
-        self.df = pd.DataFrame(records)
+        # OPTIMIZATION: Build columns straight from the parsed features instead of
+        # copying every feature into a new merged dict first
+        points = [feat for feat in data["features"] if feat["geometry"]["type"] == "Point"]
+        del data
+
+        coordinates = np.array([feat["geometry"]["coordinates"][:2] for feat in points], dtype=np.float64).reshape(-1, 2)
+        self.df = pd.DataFrame.from_records([feat["properties"] for feat in points])
+        del points
+
+        self.df.insert(0, "latitude", coordinates[:, 1])
+        self.df.insert(0, "longitude", coordinates[:, 0])
+        self.compact_dtypes()
         return True
 
+    def compact_dtypes(self):
+        """OPTIMIZED: Store repeated strings as categoricals and downcast numeric columns"""
+        if self.df is None:
+            return
+
+        for col in CATEGORICAL_COLUMNS:
+            if col in self.df.columns and not isinstance(self.df[col].dtype, pd.CategoricalDtype):
+                self.df[col] = self.df[col].astype("category")
+
+        if "year" in self.df.columns:
+            self.df["year"] = pd.to_numeric(self.df["year"], errors="coerce").astype("Int16")
+
+        if "id" in self.df.columns and pd.api.types.is_numeric_dtype(self.df["id"]):
+            self.df["id"] = pd.to_numeric(self.df["id"], downcast="integer")
+
+    @instrumented(rows="self.df")
     def preprocess_data(self):
         """OPTIMIZED: Vectorized data cleaning"""
         if self.df is None:
             return False
         
-        # OPTIMIZATION: Vectorized operations (much faster than row-by-row)
-        self.df = self.df.dropna(subset=["latitude", "longitude"])
-        self.df = self.df[
-            (self.df["latitude"].between(-90, 90)) &
-            (self.df["longitude"].between(-180, 180))
-        ]
+        # OPTIMIZATION: Single boolean mask (NaN fails between) instead of chained copies
+        valid_mask = (
+            self.df["latitude"].between(-90, 90) &
+            self.df["longitude"].between(-180, 180)
+        )
+        if not valid_mask.all():
+            self.df = self.df.loc[valid_mask].reset_index(drop=True)
+        
+        # OPTIMIZATION: Few distinct dates/times, so the original strings are cheap as
+        # categoricals (kept for the export), and the parser reuses their codes
+        for col in DATE_STRING_COLUMNS:
+            if col in self.df.columns:
+                self.df[col] = as_categorical(self.df[col])
         
         # Handle date and time columns
+        # OPTIMIZATION: Explicit-format parsing of each distinct value (see date_parsing.py)
+        # instead of per-element format inference on concatenated strings
         if 'datecommitted' in self.df.columns:
-            if 'timecommitted' in self.df.columns:
-                self.df['datetime_str'] = self.df['datecommitted'].astype(str) + ' ' + self.df['timecommitted'].astype(str)
-                self.df['date'] = pd.to_datetime(self.df['datetime_str'], errors='coerce')
-            else:
-                self.df['date'] = pd.to_datetime(self.df['datecommitted'], errors='coerce')
+            times = self.df['timecommitted'] if 'timecommitted' in self.df.columns else None
+            self.df['date'], self.date_format_counts = parse_datetime_columns(self.df['datecommitted'], times)
+            emit_metric("parse_dates", **self.date_format_counts)
         elif 'date' not in self.df.columns:
             self.df['date'] = self.current_date
         
+        self.df['date_imputed'] = self.df['date'].isna()
         self.df['date'] = self.df['date'].fillna(self.current_date)
         
+        self.df = self.df.drop(columns=[c for c in DROPPED_COLUMNS if c in self.df.columns])
+        
         return True
 
     # ======================================================
@@ -100,48 +189,34 @@ class AccidentClusterAnalyzer:
         
         return weights
     
-    def analyze_accident_trends(self, locations=None, dates=None):
-        """OPTIMIZED: Simplified trend analysis with reduced bins for faster processing"""
+    def load_trend_cube(self):
+        """Per-cell trends from the persistent count cube (trend_cube.py), loaded once per run
+
+        The saved cube is used when its fingerprint matches this data's dated
+        points; otherwise (no export yet, or an upload not yet exported) the
+        cube is built from the loaded points for this run only - the saved one
+        is left to export_geojson / cleaning2.
+        """
+        if self._cell_trends is not None:
+            return self._cell_trends
+        dated = ~self.df['date_imputed'] if 'date_imputed' in self.df.columns else np.ones(len(self.df), dtype=bool)
+        lat, lon = self.df['latitude'].to_numpy(), self.df['longitude'].to_numpy()
+        dates = self.df['date'].where(dated)
+        cube, meta = trend_cube.load_cube_with_meta()
+        if cube is None or meta.get("fingerprint") != trend_cube.points_fingerprint(lat, lon, dates):
+            cube = trend_cube.build_cube(lat, lon, dates)
+        self._cell_trends = trend_cube.cell_trends(cube)
+        return self._cell_trends
+
+    def analyze_accident_trends(self, locations=None):
+        """Monthly trend of each point's fixed grid cell, read from the trend cube
+
+        Cells are geo-anchored, so the global pass and the per-cluster passes
+        look up the same per-cell trends instead of re-binning each subset.
+        """
         if locations is None:
             locations = self.df[['latitude', 'longitude']].values
-        if dates is None:
-            dates = self.df['date']
-        
-        # Create DataFrame for analysis
-        df_trend = pd.DataFrame({
-            'date': dates,
-            'lat': locations[:, 0],
-            'lon': locations[:, 1]
-        })
-        
-        df_trend['year_month'] = df_trend['date'].dt.to_period('M')
-        
-        # OPTIMIZATION: Reduced bins for faster processing (30 instead of 50)
-        # This gives us 900 spatial bins instead of 2,500 (3x faster, similar accuracy)
-        lat_bins = pd.cut(df_trend['lat'], bins=30)
-        lon_bins = pd.cut(df_trend['lon'], bins=30)
-        df_trend['spatial_bin'] = lat_bins.astype(str) + '_' + lon_bins.astype(str)
-        
-        # Count accidents per spatial bin per month
-        monthly_counts = df_trend.groupby(['spatial_bin', 'year_month']).size().reset_index(name='count')
-        
-        # Calculate trend for each spatial bin
-        trends = {}
-        for spatial_bin in monthly_counts['spatial_bin'].unique():
-            bin_data = monthly_counts[monthly_counts['spatial_bin'] == spatial_bin]
-            
-            if len(bin_data) >= 3:  # Need minimum points for trend
-                x = np.arange(len(bin_data))
-                y = bin_data['count'].values
-                slope, _, r_value, _, _ = stats.linregress(x, y)
-                trends[spatial_bin] = slope if abs(r_value) > 0.3 else 0  # Only significant trends
-            else:
-                trends[spatial_bin] = 0
-        
-        # Map trends back to original data points
-        df_trend['trend'] = df_trend['spatial_bin'].map(trends).fillna(0)
-        
-        return df_trend['trend'].values
+        return trend_cube.point_trends(self.load_trend_cube(), locations[:, 0], locations[:, 1])
 
     def calculate_danger_score(self, cluster_data):
         """Calculate composite danger score for a cluster"""
@@ -150,7 +225,7 @@ class AccidentClusterAnalyzer:
         
         cluster_weights = self.calculate_temporal_weights(cluster_data['date'])
         cluster_coords = cluster_data[['latitude', 'longitude']].values
-        cluster_trends = self.analyze_accident_trends(cluster_coords, cluster_data['date'])
+        cluster_trends = self.analyze_accident_trends(cluster_coords)
         
         temporal_component = np.mean(cluster_weights) * 0.4
         trend_component = max(0, np.mean(cluster_trends)) * 0.3
@@ -161,33 +236,104 @@ class AccidentClusterAnalyzer:
     # ======================================================
     # MAIN CLUSTERING (WITH PROGRESS)
     # ======================================================
-    def perform_clustering(self, min_cluster_size=15, min_samples=5, cluster_selection_epsilon=0.0001):
+    @instrumented(rows="self.df")
+    def perform_clustering(self, min_cluster_size=15, min_samples=5, cluster_selection_epsilon=0.0001, mode=None):
         """OPTIMIZED: Uses all CPU cores for faster processing"""
-        coords = np.radians(self.df[["latitude", "longitude"]].values)
-        
-        clusterer = HDBSCAN(
-            min_cluster_size=min_cluster_size,
-            min_samples=min_samples,
-            metric="haversine",
-            cluster_selection_epsilon=cluster_selection_epsilon,
-            core_dist_n_jobs=-1  # OPTIMIZATION: Use all cores for distance calculations
-        )
-        
-        labels = clusterer.fit_predict(coords)
+        mode = mode or CLUSTERING_MODE
+        if mode == "auto":
+            mode = "partitioned" if len(self.df) >= PARTITIONED_MIN_POINTS else "monolithic"
+        
+        if mode == "partitioned":
+            labels = partitioned_hdbscan(
+                self.df["latitude"].to_numpy(),
+                self.df["longitude"].to_numpy(),
+                min_cluster_size=min_cluster_size,
+                min_samples=min_samples,
+                cluster_selection_epsilon=cluster_selection_epsilon
+            )
+        else:
+            coords = np.radians(self.df[["latitude", "longitude"]].values)
+            
+            clusterer = HDBSCAN(
+                min_cluster_size=min_cluster_size,
+                min_samples=min_samples,
+                metric="haversine",
+                cluster_selection_epsilon=cluster_selection_epsilon,
+                core_dist_n_jobs=-1  # OPTIMIZATION: Use all cores for distance calculations
+            )
+            
+            labels = clusterer.fit_predict(coords).astype(np.int32)
+        self.set_cluster_labels(labels)
+        return labels
+
+    def set_cluster_labels(self, labels):
         self.df["cluster"] = labels
-        self.clustered_df = self.df.copy()
+        # OPTIMIZATION: Share one frame instead of doubling memory with a copy
+        self.clustered_df = self.df
         
         self.temporal_weights = self.calculate_temporal_weights()
         self.trend_scores = self.analyze_accident_trends()
         
         self.clustered_df['temporal_weight'] = self.temporal_weights
         self.clustered_df['trend_score'] = self.trend_scores
+
+    # ======================================================
+    # PREVIEW CLUSTERING (SAMPLE + NEAREST NEIGHBOR)
+    # ======================================================
+    def stratified_sample(self, sample_size=PREVIEW_SAMPLE_SIZE, cell_meters=PREVIEW_CELL_METERS):
+        """Row positions of a sample taking the same fraction of every grid cell (keeps relative density)"""
+        fraction = min(1.0, sample_size / len(self.df))
+        cell_degrees = cell_meters / METERS_PER_DEGREE
+        cells = pd.DataFrame({
+            "row": np.arange(len(self.df)),
+            "cell_lat": np.floor(self.df["latitude"].to_numpy() / cell_degrees).astype(np.int64),
+            "cell_lon": np.floor(self.df["longitude"].to_numpy() / cell_degrees).astype(np.int64),
+        })
+        sample = cells.groupby(["cell_lat", "cell_lon"]).sample(frac=fraction, random_state=0)
+        return np.sort(sample["row"].to_numpy()), fraction
+
+    def _projected_meters(self, rows=None):
+        lat = self.df["latitude"].to_numpy()
+        lon = self.df["longitude"].to_numpy()
+        if rows is not None:
+            lat, lon = lat[rows], lon[rows]
+        scale = METERS_PER_DEGREE * np.cos(np.radians(self.df["latitude"].mean()))
+        return np.column_stack([lon * scale, lat * METERS_PER_DEGREE])
+
+    @instrumented(rows="self.df")
+    def perform_preview_clustering(self, min_cluster_size=15, min_samples=5, cluster_selection_epsilon=0.0001,
+                                   sample_size=PREVIEW_SAMPLE_SIZE):
+        """Cluster a stratified sample, then label the rest by their nearest sample point"""
+        sample_rows, fraction = self.stratified_sample(sample_size)
         
+        sample_min_cluster_size, sample_min_samples = scaled_density_params(min_cluster_size, min_samples, fraction)
+        clusterer = HDBSCAN(
+            min_cluster_size=sample_min_cluster_size,
+            min_samples=sample_min_samples,
+            metric="haversine",
+            cluster_selection_epsilon=cluster_selection_epsilon,
+            core_dist_n_jobs=-1
+        )
+        sample_labels = clusterer.fit_predict(np.radians(self.df[["latitude", "longitude"]].values[sample_rows]))
+        
+        # Every point takes the label of its nearest sample point, so sampled noise keeps its
+        # surroundings as noise too
+        labels = np.full(len(self.df), -1, dtype=np.int32)
+        tree = cKDTree(self._projected_meters(sample_rows))
+        distance, nearest = tree.query(self._projected_meters(), k=1,
+                                       distance_upper_bound=PREVIEW_ASSIGN_RADIUS_METERS)
+        found = np.isfinite(distance)
+        labels[found] = sample_labels[nearest[found]]
+        
+        emit_metric("preview_clustering", sample=len(sample_rows), fraction=round(fraction, 4),
+                    clusters=int(labels.max()) + 1)
+        self.set_cluster_labels(labels)
         return labels
 
     # ======================================================
     # SUB-CLUSTERING (OPTIMIZED)
     # ======================================================
+    @instrumented(rows="self.clustered_df")
     def temporal_subcluster_large_clusters(self, max_accidents=None):
         """OPTIMIZED: Faster sub-clustering using all CPU cores"""
         if self.clustered_df is None:
@@ -211,7 +357,7 @@ class AccidentClusterAnalyzer:
                 dates = cluster_points['date']
                 
                 cluster_temporal_weights = self.calculate_temporal_weights(dates)
-                cluster_trends = self.analyze_accident_trends(coordinates, dates)
+                cluster_trends = self.analyze_accident_trends(coordinates)
                 
                 scaler = StandardScaler()
                 normalized_coords = scaler.fit_transform(coordinates)
@@ -249,7 +395,8 @@ class AccidentClusterAnalyzer:
                                 next_cluster_id += 1
                             mapped_labels.append(label_mapping[label])
                     
-                    self.clustered_df.loc[cluster_points.index, "cluster"] = mapped_labels
+                    # Same dtype as the compact int32 label column (a list of mixed ints is rejected)
+                    self.clustered_df.loc[cluster_points.index, "cluster"] = np.asarray(mapped_labels, dtype=self.clustered_df["cluster"].dtype)
         
         self.remove_cluster_outliers()
         self.renumber_clusters_sequentially()
@@ -300,13 +447,30 @@ class AccidentClusterAnalyzer:
         cluster_mapping = {old_id: new_id for new_id, old_id in enumerate(unique_clusters)}
         cluster_mapping[-1] = -1
         
-        self.clustered_df["cluster"] = self.clustered_df["cluster"].map(cluster_mapping)
+        self.clustered_df["cluster"] = self.clustered_df["cluster"].map(cluster_mapping).astype(np.int32)
+
+    def assign_barangays_from_polygons(self):
+        """Replace the barangay column with the polygon containing each point (where one does)"""
+        index = get_barangay_index()
+        if index is None or self.clustered_df is None:
+            return
+        
+        original = self.clustered_df["barangay"] if "barangay" in self.clustered_df.columns else None
+        resolved = index.assign_names(self.clustered_df["latitude"].values, self.clustered_df["longitude"].values)
+        resolved.index = self.clustered_df.index
+        if original is not None:
+            resolved = resolved.fillna(original.astype("string"))
+        self.clustered_df["barangay"] = resolved.astype("category")
 
     # ======================================================
     # CLUSTER STATS (SIMPLIFIED FOR SPEED)
     # ======================================================
+    @instrumented(rows="self.cluster_centers")
     def calculate_cluster_centers(self):
         """OPTIMIZED: Simplified validation logic for faster processing"""
+        if self.use_barangay_polygons:
+            self.assign_barangays_from_polygons()
+        
         stats = []
         
         # OPTIMIZATION: Use groupby for faster processing
@@ -391,29 +555,60 @@ class AccidentClusterAnalyzer:
         # Sort by danger score
         stats = sorted(stats, key=lambda x: x["danger_score"], reverse=True)
         self.cluster_centers = stats
+        
+        # Footprint polygon per (renumbered) cluster
+        self.cluster_footprints = cluster_footprints(
+            self.clustered_df["cluster"].to_numpy(),
+            self.clustered_df["latitude"].to_numpy(),
+            self.clustered_df["longitude"].to_numpy()
+        )
 
     # ======================================================
     # EXPORT (OPTIMIZED)
     # ======================================================
+    @instrumented(rows="self.clustered_df")
     def export_to_geojson(self, filename="accidents_clustered.geojson"):
         """OPTIMIZED: Faster GeoJSON export"""
         if self.clustered_df is None:
             return
         
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        data_folder = os.path.join(script_dir, "data")
-        os.makedirs(data_folder, exist_ok=True)
-        output = os.path.join(data_folder, filename)
+        os.makedirs(self.data_folder, exist_ok=True)
+        output = os.path.join(self.data_folder, filename)
 
+        features = self.point_features() + self.center_features()
+        geojson = {"type": "FeatureCollection", "features": features}
+        
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(geojson, f, indent=2, ensure_ascii=False)
+
+    @instrumented(rows=lambda index, *_, **__: index["rows"] if index else 0)
+    def export_filter_index(self, output=FILTER_INDEX_FILE):
+        """Export per-value row bitmaps for the map filters (rows in accidents_clustered.geojson order)"""
+        if self.clustered_df is None:
+            return None
+        
+        return write_filter_index(self.clustered_df, output=output)
+
+    def point_features(self):
+        """One GeoJSON point feature per accident, in clustered_df row order"""
+        # Several exports (GeoJSON, shards, patches) need the same features;
+        # build them once per clustering result
+        cache_key = (id(self.clustered_df), len(self.clustered_df),
+                     int(pd.util.hash_pandas_object(self.clustered_df["cluster"], index=False).sum()))
+        if self._point_features_cache is not None and self._point_features_cache[0] == cache_key:
+            return self._point_features_cache[1]
+        
         features = []
         
+        excluded_columns = {"longitude", "latitude", "date_imputed"}
+        
         # OPTIMIZATION: Vectorized property conversion
         for _, row in self.clustered_df.iterrows():
             properties = {k: (v.item() if isinstance(v, (np.integer, np.floating)) else
                             v.tolist() if isinstance(v, np.ndarray) else
                             None if pd.isna(v) else
                             v.isoformat() if isinstance(v, pd.Timestamp) else v)
-                         for k, v in row.items() if k not in ["longitude", "latitude"]}
+                         for k, v in row.items() if k not in excluded_columns}
             
             properties["type"] = "accident_point"
             
@@ -422,8 +617,12 @@ class AccidentClusterAnalyzer:
                 "geometry": {"type": "Point", "coordinates": [row["longitude"], row["latitude"]]},
                 "properties": properties
             })
-        
-        # Add cluster centers
+        self._point_features_cache = (cache_key, features)
+        return features
+
+    def center_features(self):
+        """One GeoJSON point feature per cluster center, in cluster_centers order"""
+        features = []
         if self.cluster_centers:
             for cluster in self.cluster_centers:
                 cluster_properties = cluster.copy()
@@ -434,56 +633,202 @@ class AccidentClusterAnalyzer:
                     "geometry": {"type": "Point", "coordinates": [cluster["center_lon"], cluster["center_lat"]]},
                     "properties": cluster_properties
                 })
+        return features
+
+    @instrumented(rows=lambda index, *_, **__: len(index["shards"]) if index else 0)
+    def export_geohash_shards(self, folder=SHARDS_FOLDER):
+        """Export points + centers split into geohash cells (one small file each) with a hashed index"""
+        if self.clustered_df is None:
+            return None
         
-        geojson = {"type": "FeatureCollection", "features": features}
+        return write_shards(self.point_features(), self.center_features(), folder=folder)
+
+    @instrumented(rows=lambda index, *_, **__: len(index.get("patches", [])) if index else 0)
+    def export_delta_patch(self, folder=PATCHES_FOLDER):
+        """Diff against the previous version and write the next delta patch (see delta_patches.py)"""
+        if self.clustered_df is None or self.is_preview:
+            return None  # Preview labels are approximate; only full runs are versioned
         
-        with open(output, "w", encoding="utf-8") as f:
-            json.dump(geojson, f, indent=2, ensure_ascii=False)
+        return write_versioned_output(self.point_features(), self.center_features(), folder=folder)
 
+    @instrumented(rows="self.cluster_centers")
     def export_cluster_centers(self, filename="cluster_centers.json"):
         """Export cluster centers"""
         if not self.cluster_centers:
             return
         
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        data_folder = os.path.join(script_dir, "data")
-        output = os.path.join(data_folder, filename)
-            
-        with open(output, "w", encoding="utf-8") as f:
+        output = os.path.join(self.data_folder, filename)
+        
+        # Write to a temp file and swap it in, so readers (hotspot_service.py)
+        # never see a half-written file
+        tmp_output = output + ".tmp"
+        with open(tmp_output, "w", encoding="utf-8") as f:
             json.dump(self.cluster_centers, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_output, output)
+
+    @instrumented(rows="self.cluster_footprints")
+    def export_cluster_footprints(self, filename="cluster_footprints.geojson"):
+        """Export one footprint polygon per cluster (a small layer instead of every member point)"""
+        if not self.cluster_centers or not self.cluster_footprints:
+            return
+        
+        features = []
+        for center in self.cluster_centers:
+            footprint = self.cluster_footprints.get(center["cluster_id"])
+            if footprint is None:
+                continue
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "Polygon", "coordinates": [footprint["ring"]]},
+                "properties": {
+                    "cluster_id": center["cluster_id"],
+                    "accident_count": center["accident_count"],
+                    "danger_score": center["danger_score"],
+                    "area_m2": footprint["area_m2"],
+                    **({"preview": True} if center.get("preview") else {})
+                }
+            })
+        
+        output = os.path.join(self.data_folder, filename)
+        tmp_output = output + ".tmp"
+        with open(tmp_output, "w", encoding="utf-8") as f:
+            json.dump({"type": "FeatureCollection", "features": features}, f, separators=(",", ":"), ensure_ascii=False)
+        os.replace(tmp_output, output)
+
+    @instrumented(rows=lambda tile_count, *_, **__: tile_count)
+    def export_tile_pyramid(self, folder=TILES_FOLDER):
+        """Export per-zoom grid tiles (counts by severity + dominant cluster per cell) for the map"""
+        if self.clustered_df is None:
+            return 0
+        
+        df = self.clustered_df
+        if "severity" in df.columns:
+            severity = df["severity"].astype("category")
+            severity_codes, severity_labels = severity.cat.codes.to_numpy(), list(severity.cat.categories)
+        else:
+            severity_codes, severity_labels = np.full(len(df), -1), []
+        
+        return write_tile_pyramid(
+            df["latitude"].to_numpy(), df["longitude"].to_numpy(),
+            severity_codes, severity_labels, df["cluster"].to_numpy(), folder=folder
+        )
+
+    @instrumented(rows=lambda index, *_, **__: index["points"] if index else 0)
+    def export_heatmaps(self, folder=HEATMAP_FOLDER):
+        """Export temporally weighted kernel-density rasters (PNG + index.json) for the heatmap layer"""
+        df = self.clustered_df if self.clustered_df is not None else self.df
+        if df is None or df.empty:
+            return None
+        
+        weights = df["temporal_weight"] if "temporal_weight" in df.columns else self.calculate_temporal_weights(df["date"])
+        return write_heatmaps(
+            df["latitude"].to_numpy(), df["longitude"].to_numpy(), np.asarray(weights, dtype=np.float64),
+            folder=folder, decay_rate=self.decay_rate
+        )
 
     # ======================================================
     # MAIN PIPELINE (WITH TIMING)
     # ======================================================
-    def main(self, auto_tune=False, export_alerts=False):
-        """OPTIMIZED: Main pipeline - runs silently, progress shown by backend"""
+    def run_analysis(self, preview=False):
+        """Load, cluster and summarize without writing any output files
+
+        preview: True for a sampled preview run, "auto" to preview from
+        PREVIEW_MIN_POINTS points up, False for the full run.
+        """
         if not self.load_geojson_data():
-            return
+            return False
         if not self.preprocess_data():
-            return
+            return False
+        
+        if preview == "auto":
+            preview = len(self.df) >= PREVIEW_MIN_POINTS
+        self.is_preview = bool(preview)
         
         # Calculate dynamic sub-clustering threshold
         self.highway_cluster_threshold = max(300, int(len(self.df) * 0.035))
         
         # Fixed parameters for full dataset
-        min_cluster_size = 25
-        min_samples = 15
-        epsilon = 0.0000008
-        
-        self.perform_clustering(
-            min_cluster_size=min_cluster_size,
-            min_samples=min_samples,
-            cluster_selection_epsilon=epsilon
-        )
+        min_cluster_size = MIN_CLUSTER_SIZE
+        min_samples = MIN_SAMPLES
+        epsilon = CLUSTER_SELECTION_EPSILON
+        
+        if self.is_preview:
+            self.perform_preview_clustering(
+                min_cluster_size=min_cluster_size,
+                min_samples=min_samples,
+                cluster_selection_epsilon=epsilon
+            )
+        else:
+            self.perform_clustering(
+                min_cluster_size=min_cluster_size,
+                min_samples=min_samples,
+                cluster_selection_epsilon=epsilon
+            )
+            self.temporal_subcluster_large_clusters()
         
-        self.temporal_subcluster_large_clusters()
         self.calculate_cluster_centers()
+        if self.is_preview:
+            for center in self.cluster_centers:
+                center["preview"] = True
+        return True
+
+    def input_fingerprint(self):
+        """mtime + size of the input GeoJSON (changes when export_geojson.py writes a new snapshot)"""
+        stat = os.stat(self.file_path)
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def start_full_run(self):
+        """Detached full-fidelity run that replaces (and republishes) this preview's outputs"""
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        log_path = os.path.join(self.data_folder, FULL_RUN_LOG)
+        command = [sys.executable, os.path.abspath(__file__), "--full", "--publish",
+                   "--if-input", self.input_fingerprint()]
+        with open(log_path, "a", encoding="utf-8") as log:
+            process = subprocess.Popen(command, cwd=script_dir, stdin=subprocess.DEVNULL,
+                                       stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+        print(f" Preview published; full clustering continues in the background (pid {process.pid}, log data/{FULL_RUN_LOG})", flush=True)
+        return process.pid
+
+    def main(self, auto_tune=False, export_alerts=False, preview="auto", publish=False, if_input=None):
+        """OPTIMIZED: Main pipeline - runs silently, progress shown by backend"""
+        if not self.run_analysis(preview=preview):
+            return
+        
+        if if_input and self.input_fingerprint() != if_input:
+            # A newer export arrived while this run was going; its own run owns the outputs
+            print(" Input changed since this run started - leaving outputs to the newer run", flush=True)
+            return
         
         self.export_to_geojson()
+        self.export_filter_index()
+        self.export_geohash_shards()
+        self.export_delta_patch()
         self.export_cluster_centers()
+        self.export_cluster_footprints()
+        self.export_tile_pyramid()
+        self.export_heatmaps()
+        
+        if publish:
+            from mobile_cluster_fetch import publish_artifacts, get_bucket, PublishError  # Lazy: only publishing needs Supabase
+            try:
+                publish_artifacts(get_bucket())
+            except PublishError as e:
+                print(f" Publish failed (outputs are kept locally): {e}", flush=True)
+        if self.is_preview:
+            self.start_full_run()
 
 
 if __name__ == "__main__":
+    maybe_start_profiler()
+    parser = argparse.ArgumentParser(description="Cluster accidents.geojson with HDBSCAN")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--preview", action="store_true", help="Sampled preview now, full run in the background")
+    mode.add_argument("--full", action="store_true", help="Full run only, even for large datasets")
+    parser.add_argument("--publish", action="store_true", help="Publish the outputs to Supabase Storage when done")
+    parser.add_argument("--if-input", metavar="FINGERPRINT", help="Skip writing outputs if accidents.geojson changed since")
+    args = parser.parse_args()
+
     analyzer = AccidentClusterAnalyzer()
-    analyzer.main()
+    analyzer.main(preview=True if args.preview else False if args.full else "auto",
+                  publish=args.publish, if_input=args.if_input)
 
@@ -0,0 +1,87 @@
+import json
+import time
+import argparse
+import numpy as np
+from hdbscan import HDBSCAN
+from sklearn.metrics import adjusted_rand_score, normalized_mutual_info_score
+from cluster_hdbscan import AccidentClusterAnalyzer, MIN_CLUSTER_SIZE, MIN_SAMPLES, CLUSTER_SELECTION_EPSILON
+from partitioned_clustering import partitioned_hdbscan, MAX_TILE_POINTS, HALO_METERS
+from metrics import emit_metric
+
+# ==============================
+# Monolithic vs partitioned clustering
+# ==============================
+# Runs both modes on the same points with run_analysis()'s parameters and
+# reports wall time and how close the partitioned labels are to the monolithic
+# ones:
+#
+#   python compare_clustering.py                      # accidents.geojson as is
+#   python compare_clustering.py --copies 4           # 4 shifted copies ("provinces")
+#   python compare_clustering.py --tile-points 5000   # force more, smaller tiles
+#
+# ari / nmi: adjusted Rand index / normalized mutual information (1.0 = identical)
+# noise_agreement: share of points both runs call noise or both call clustered
+COPY_SHIFT_DEGREES = 0.5  # Each copy moves this far east so copies never overlap
+
+
+def load_points(copies: int = 1):
+    analyzer = AccidentClusterAnalyzer()
+    if not analyzer.load_geojson_data() or not analyzer.preprocess_data():
+        raise SystemExit("Could not load accidents.geojson")
+    lat = analyzer.df["latitude"].to_numpy(dtype=np.float64)
+    lon = analyzer.df["longitude"].to_numpy(dtype=np.float64)
+    return (np.tile(lat, copies),
+            np.concatenate([lon + COPY_SHIFT_DEGREES * copy for copy in range(copies)]))
+
+
+def monolithic_labels(lat, lon):
+    clusterer = HDBSCAN(
+        min_cluster_size=MIN_CLUSTER_SIZE,
+        min_samples=MIN_SAMPLES,
+        metric="haversine",
+        cluster_selection_epsilon=CLUSTER_SELECTION_EPSILON,
+        core_dist_n_jobs=-1
+    )
+    return clusterer.fit_predict(np.radians(np.column_stack([lat, lon]))).astype(np.int32)
+
+
+def compare(lat, lon, tile_points=MAX_TILE_POINTS, halo_meters=HALO_METERS, workers=None) -> dict:
+    started = time.perf_counter()
+    reference = monolithic_labels(lat, lon)
+    monolithic_s = time.perf_counter() - started
+
+    options = {"max_workers": workers} if workers else {}
+    started = time.perf_counter()
+    labels = partitioned_hdbscan(lat, lon, MIN_CLUSTER_SIZE, MIN_SAMPLES, CLUSTER_SELECTION_EPSILON,
+                                 max_tile_points=tile_points, halo_meters=halo_meters, **options)
+    partitioned_s = time.perf_counter() - started
+
+    return {
+        "points": len(lat),
+        "tile_points": tile_points,
+        "halo_meters": halo_meters,
+        "monolithic_s": round(monolithic_s, 3),
+        "partitioned_s": round(partitioned_s, 3),
+        "speedup": round(monolithic_s / partitioned_s, 2) if partitioned_s else None,
+        "monolithic_clusters": int(reference.max()) + 1,
+        "partitioned_clusters": int(labels.max()) + 1,
+        "monolithic_noise": round(float((reference < 0).mean()), 4),
+        "partitioned_noise": round(float((labels < 0).mean()), 4),
+        "ari": round(float(adjusted_rand_score(reference, labels)), 4),
+        "nmi": round(float(normalized_mutual_info_score(reference, labels)), 4),
+        "noise_agreement": round(float(((reference < 0) == (labels < 0)).mean()), 4),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare monolithic and partitioned HDBSCAN")
+    parser.add_argument("--copies", type=int, default=1, help="Shifted copies of the dataset to cluster")
+    parser.add_argument("--tile-points", type=int, default=MAX_TILE_POINTS, help="Max points per tile")
+    parser.add_argument("--halo", type=float, default=HALO_METERS, help="Halo width in metres")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: cores - 1)")
+    args = parser.parse_args()
+
+    lat, lon = load_points(args.copies)
+    report = compare(lat, lon, args.tile_points, args.halo, args.workers)
+    emit_metric("compare_clustering", **report)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,214 @@
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime, timezone
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# Versioned outputs with delta patches
+# ==============================
+# Every clustering run rewrites accidents_clustered.geojson in full even when
+# little changed. This keeps a versioned copy of the output that clients can
+# update incrementally:
+#
+#   data/patches/index.json                   current version, snapshot + patch chain (with sha256)
+#   data/patches/snapshot-<v>.json            full state at version v
+#   data/patches/patch-<v>-<v+1>.json         added / changed features and removed keys
+#   data/patches/.current.json                full state at the latest version (not published)
+#
+# A client at version N downloads patch N->N+1, N+1->N+2, ... up to the current
+# version; a new client (or one older than every listed patch) downloads the
+# snapshot and the patches after it.
+#
+# Identity: points are keyed by their accident "id". Cluster ids are renumbered
+# on every run, so clusters get a stable key instead: a new cluster inherits
+# the key of the previous cluster it shares most members with (Jaccard >=
+# MATCH_JACCARD); otherwise it gets a new key. Point features carry that key
+# in "cluster", centers in "cluster_id".
+#
+# Compaction: once MAX_PATCH_CHAIN patches follow the snapshot, or they add up
+# to more than COMPACT_RATIO of its size, the current state is written as a
+# new snapshot. Only the last MAX_PATCH_CHAIN patches are kept.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PATCHES_FOLDER = os.path.join(SCRIPT_DIR, "data", "patches")
+STATE_FILE_NAME = ".current.json"
+
+MATCH_JACCARD = 0.5
+MAX_PATCH_CHAIN = 10
+COMPACT_RATIO = 0.5
+VOLATILE_PROPERTIES = {"temporal_weight", "trend_score"}  # Recomputed from the run date; clients can derive them
+
+
+def point_key(feature) -> str:
+    properties = feature["properties"]
+    if properties.get("id") is not None:
+        return str(properties["id"])
+    # No database id: fall back to the record's content
+    lon, lat = feature["geometry"]["coordinates"][:2]
+    signature = f"{lat}|{lon}|{properties.get('datecommitted')}|{properties.get('timecommitted')}|{properties.get('offensetype')}"
+    return "h" + hashlib.sha1(signature.encode("utf-8")).hexdigest()[:16]
+
+
+def match_cluster_keys(new_clusters: pd.Series, previous_keys: pd.Series, next_key: int):
+    """Map run-local cluster ids to stable keys
+
+    Args:
+        new_clusters: Run-local cluster id per point key (-1 = noise)
+        previous_keys: Stable cluster key per point key from the previous version
+        next_key: First unused stable key
+
+    Returns ({run-local id: stable key}, next unused key)
+    """
+    new_clusters = new_clusters[new_clusters >= 0]
+    previous_keys = previous_keys[previous_keys >= 0]
+    new_sizes = new_clusters.value_counts()
+    previous_sizes = previous_keys.value_counts()
+
+    both = pd.DataFrame({"new": new_clusters, "previous": previous_keys.reindex(new_clusters.index)}).dropna()
+    overlap = both.groupby(["new", "previous"]).size().rename("overlap").reset_index()
+    overlap["jaccard"] = overlap["overlap"] / (
+        overlap["new"].map(new_sizes) + overlap["previous"].map(previous_sizes) - overlap["overlap"])
+    overlap = overlap[overlap["jaccard"] >= MATCH_JACCARD].sort_values("jaccard", ascending=False)
+
+    mapping, taken = {}, set()
+    for row in overlap.itertuples(index=False):
+        if row.new not in mapping and row.previous not in taken:
+            mapping[int(row.new)] = int(row.previous)
+            taken.add(row.previous)
+    for cluster in sorted(new_sizes.index):
+        if int(cluster) not in mapping:
+            mapping[int(cluster)] = next_key
+            next_key += 1
+    return mapping, next_key
+
+
+def versioned_features(point_features, center_features, state):
+    """({point key: feature}, {cluster key: feature}, next key) with stable cluster keys"""
+    keys = [point_key(feature) for feature in point_features]
+    new_clusters = pd.Series([int(feature["properties"].get("cluster", -1)) for feature in point_features], index=keys)
+    previous_keys = pd.Series({key: int(feature["properties"].get("cluster", -1))
+                               for key, feature in state.get("points", {}).items()}, dtype="int64")
+    mapping, next_key = match_cluster_keys(new_clusters, previous_keys, int(state.get("next_cluster_key", 0)))
+
+    points = {}
+    for key, feature in zip(keys, point_features):
+        properties = {k: v for k, v in feature["properties"].items() if k not in VOLATILE_PROPERTIES}
+        properties["cluster"] = mapping.get(int(properties.get("cluster", -1)), -1)
+        points[key] = {"type": "Feature", "geometry": feature["geometry"], "properties": properties}
+
+    centers = {}
+    for feature in center_features:
+        properties = dict(feature["properties"])
+        properties["cluster_id"] = mapping.get(int(properties["cluster_id"]), properties["cluster_id"])
+        centers[str(properties["cluster_id"])] = {"type": "Feature", "geometry": feature["geometry"], "properties": properties}
+    return points, centers, next_key
+
+
+def _canonical(feature) -> str:
+    return json.dumps(feature, sort_keys=True, separators=(",", ":"), default=float)
+
+
+def diff_features(previous: dict, current: dict) -> dict:
+    """{"added": [features], "changed": [features], "removed": [keys]}"""
+    added = [current[key] for key in current.keys() - previous.keys()]
+    removed = sorted(previous.keys() - current.keys())
+    changed = [current[key] for key in current.keys() & previous.keys()
+               if _canonical(current[key]) != _canonical(previous[key])]
+    return {"added": added, "changed": changed, "removed": removed}
+
+
+def _write_json(path: str, data, indent=None) -> dict:
+    """Atomic write; returns {"file", "sha256", "size"}"""
+    payload = json.dumps(data, separators=None if indent else (",", ":"), indent=indent,
+                         ensure_ascii=False, default=float).encode("utf-8")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return {"file": os.path.basename(path), "sha256": hashlib.sha256(payload).hexdigest(), "size": len(payload)}
+
+
+def _load_json(path: str, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _snapshot(version: int, points: dict, centers: dict) -> dict:
+    return {"type": "FeatureCollection", "version": version,
+            "features": list(points.values()) + list(centers.values())}
+
+
+def write_versioned_output(point_features, center_features, folder=PATCHES_FOLDER) -> dict:
+    """Diff this run against the latest version and write the next patch (or a new snapshot)
+
+    Returns the index (unchanged when nothing differs from the latest version).
+    """
+    os.makedirs(folder, exist_ok=True)
+    state_path = os.path.join(folder, STATE_FILE_NAME)
+    index_path = os.path.join(folder, "index.json")
+    state = _load_json(state_path, {})
+    index = _load_json(index_path, {})
+    if state.get("version") != index.get("version"):
+        state, index = {}, {}  # Out of step (e.g. interrupted run): start over from a snapshot
+
+    points, centers, next_key = versioned_features(point_features, center_features, state)
+    version = int(state.get("version", 0))
+    patch = {
+        "points": diff_features(state.get("points", {}), points),
+        "centers": diff_features(state.get("centers", {}), centers),
+    }
+    changes = sum(len(part[kind]) for part in patch.values() for kind in ("added", "changed", "removed"))
+    if state and changes == 0:
+        logger.info(f"Output unchanged - staying at version {version}")
+        return index
+
+    version += 1
+    chain = index.get("patches", [])
+    snapshot = index.get("snapshot")
+    if state:
+        entry = _write_json(os.path.join(folder, f"patch-{version - 1}-{version}.json"),
+                            {"from": version - 1, "to": version, **patch})
+        chain = chain + [{"from": version - 1, "to": version, **entry}]
+
+    # Patches from before the snapshot stay listed (up to MAX_PATCH_CHAIN) so
+    # clients holding those versions can still update without the snapshot
+    chain = chain[-MAX_PATCH_CHAIN:]
+    since_snapshot = [item for item in chain if snapshot and item["from"] >= snapshot["version"]]
+    if (snapshot is None or len(since_snapshot) >= MAX_PATCH_CHAIN or
+            sum(item["size"] for item in since_snapshot) > COMPACT_RATIO * snapshot["size"]):
+        snapshot = {"version": version, **_write_json(os.path.join(folder, f"snapshot-{version}.json"),
+                                                      _snapshot(version, points, centers))}
+
+    _write_json(state_path, {"version": version, "next_cluster_key": next_key, "points": points, "centers": centers})
+    index = {
+        "version": version,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "snapshot": snapshot,
+        "patches": chain,
+    }
+    _write_json(index_path, index, indent=2)
+
+    # Files no longer referenced by the index (compacted chains, older snapshots)
+    referenced = {"index.json", STATE_FILE_NAME, snapshot["file"]} | {item["file"] for item in chain}
+    for name in os.listdir(folder):
+        if name.endswith(".json") and name not in referenced:
+            os.remove(os.path.join(folder, name))
+
+    logger.info(f"Version {version}: {changes} feature changes, {len(chain)} patches listed, snapshot at version {snapshot['version']}")
+    return index
+
+
+def patch_files(folder=PATCHES_FOLDER):
+    """Relative paths (index first) of the published patch files, per index.json"""
+    index = _load_json(os.path.join(folder, "index.json"), None)
+    if not index:
+        return []
+    name = os.path.basename(folder)
+    return ([f"{name}/index.json", f"{name}/{index['snapshot']['file']}"] +
+            [f"{name}/{item['file']}" for item in index.get("patches", [])])
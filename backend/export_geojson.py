@@ -2,16 +2,16 @@ import json
 import os
 import logging
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase_io import get_io
+from metrics import instrumented, maybe_start_profiler
+from rollup_cube import refresh_cube
+import trend_cube
 
 load_dotenv()
 
 # ==============================
 # CONFIGURATION
 # ==============================
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 TABLE_NAME = 'road_traffic_accident'
 
 # ==============================
@@ -20,11 +20,6 @@ TABLE_NAME = 'road_traffic_accident'
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# ==============================
-# SUPABASE CLIENT
-# ==============================
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-
 # ==============================
 # FUNCTIONS
 # ==============================
@@ -41,29 +36,18 @@ def get_output_path():
     output_path = os.path.join(data_folder, "accidents.geojson")
     return output_path
 
+@instrumented()
 def fetch_all_data(batch_size=1000):
     """Fetch all accident records from Supabase with pagination"""
-    all_data = []
-    start = 0
-
     logger.info(" Fetching data from Supabase...")
     
-    while True:
-        response = supabase.table(TABLE_NAME).select("*").range(start, start + batch_size - 1).execute()
-        if hasattr(response, "error") and response.error:
-            raise Exception(f"Supabase fetch error: {response.error}")
-        
-        data = response.data if hasattr(response, "data") else []
-        if not data:
-            break
-
-        all_data.extend(data)
-        logger.info(f"Fetched {len(data)} records (total: {len(all_data)})")
-        start += batch_size
+    # First page reports the row count; the remaining pages are fetched concurrently
+    all_data = get_io().fetch_all_sync(TABLE_NAME, page_size=batch_size)
 
     logger.info(f" Total records fetched: {len(all_data)}")
     return all_data
 
+@instrumented(rows=lambda geojson, *_: len(geojson["features"]))
 def to_geojson(data):
     """Convert Supabase rows to GeoJSON format"""
     features = []
@@ -115,6 +99,7 @@ def to_geojson(data):
         }
     }
 
+@instrumented(rows=lambda saved, geojson, *_: len(geojson["features"]))
 def save_geojson(geojson, output_path):
     """Save GeoJSON to file"""
     try:
@@ -155,6 +140,17 @@ def main():
         # Save GeoJSON file
         success = save_geojson(geojson, output_path)
         
+        # Rebuild the dashboard rollup cube and the trend cube from the same snapshot
+        # (unless cleaning2's incremental updates already brought them to it)
+        try:
+            refresh_cube(rows)
+        except Exception as e:
+            logger.warning(f" Could not rebuild rollup cube: {e}")
+        try:
+            trend_cube.refresh_cube(rows)
+        except Exception as e:
+            logger.warning(f" Could not rebuild trend cube: {e}")
+        
         if success:
             logger.info(" Supabase to GeoJSON export completed successfully!")
             return True
@@ -167,4 +163,5 @@ def main():
         return False
 
 if __name__ == "__main__":
+    maybe_start_profiler()
     main()
\ No newline at end of file
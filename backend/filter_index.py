@@ -0,0 +1,138 @@
+import os
+import json
+import base64
+import logging
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# Filter indexes for the clustered export
+# ==============================
+# For each filterable attribute and each of its values, the set of accident
+# rows having it, so the map can answer a filter combination with a few
+# bitmap ANDs/ORs instead of scanning every feature:
+#
+#   data/filter_index.json
+#   {"rows": N, "attributes": {"severity": {"Critical": {"encoding", "count", "data"}, ...}, ...}, ...}
+#
+# Row i is the i-th feature of accidents_clustered.geojson (accident points
+# come first, cluster centers after them). Values are keyed the way the map
+# compares them (String(value).trim()); empty values are not indexed.
+#
+# Each value set is stored in whichever form is smaller, base64-encoded:
+#   "bitmap"  ceil(N / 8) bytes, bit i (little-endian within each byte) = row i
+#   "ids"     sorted row numbers as little-endian uint32
+# A query ORs the bitmaps of the selected values of one attribute and ANDs
+# the attributes together.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FILTER_INDEX_FILE = os.path.join(SCRIPT_DIR, "data", "filter_index.json")
+
+FILTER_ATTRIBUTES = ["year", "severity", "offensetype", "barangay"]
+FORMAT_VERSION = 1
+
+
+def filter_keys(values: pd.Series) -> pd.Series:
+    """String keys as the map compares them; None for values that aren't indexed"""
+    keys = values.astype("string").str.strip()
+    return keys.mask(keys == "").astype(object).where(keys.notna(), None)
+
+
+def encode_rows(rows: np.ndarray, row_count: int) -> dict:
+    """One value's row set (sorted row numbers) in its smaller encoding"""
+    if 4 * len(rows) < (row_count + 7) // 8:
+        encoding, data = "ids", rows.astype("<u4").tobytes()
+    else:
+        mask = np.zeros(row_count, dtype=bool)
+        mask[rows] = True
+        encoding, data = "bitmap", np.packbits(mask, bitorder="little").tobytes()
+    return {"encoding": encoding, "count": int(len(rows)), "data": base64.b64encode(data).decode("ascii")}
+
+
+def decode_rows(entry: dict, row_count: int) -> np.ndarray:
+    """Packed little-endian bitmap (uint8, ceil(rows / 8) bytes) for one encoded value"""
+    data = base64.b64decode(entry["data"])
+    if entry["encoding"] == "ids":
+        mask = np.zeros(row_count, dtype=bool)
+        mask[np.frombuffer(data, dtype="<u4")] = True
+        return np.packbits(mask, bitorder="little")
+    return np.frombuffer(data, dtype=np.uint8)
+
+
+def build_filter_index(frame: pd.DataFrame, attributes=FILTER_ATTRIBUTES) -> dict:
+    """Index for the rows of `frame` (in export order); missing attributes are left out"""
+    row_count = len(frame)
+    index = {}
+    for attribute in attributes:
+        if attribute not in frame.columns:
+            continue
+        keys = filter_keys(frame[attribute])
+        codes, values = pd.factorize(keys, sort=True, use_na_sentinel=True)
+        order = np.argsort(codes, kind="stable")  # Rows grouped by value, ascending within each
+        bounds = np.searchsorted(codes[order], np.arange(len(values) + 1))
+        index[attribute] = {str(value): encode_rows(order[bounds[i]:bounds[i + 1]], row_count)
+                            for i, value in enumerate(values)}
+    return {
+        "version": FORMAT_VERSION,
+        "rows": row_count,
+        "bit_order": "little",
+        "attributes": index,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def write_filter_index(frame: pd.DataFrame, output: str = FILTER_INDEX_FILE) -> dict:
+    """Build the index and write it atomically"""
+    index = build_filter_index(frame)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    tmp_output = output + ".tmp"
+    with open(tmp_output, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"), ensure_ascii=False)
+    os.replace(tmp_output, output)
+    values = sum(len(entries) for entries in index["attributes"].values())
+    logger.info(f" Filter index saved: {index['rows']} rows, {values} values")
+    return index
+
+
+# ==============================
+# Reader / query
+# ==============================
+def read_filter_index(path: str = FILTER_INDEX_FILE) -> dict:
+    """{"rows": N, "attributes": {attribute: {value: packed bitmap}}} from a saved index"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported filter index version: {data.get('version')}")
+    row_count = data["rows"]
+    return {
+        "rows": row_count,
+        "attributes": {attribute: {value: decode_rows(entry, row_count) for value, entry in entries.items()}
+                       for attribute, entries in data["attributes"].items()},
+    }
+
+
+def query_filter_index(index: dict, **filters) -> np.ndarray:
+    """Sorted row numbers matching every filter (a list/tuple/set value matches any of its values)
+
+    Example: query_filter_index(index, year=[2023, 2024], severity="Critical")
+    None / "all" / an empty list leave an attribute unfiltered, as in the map.
+    """
+    result = np.full((index["rows"] + 7) // 8, 0xFF, dtype=np.uint8)
+    for attribute, selected in filters.items():
+        if selected is None or selected == "all":
+            continue
+        selected = list(selected) if isinstance(selected, (list, tuple, set)) else [selected]
+        if not selected:
+            continue
+        if attribute not in index["attributes"]:
+            raise KeyError(f"Attribute is not indexed: {attribute}")
+        entries = index["attributes"][attribute]
+        matched = np.zeros_like(result)
+        for value in selected:
+            bitmap = entries.get(str(value).strip())
+            if bitmap is not None:
+                matched |= bitmap
+        result &= matched
+    return np.flatnonzero(np.unpackbits(result, count=index["rows"], bitorder="little"))
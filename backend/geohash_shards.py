@@ -0,0 +1,125 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+from datetime import datetime, timezone
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# Geohash-sharded cluster outputs
+# ==============================
+# Splits the clustered points and the cluster centers into fixed geohash
+# cells so the app can download only the area around its route:
+#
+#   data/shards/index.json          {"precision", "shards": {geohash: {"sha256", "size", "bounds", ...}}}
+#   data/shards/<geohash>.json      GeoJSON FeatureCollection (same features as
+#                                   accidents_clustered.geojson) for that cell
+#
+# Points go to the cell they fall in; a cluster center goes to the cell of its
+# center. Clients compare the per-shard sha256 with their cached copy and
+# re-fetch only the shards that changed.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SHARDS_FOLDER = os.path.join(SCRIPT_DIR, "data", "shards")
+
+PRECISION = 6  # ~1.2 km x 0.6 km cells
+BASE32 = np.array(list("0123456789bcdefghjkmnpqrstuvwxyz"))
+
+
+def geohash_encode(lat, lon, precision: int = PRECISION) -> np.ndarray:
+    """Geohash strings for arrays of coordinates (vectorized)"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    bits = 5 * precision
+    lon_bits, lat_bits = (bits + 1) // 2, bits // 2
+    lon_int = np.clip(((lon + 180.0) / 360.0 * (1 << lon_bits)).astype(np.int64), 0, (1 << lon_bits) - 1)
+    lat_int = np.clip(((lat + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64), 0, (1 << lat_bits) - 1)
+
+    # Interleave, longitude first (most significant bit)
+    code = np.zeros(len(lat), dtype=np.int64)
+    for bit in range(bits):
+        if bit % 2 == 0:
+            value = (lon_int >> (lon_bits - 1 - bit // 2)) & 1
+        else:
+            value = (lat_int >> (lat_bits - 1 - bit // 2)) & 1
+        code = (code << 1) | value
+
+    chars = np.stack([BASE32[(code >> (5 * (precision - 1 - i))) & 31] for i in range(precision)], axis=1)
+    return np.array(["".join(row) for row in chars]) if len(chars) else np.array([], dtype=str)
+
+
+def geohash_bounds(geohash: str):
+    """(west, south, east, north) of a geohash cell"""
+    lon_range, lat_range = [-180.0, 180.0], [-90.0, 90.0]
+    is_lon = True
+    for char in geohash:
+        value = int(np.flatnonzero(BASE32 == char)[0])
+        for shift in range(4, -1, -1):
+            bounds = lon_range if is_lon else lat_range
+            middle = (bounds[0] + bounds[1]) / 2.0
+            if (value >> shift) & 1:
+                bounds[0] = middle
+            else:
+                bounds[1] = middle
+            is_lon = not is_lon
+    return lon_range[0], lat_range[0], lon_range[1], lat_range[1]
+
+
+def write_shards(point_features, center_features, folder=SHARDS_FOLDER, precision: int = PRECISION) -> dict:
+    """Write one GeoJSON file per geohash cell plus index.json (swapped in as a whole)"""
+    shards = {}
+    for features in (point_features, center_features):
+        coordinates = np.array([feature["geometry"]["coordinates"][:2] for feature in features], dtype=np.float64).reshape(-1, 2)
+        hashes = geohash_encode(coordinates[:, 1], coordinates[:, 0], precision)
+        for feature, geohash in zip(features, hashes):
+            shards.setdefault(str(geohash), []).append(feature)
+
+    tmp_folder = folder + ".tmp"
+    shutil.rmtree(tmp_folder, ignore_errors=True)
+    os.makedirs(tmp_folder)
+
+    entries = {}
+    for geohash in sorted(shards):
+        features = shards[geohash]
+        data = json.dumps({"type": "FeatureCollection", "geohash": geohash, "features": features},
+                          separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        with open(os.path.join(tmp_folder, f"{geohash}.json"), "wb") as f:
+            f.write(data)
+        entries[geohash] = {
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "size": len(data),
+            "bounds": [round(value, 6) for value in geohash_bounds(geohash)],  # west, south, east, north
+            "points": sum(1 for feature in features if feature["properties"].get("type") == "accident_point"),
+            "clusters": sum(1 for feature in features if feature["properties"].get("type") == "cluster_center"),
+        }
+
+    index = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "precision": precision,
+        "shards": entries,
+    }
+    with open(os.path.join(tmp_folder, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+
+    old_folder = folder + ".old"
+    shutil.rmtree(old_folder, ignore_errors=True)
+    if os.path.exists(folder):
+        os.replace(folder, old_folder)
+    os.replace(tmp_folder, folder)
+    shutil.rmtree(old_folder, ignore_errors=True)
+
+    logger.info(f"Wrote {len(entries)} geohash shards to {folder}")
+    return index
+
+
+def shard_files(folder=SHARDS_FOLDER):
+    """Relative paths (index first) of the current shard files, per index.json"""
+    try:
+        with open(os.path.join(folder, "index.json"), "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return []
+    name = os.path.basename(folder)
+    return [f"{name}/index.json"] + [f"{name}/{geohash}.json" for geohash in sorted(index.get("shards", {}))]
@@ -0,0 +1,179 @@
+import os
+import json
+import zlib
+import shutil
+import struct
+import logging
+from datetime import datetime, timezone
+import numpy as np
+from scipy.signal import fftconvolve
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# Kernel-density heatmap rasters
+# ==============================
+# Precomputed heatmap layers so the map draws an image overlay instead of
+# aggregating every point in JavaScript. Each accident is weighted with its
+# temporal weight (calculate_temporal_weights: exp(-decay * years ago)), the
+# weights are binned onto a regular lat/lon grid and smoothed with a Gaussian
+# kernel by FFT convolution - cost depends on the grid size, not the number
+# of points.
+#
+#   data/heatmaps/index.json        levels, bounds, sizes, encoding
+#   data/heatmaps/<level>.png       8-bit grayscale, row 0 = north edge
+#
+# Pixel values are linear: density = value / 255 * max_density, in weighted
+# accidents per km^2. Draw a level with L.imageOverlay(url, [[south, west], [north, east]]).
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+HEATMAP_FOLDER = os.path.join(SCRIPT_DIR, "data", "heatmaps")
+
+# name -> (cell size in metres, kernel bandwidth (sigma) in metres)
+LEVELS = {
+    "coarse": (200.0, 600.0),
+    "medium": (100.0, 300.0),
+    "fine": (50.0, 150.0),
+}
+KERNEL_SIGMAS = 3  # Kernel truncated at 3 sigma; the grid is padded by as much
+MAX_GRID_CELLS = 4096 * 4096
+METERS_PER_DEGREE = 111_320.0
+
+
+def gaussian_kernel(sigma_cells: float) -> np.ndarray:
+    radius = max(1, int(np.ceil(KERNEL_SIGMAS * sigma_cells)))
+    offsets = np.arange(-radius, radius + 1)
+    profile = np.exp(-0.5 * (offsets / sigma_cells) ** 2)
+    kernel = np.outer(profile, profile)
+    return kernel / kernel.sum()
+
+
+def grid_extent(lat, lon, cell_meters, bandwidth_meters):
+    """(west, south, east, north, width, height) of the padded grid around the points"""
+    if not len(lat):
+        raise ValueError("no points")
+    lat_step = cell_meters / METERS_PER_DEGREE
+    lon_step = cell_meters / (METERS_PER_DEGREE * np.cos(np.radians(lat.mean())))
+    pad = KERNEL_SIGMAS * bandwidth_meters / cell_meters
+    west, east = lon.min() - pad * lon_step, lon.max() + pad * lon_step
+    south, north = lat.min() - pad * lat_step, lat.max() + pad * lat_step
+    width = max(1, int(np.ceil((east - west) / lon_step)))
+    height = max(1, int(np.ceil((north - south) / lat_step)))
+    return west, south, east, north, width, height
+
+
+def fitting_cell_meters(lat, lon, cell_meters, bandwidth_meters):
+    """Smallest cell size from cell_meters up whose grid fits in MAX_GRID_CELLS"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    while True:
+        *_, width, height = grid_extent(lat, lon, cell_meters, bandwidth_meters)
+        if width * height <= MAX_GRID_CELLS:
+            return cell_meters
+        # Cells scale with the square root of the area; round up so this converges in a step or two
+        cell_meters = float(np.ceil(cell_meters * np.sqrt(width * height / MAX_GRID_CELLS) * 1.01))
+
+
+def density_grid(lat, lon, weights, cell_meters, bandwidth_meters, bounds=None):
+    """Smoothed density (weighted accidents per km^2) on a grid; returns (grid, bounds)
+
+    grid[0] is the northernmost row. bounds is (west, south, east, north) of
+    the grid edges. Raises ValueError above MAX_GRID_CELLS (see fitting_cell_meters).
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    lat_step = cell_meters / METERS_PER_DEGREE
+    lon_step = cell_meters / (METERS_PER_DEGREE * np.cos(np.radians(lat.mean())))
+
+    if bounds is None:
+        west, south, east, north, width, height = grid_extent(lat, lon, cell_meters, bandwidth_meters)
+    else:
+        west, south, east, north = bounds
+        width = max(1, int(np.ceil((east - west) / lon_step)))
+        height = max(1, int(np.ceil((north - south) / lat_step)))
+    if width * height > MAX_GRID_CELLS:
+        raise ValueError(f"{width}x{height} grid is too large for {cell_meters} m cells")
+    east, north = west + width * lon_step, south + height * lat_step
+
+    counts, _, _ = np.histogram2d(lat, lon, bins=[height, width], range=[[south, north], [west, east]],
+                                  weights=weights)
+    density = fftconvolve(counts, gaussian_kernel(bandwidth_meters / cell_meters), mode="same")
+    density = np.clip(density, 0.0, None) / (cell_meters / 1000.0) ** 2  # per km^2; clip FFT round-off
+    return density[::-1], (float(west), float(south), float(east), float(north))
+
+
+def quantize(grid: np.ndarray):
+    """(uint8 array, max value) with value = q / 255 * max"""
+    peak = float(grid.max()) if grid.size else 0.0
+    if peak <= 0:
+        return np.zeros(grid.shape, dtype=np.uint8), 0.0
+    return np.round(grid / peak * 255.0).astype(np.uint8), peak
+
+
+def png_bytes(pixels: np.ndarray) -> bytes:
+    """Minimal 8-bit grayscale PNG encoder (no Pillow needed)"""
+    height, width = pixels.shape
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), pixels]).tobytes()  # Filter type 0 per row
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 9)) + chunk(b"IEND", b"")
+
+
+def write_heatmaps(lat, lon, weights, folder=HEATMAP_FOLDER, levels=LEVELS, decay_rate=None):
+    """Write every level's PNG plus index.json (swapped in as a whole); returns the index
+
+    A level whose grid would exceed MAX_GRID_CELLS (points spread over a much
+    larger area than the city) is written with coarser cells instead; one that
+    still can't be built is left out of the index.
+    """
+    tmp_folder = folder + ".tmp"
+    shutil.rmtree(tmp_folder, ignore_errors=True)
+    os.makedirs(tmp_folder)
+
+    entries = {}
+    for name, (requested_cell_meters, bandwidth_meters) in levels.items():
+        try:
+            cell_meters = fitting_cell_meters(lat, lon, requested_cell_meters, bandwidth_meters)
+            if cell_meters != requested_cell_meters:
+                logger.warning(f" Heatmap level {name}: {requested_cell_meters} m cells exceed "
+                               f"{MAX_GRID_CELLS} grid cells - using {cell_meters} m")
+            grid, bounds = density_grid(lat, lon, weights, cell_meters, bandwidth_meters)
+        except ValueError as e:
+            logger.warning(f" Heatmap level {name} skipped: {e}")
+            continue
+        pixels, peak = quantize(grid)
+        with open(os.path.join(tmp_folder, f"{name}.png"), "wb") as f:
+            f.write(png_bytes(pixels))
+        entries[name] = {
+            "file": f"{name}.png",
+            "cell_meters": cell_meters,
+            "requested_cell_meters": requested_cell_meters,
+            "bandwidth_meters": bandwidth_meters,
+            "width": int(pixels.shape[1]),
+            "height": int(pixels.shape[0]),
+            "bounds": list(bounds),  # west, south, east, north
+            "max_density": round(peak, 6),
+        }
+
+    index = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "points": int(len(lat)),
+        "weighting": {"kind": "temporal_decay", "decay_rate": decay_rate},
+        "units": "weighted accidents per km^2",
+        "encoding": "png-gray8-linear",  # density = value / 255 * max_density
+        "levels": entries,
+    }
+    with open(os.path.join(tmp_folder, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+
+    old_folder = folder + ".old"
+    shutil.rmtree(old_folder, ignore_errors=True)
+    if os.path.exists(folder):
+        os.replace(folder, old_folder)
+    os.replace(tmp_folder, folder)
+    shutil.rmtree(old_folder, ignore_errors=True)
+
+    logger.info(f"Wrote {len(entries)} heatmap levels to {folder}")
+    return index
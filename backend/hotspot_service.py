@@ -0,0 +1,321 @@
+import os
+import sys
+import json
+import time
+import math
+import logging
+import argparse
+import threading
+import numpy as np
+from scipy.spatial import cKDTree
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# ==============================
+# Logging
+# ==============================
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ==============================
+# Configuration
+# ==============================
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CENTERS_FILE = os.path.join(SCRIPT_DIR, "data", "cluster_centers.json")
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_ALERT_RADIUS_KM = 0.5   # Same radius the mobile alerts use
+DEFAULT_SEARCH_RADIUS_KM = 2.0
+RELOAD_CHECK_INTERVAL = 1.0     # Seconds between cluster_centers.json mtime checks
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = int(os.getenv("HOTSPOT_SERVICE_PORT", "5055"))
+
+# danger_score thresholds -> danger_level (highest first; a score must exceed the
+# threshold). Mirrors src/utils/dangerLevels.js so the app and the reports agree.
+DANGER_LEVELS = [(0.7, "CRITICAL"), (0.5, "HIGH"), (0.3, "MODERATE")]
+DEFAULT_DANGER_LEVEL = "LOW"
+HIGH_RISK_LEVELS = ("CRITICAL", "HIGH")
+TREND_THRESHOLD = 0.05
+
+
+# ==============================
+# Alert formatting
+# ==============================
+def danger_level_for(score: float) -> str:
+    for threshold, level in DANGER_LEVELS:
+        if score > threshold:
+            return level
+    return DEFAULT_DANGER_LEVEL
+
+
+def trend_for(avg_trend_score: float) -> str:
+    if avg_trend_score > TREND_THRESHOLD:
+        return "increasing"
+    if avg_trend_score < -TREND_THRESHOLD:
+        return "decreasing"
+    return "stable"
+
+
+def build_alert(center: dict) -> dict:
+    """Turn one cluster_centers.json entry into a mobile-style alert record"""
+    score = float(center.get("danger_score", 0))
+    level = danger_level_for(score)
+    recent = int(center.get("recent_accidents", 0))
+    trend = trend_for(float(center.get("avg_trend_score", 0)))
+
+    message = "High-risk accident area ahead." if level in HIGH_RISK_LEVELS else "Accident-prone area ahead."
+    if recent > 0:
+        message += f" {recent} recent accident{'s' if recent != 1 else ''} reported here."
+    if trend == "increasing":
+        message += " Accidents here are increasing."
+    message += " Drive carefully."
+
+    return {
+        "cluster_id": center.get("cluster_id"),
+        "center_lat": float(center["center_lat"]),
+        "center_lon": float(center["center_lon"]),
+        "radius_km": float(center.get("radius_km", DEFAULT_ALERT_RADIUS_KM)),
+        "danger_level": level,
+        "danger_score": score,
+        "accident_count": int(center.get("accident_count", 0)),
+        "recent_accidents": recent,
+        "trend": trend,
+        "alert_message": message,
+        "barangays": center.get("barangays", []),
+    }
+
+
+# ==============================
+# Spatial index
+# ==============================
+class HotspotSnapshot:
+    """Immutable KD-tree over one version of cluster_centers.json
+
+    Centers are projected to a local equirectangular plane in km, which is
+    accurate to well under 1% across a province; candidate distances are then
+    refined with the haversine formula.
+    """
+
+    def __init__(self, alerts: list, version: str):
+        self.alerts = alerts
+        self.version = version
+        lat = np.array([a["center_lat"] for a in alerts], dtype=np.float64)
+        lon = np.array([a["center_lon"] for a in alerts], dtype=np.float64)
+        self.lat_rad = np.radians(lat)
+        self.lon_rad = np.radians(lon)
+        self.cos_ref = math.cos(float(np.mean(self.lat_rad))) if len(alerts) else 1.0
+        self.tree = cKDTree(self._project(lat, lon)) if len(alerts) else None
+
+    def _project(self, lat, lon):
+        lat = np.radians(np.atleast_1d(np.asarray(lat, dtype=np.float64)))
+        lon = np.radians(np.atleast_1d(np.asarray(lon, dtype=np.float64)))
+        return np.column_stack([EARTH_RADIUS_KM * lon * self.cos_ref, EARTH_RADIUS_KM * lat])
+
+    def _haversine_km(self, lat: float, lon: float, idx: np.ndarray) -> np.ndarray:
+        lat1, lon1 = math.radians(lat), math.radians(lon)
+        dlat = self.lat_rad[idx] - lat1
+        dlon = self.lon_rad[idx] - lon1
+        a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(self.lat_rad[idx]) * np.sin(dlon / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+    def _results(self, lat, lon, idx, distances):
+        order = np.argsort(distances, kind="stable")
+        return [
+            {**self.alerts[i], "distance_km": round(float(d), 4),
+             "inside_alert_radius": bool(d <= self.alerts[i]["radius_km"])}
+            for i, d in zip(idx[order], distances[order])
+        ]
+
+    def within_radius(self, lat: float, lon: float, radius_km: float = DEFAULT_SEARCH_RADIUS_KM, limit: int = None):
+        if self.tree is None:
+            return []
+        # Small margin so projection error never drops a true neighbour
+        idx = np.asarray(self.tree.query_ball_point(self._project(lat, lon)[0], radius_km * 1.01), dtype=np.int64)
+        if len(idx) == 0:
+            return []
+        distances = self._haversine_km(lat, lon, idx)
+        keep = distances <= radius_km
+        results = self._results(lat, lon, idx[keep], distances[keep])
+        return results[:limit] if limit else results
+
+    def nearest(self, lat: float, lon: float, k: int = 5, max_radius_km: float = None):
+        if self.tree is None:
+            return []
+        k = min(k, len(self.alerts))
+        upper = max_radius_km * 1.01 if max_radius_km else np.inf
+        _, idx = self.tree.query(self._project(lat, lon)[0], k=k, distance_upper_bound=upper)
+        idx = np.atleast_1d(idx)
+        idx = idx[idx < len(self.alerts)]  # Missing neighbours come back as len(alerts)
+        distances = self._haversine_km(lat, lon, idx)
+        if max_radius_km:
+            keep = distances <= max_radius_km
+            idx, distances = idx[keep], distances[keep]
+        return self._results(lat, lon, idx, distances)
+
+
+class HotspotIndex:
+    """Hot-reloading wrapper: queries always see one complete snapshot
+
+    A reload builds the new snapshot off to the side and then swaps a single
+    reference, so concurrent queries never observe a half-built index. If the
+    file cannot be parsed (e.g. mid-write by an older exporter) the previous
+    snapshot stays in service.
+    """
+
+    def __init__(self, centers_path: str = CENTERS_FILE, check_interval: float = RELOAD_CHECK_INTERVAL):
+        self.centers_path = centers_path
+        self.check_interval = check_interval
+        self._snapshot = HotspotSnapshot([], version="empty")
+        self._file_key = None
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+        self.reload(force=True)
+
+    def reload(self, force: bool = False) -> bool:
+        """Rebuild the snapshot if cluster_centers.json changed; returns True if swapped"""
+        try:
+            stat = os.stat(self.centers_path)
+        except FileNotFoundError:
+            return False
+        file_key = (stat.st_mtime_ns, stat.st_size)
+        if not force and file_key == self._file_key:
+            return False
+
+        with self._reload_lock:
+            if not force and file_key == self._file_key:
+                return False
+            try:
+                with open(self.centers_path, "r", encoding="utf-8") as f:
+                    centers = json.load(f)
+                alerts = [build_alert(c) for c in centers if "center_lat" in c and "center_lon" in c]
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning(f" Keeping previous hotspot snapshot, could not load {self.centers_path}: {e}")
+                return False
+
+            self._snapshot = HotspotSnapshot(alerts, version=f"{file_key[0]}-{file_key[1]}")
+            self._file_key = file_key
+            logger.info(f" Loaded {len(alerts)} hotspots (version {self._snapshot.version})")
+            return True
+
+    @property
+    def snapshot(self) -> HotspotSnapshot:
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            self.reload()
+        return self._snapshot
+
+    def within_radius(self, lat, lon, radius_km=DEFAULT_SEARCH_RADIUS_KM, limit=None):
+        return self.snapshot.within_radius(lat, lon, radius_km, limit)
+
+    def nearest(self, lat, lon, k=5, max_radius_km=None):
+        return self.snapshot.nearest(lat, lon, k, max_radius_km)
+
+
+# ==============================
+# HTTP service
+# ==============================
+def make_handler(index: HotspotIndex):
+    class HotspotRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: dict):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+            if url.path == "/health":
+                snapshot = index.snapshot
+                return self._send_json(200, {"status": "ok", "version": snapshot.version, "hotspots": len(snapshot.alerts)})
+            if url.path != "/nearby":
+                return self._send_json(404, {"error": "Not found"})
+
+            try:
+                lat, lon = float(params["lat"]), float(params["lon"])
+            except (KeyError, ValueError):
+                return self._send_json(400, {"error": "lat and lon are required numbers"})
+            try:
+                radius_km = float(params["radius_km"]) if "radius_km" in params else None
+                k = max(1, int(params["k"])) if "k" in params else None  # k=0 or negative still means "nearest"
+            except ValueError:
+                return self._send_json(400, {"error": "radius_km must be a number and k an integer"})
+
+            snapshot = index.snapshot
+            if k:
+                alerts = snapshot.nearest(lat, lon, k=k, max_radius_km=radius_km)
+            else:
+                alerts = snapshot.within_radius(lat, lon, radius_km or DEFAULT_SEARCH_RADIUS_KM)
+            self._send_json(200, {"version": snapshot.version, "count": len(alerts), "alerts": alerts})
+
+        def log_message(self, format, *args):
+            pass  # Keep the console quiet; server.js only surfaces errors
+
+    return HotspotRequestHandler
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, centers_path: str = CENTERS_FILE):
+    index = HotspotIndex(centers_path)
+    server = ThreadingHTTPServer((host, port), make_handler(index))
+    logger.info(f" Hotspot service listening on http://{host}:{port}/nearby")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# ==============================
+# Load benchmark
+# ==============================
+def benchmark(centers_path: str = CENTERS_FILE, queries: int = 100_000, radius_km: float = DEFAULT_SEARCH_RADIUS_KM, k: int = 5):
+    """Measure single-thread queries per second for radius and k-nearest lookups"""
+    index = HotspotIndex(centers_path)
+    snapshot = index.snapshot
+    if not snapshot.alerts:
+        print(" No hotspots loaded - nothing to benchmark")
+        return
+
+    rng = np.random.default_rng(0)
+    lat = np.degrees(snapshot.lat_rad)
+    lon = np.degrees(snapshot.lon_rad)
+    # Query points scattered around the study area (+/- ~5 km beyond the hotspots)
+    q_lat = rng.uniform(lat.min() - 0.05, lat.max() + 0.05, queries)
+    q_lon = rng.uniform(lon.min() - 0.05, lon.max() + 0.05, queries)
+
+    print(f" Benchmarking {queries} queries over {len(snapshot.alerts)} hotspots")
+    for name, query in [
+        (f"radius {radius_km} km", lambda a, b: index.within_radius(a, b, radius_km)),
+        (f"{k}-nearest", lambda a, b: index.nearest(a, b, k)),
+    ]:
+        hits = 0
+        start = time.perf_counter()
+        for a, b in zip(q_lat, q_lon):
+            hits += len(query(a, b))
+        elapsed = time.perf_counter() - start
+        print(f"   {name:<16} {queries / elapsed:>10,.0f} queries/s  {elapsed / queries * 1e6:>8.1f} us/query  ({hits / queries:.1f} results/query)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nearby-hotspot query service over cluster_centers.json")
+    parser.add_argument("--serve", action="store_true", help="Run the HTTP service")
+    parser.add_argument("--bench", action="store_true", help="Run the query benchmark")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--centers", default=CENTERS_FILE)
+    parser.add_argument("--queries", type=int, default=100_000)
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(args.centers, args.queries)
+    elif args.serve:
+        serve(args.host, args.port, args.centers)
+    else:
+        parser.print_help()
+        sys.exit(1)
@@ -0,0 +1,99 @@
+import os
+import json
+import shutil
+import threading
+
+# --------------------------
+# Local stand-in for a Supabase Storage bucket
+# --------------------------
+# Implements the subset of storage3's bucket API the publisher uses
+# (upload / remove / download / list) on top of a local folder, so publishing
+# can be exercised without the live project:
+#
+#   python mobile_cluster_fetch.py --local /tmp/bucket
+#
+# Headers passed through file_options (content-type, content-encoding, ...)
+# are kept in a sidecar _metadata.json so callers can check them.
+
+METADATA_FILE = "_metadata.json"
+
+
+class LocalBucket:
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self.requests = []  # (method, key) log, handy for assertions and benchmarks
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid object key: {key}")
+        return path
+
+    def _read_metadata(self) -> dict:
+        try:
+            with open(os.path.join(self.root, METADATA_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_metadata(self, metadata: dict):
+        tmp_path = os.path.join(self.root, METADATA_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.root, METADATA_FILE))
+
+    def upload(self, path: str, file, file_options: dict = None):
+        options = dict(file_options or {})
+        target = self._path(path)
+        upsert = str(options.pop("upsert", "false")).lower() == "true"
+        if os.path.exists(target) and not upsert:
+            raise FileExistsError(f"The resource already exists: {path}")
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_target = f"{target}.{threading.get_ident()}.tmp"
+        if isinstance(file, (bytes, bytearray)):
+            with open(tmp_target, "wb") as f:
+                f.write(file)
+        elif hasattr(file, "read"):
+            with open(tmp_target, "wb") as f:
+                shutil.copyfileobj(file, f)
+        else:
+            shutil.copyfile(file, tmp_target)
+        os.replace(tmp_target, target)  # Readers see the old or the new object, never a partial one
+
+        with self._lock:
+            metadata = self._read_metadata()
+            metadata[path] = {k: v for k, v in options.items() if isinstance(v, str)}
+            self._write_metadata(metadata)
+            self.requests.append(("upload", path))
+        return {"path": path, "Key": path}
+
+    def remove(self, paths: list):
+        removed = []
+        with self._lock:
+            metadata = self._read_metadata()
+            for key in paths:
+                target = self._path(key)
+                if os.path.exists(target):
+                    os.remove(target)
+                    removed.append({"name": key})
+                metadata.pop(key, None)
+                self.requests.append(("remove", key))
+            self._write_metadata(metadata)
+        return removed
+
+    def download(self, path: str) -> bytes:
+        with open(self._path(path), "rb") as f:
+            self.requests.append(("download", path))
+            return f.read()
+
+    def metadata(self, path: str) -> dict:
+        return self._read_metadata().get(path, {})
+
+    def list(self, path: str = ""):
+        folder = self._path(path) if path else self.root
+        if not os.path.isdir(folder):
+            return []
+        return [{"name": name} for name in sorted(os.listdir(folder)) if name != METADATA_FILE]
@@ -0,0 +1,284 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import asyncio
+import tempfile
+import threading
+from urllib.parse import unquote
+import httpx
+from local_storage import LocalBucket
+from supabase_io import SupabaseIO, StorageBucket
+
+# --------------------------
+# Offline stand-in for the Supabase project
+# --------------------------
+# An httpx transport that answers the PostgREST and Storage requests made by
+# supabase_io (and so by cleaning2, export_geojson and mobile_cluster_fetch)
+# from a SQLite file and a local folder, with configurable network conditions:
+#
+#   transport = LocalSupabase(latency_ms=40, bandwidth_mbps=20, error_rate=0.01)
+#   db = local_io(transport)                      # SupabaseIO wired to it
+#   db.fetch_all_sync("road_traffic_accident")
+#
+# Supported subset:
+#   GET    /rest/v1/<table>?select=a,b&order=col[.asc|.desc]   Range header, Prefer: count=exact, max-rows cap
+#   POST   /rest/v1/<table>[?on_conflict=a,b]                  insert / Prefer: resolution=ignore-|merge-duplicates
+#   POST   /storage/v1/object/<bucket>/<path>                  upload (x-upsert)
+#   GET    /storage/v1/object/<bucket>/<path>                  download
+#   DELETE /storage/v1/object/<bucket>                         {"prefixes": [...]}
+#
+# Rows are stored as JSON; a table's unique index (UNIQUE_COLUMNS) is enforced
+# through a conflict-key column (rows with a NULL key column never conflict,
+# as in Postgres). on_conflict must name that index or "id". A batch is one
+# transaction: one bad row (reject_row) fails the whole batch.
+#
+# Network model: every request waits latency_ms (+/- jitter_ms) and then
+# transfers its request + response bytes over one shared link of
+# bandwidth_mbps, so concurrency hides latency but not bandwidth.
+# error_rate answers 503, timeout_rate raises httpx.ReadTimeout (both before
+# the request is applied); seed makes the injected faults reproducible.
+LOCAL_URL = "http://local.supabase"
+LOCAL_KEY = "local-service-key"
+MAX_ROWS = 1000  # PostgREST max-rows
+
+# Unique index per table (migrations/001_row_fingerprint.sql)
+UNIQUE_COLUMNS = {
+    "road_traffic_accident": ("fingerprint",),
+}
+
+
+def _json_response(status: int, data, headers: dict = None) -> httpx.Response:
+    return httpx.Response(status, content=json.dumps(data, default=str).encode("utf-8"),
+                          headers={"content-type": "application/json", **(headers or {})})
+
+
+def _error(status: int, code: str, message: str) -> httpx.Response:
+    return _json_response(status, {"code": code, "message": message, "details": None, "hint": None})
+
+
+class LocalSupabase(httpx.AsyncBaseTransport):
+    def __init__(self, root: str = None, latency_ms: float = 0.0, jitter_ms: float = 0.0, bandwidth_mbps: float = None,
+                 error_rate: float = 0.0, timeout_rate: float = 0.0, reject_row=None, unique_columns: dict = None,
+                 max_rows: int = MAX_ROWS, seed: int = 0):
+        """
+        Args:
+            root: Folder for database.sqlite3 and storage/<bucket>/ (default: a new temp folder)
+            reject_row: Optional callable(row) -> error message or None, for row-level failures
+        """
+        self.root = root or tempfile.mkdtemp(prefix="local_supabase_")
+        os.makedirs(self.root, exist_ok=True)
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.bytes_per_second = bandwidth_mbps * 125_000 if bandwidth_mbps else None
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.reject_row = reject_row
+        self.unique_columns = {**UNIQUE_COLUMNS, **(unique_columns or {})}
+        self.max_rows = max_rows
+        self.random = random.Random(seed)
+
+        self.connection = sqlite3.connect(os.path.join(self.root, "database.sqlite3"), check_same_thread=False)
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._link_free_at = 0.0
+        self.requests = []  # (method, path, status) log
+        self.bytes_sent = self.bytes_received = 0
+
+    # --------------------------
+    # Network model
+    # --------------------------
+    async def _transfer(self, size: int):
+        """Wait for `size` bytes on the shared link"""
+        if not self.bytes_per_second:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            start = max(now, self._link_free_at)
+            self._link_free_at = start + size / self.bytes_per_second
+            done = self._link_free_at
+        await asyncio.sleep(done - now)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+
+        roll = self.random.random()
+        if roll < self.timeout_rate:
+            self.requests.append((request.method, request.url.path, "timeout"))
+            raise httpx.ReadTimeout("injected timeout", request=request)
+        if roll < self.timeout_rate + self.error_rate:
+            response = _error(503, "PGRST000", "injected failure")
+        else:
+            try:
+                response = self.handle(request.method, request.url, request.headers, body)
+            except Exception as e:
+                response = _error(500, "XX000", f"{type(e).__name__}: {e}")
+
+        await self._transfer(len(body) + len(response.content))
+        self.bytes_sent += len(body)
+        self.bytes_received += len(response.content)
+        self.requests.append((request.method, request.url.path, response.status_code))
+        return response
+
+    def handle(self, method: str, url: httpx.URL, headers, body: bytes) -> httpx.Response:
+        path = url.path
+        if path.startswith("/rest/v1/"):
+            table = path[len("/rest/v1/"):]
+            if method == "GET":
+                return self.select(table, url.params, headers)
+            if method == "POST":
+                return self.insert(table, json.loads(body or b"[]"), url.params, headers)
+        elif path.startswith("/storage/v1/object/"):
+            bucket, _, key = path[len("/storage/v1/object/"):].partition("/")
+            if method in ("POST", "PUT") and key:
+                return self.upload(bucket, unquote(key), body, headers, upsert=method == "PUT")
+            if method == "GET" and key:
+                return self.download(bucket, unquote(key))
+            if method == "DELETE":
+                return self.remove(bucket, json.loads(body or b"{}").get("prefixes", []))
+        return _error(404, "PGRST000", f"Not supported by the local stand-in: {method} {path}")
+
+    # --------------------------
+    # PostgREST
+    # --------------------------
+    def _table(self, table: str):
+        if not table.replace("_", "").isalnum():
+            raise ValueError(f"Invalid table name: {table}")
+        self.connection.execute(f'CREATE TABLE IF NOT EXISTS "{table}" '
+                                "(id INTEGER PRIMARY KEY AUTOINCREMENT, conflict_key TEXT UNIQUE, data TEXT NOT NULL)")
+        return f'"{table}"'
+
+    def select(self, table: str, params, headers) -> httpx.Response:
+        with self._lock:
+            name = self._table(table)
+            total = self.connection.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+
+            start, end = 0, None
+            if headers.get("range"):
+                first, _, last = headers["range"].partition("-")
+                start, end = int(first), int(last) if last else None
+            start = int(params.get("offset", start))
+            limit = min(self.max_rows, end - start + 1 if end is not None else self.max_rows,
+                        int(params.get("limit", self.max_rows)))
+
+            order_sql = "id"
+            if params.get("order"):
+                column, _, direction = params["order"].partition(".")
+                key = "id" if column == "id" else f"json_extract(data, '$.{column}')"
+                order_sql = f"{key} {'DESC' if direction.startswith('desc') else 'ASC'}"
+            rows = [json.loads(data) for (data,) in self.connection.execute(
+                f"SELECT data FROM {name} ORDER BY {order_sql} LIMIT ? OFFSET ?", (limit, start))]
+
+        select = params.get("select", "*")
+        if select != "*":
+            columns = [column.strip() for column in select.split(",")]
+            rows = [{column: row.get(column) for column in columns} for row in rows]
+        counted = "count=exact" in headers.get("prefer", "")
+        span = f"{start}-{start + len(rows) - 1}" if rows else "*"
+        return _json_response(200, rows, {"content-range": f"{span}/{total if counted else '*'}"})
+
+    def _conflict_key(self, table: str, row: dict):
+        columns = self.unique_columns.get(table)
+        if not columns or any(row.get(column) is None for column in columns):
+            return None
+        return json.dumps([row[column] for column in columns], default=str)
+
+    def insert(self, table: str, rows: list, params, headers) -> httpx.Response:
+        prefer = headers.get("prefer", "")
+        merge = "resolution=merge-duplicates" in prefer
+        ignore_duplicates = "resolution=ignore-duplicates" in prefer
+        conflict_columns = tuple(params["on_conflict"].split(",")) if params.get("on_conflict") else None
+        if conflict_columns not in (None, ("id",), self.unique_columns.get(table)):
+            return _error(400, "42P10", "there is no unique or exclusion constraint matching the ON CONFLICT specification")
+        if self.reject_row:
+            for row in rows:
+                message = self.reject_row(row)
+                if message:
+                    return _error(400, "22P02", message)
+
+        written = []
+        with self._lock:
+            name = self._table(table)
+            try:
+                with self.connection:  # One transaction per batch
+                    for row in rows:
+                        existing = None
+                        if (merge or ignore_duplicates) and conflict_columns == ("id",) and row.get("id") is not None:
+                            existing = self.connection.execute(f"SELECT id, data FROM {name} WHERE id = ?", (row["id"],)).fetchone()
+                        elif merge or ignore_duplicates:
+                            key = self._conflict_key(table, row)
+                            existing = key and self.connection.execute(
+                                f"SELECT id, data FROM {name} WHERE conflict_key = ?", (key,)).fetchone()
+                        if existing and not merge:
+                            continue  # ignore-duplicates
+                        if existing:
+                            stored = {**json.loads(existing[1]), **row, "id": existing[0]}
+                            self.connection.execute(f"UPDATE {name} SET conflict_key = ?, data = ? WHERE id = ?",
+                                                    (self._conflict_key(table, stored), json.dumps(stored, default=str), existing[0]))
+                        else:
+                            cursor = self.connection.execute(
+                                f"INSERT INTO {name} (id, conflict_key, data) VALUES (?, ?, '')",
+                                (row.get("id"), self._conflict_key(table, row)))
+                            stored = {**row, "id": cursor.lastrowid}
+                            self.connection.execute(f"UPDATE {name} SET data = ? WHERE id = ?",
+                                                    (json.dumps(stored, default=str), cursor.lastrowid))
+                        written.append(stored)
+            except sqlite3.IntegrityError:
+                return _error(409, "23505", f'duplicate key value violates unique constraint "{table}_unique"')
+
+        body = written if "return=representation" in prefer else []
+        return _json_response(201, body, {"content-range": f"*/{len(written)}"})
+
+    def row_count(self, table: str) -> int:
+        with self._lock:
+            return self.connection.execute(f"SELECT COUNT(*) FROM {self._table(table)}").fetchone()[0]
+
+    def seed_rows(self, table: str, rows: list):
+        """Load rows directly (no network model), e.g. to prepare a fetch benchmark"""
+        return self.handle("POST", httpx.URL(f"{LOCAL_URL}/rest/v1/{table}"),
+                           {"prefer": "resolution=ignore-duplicates"}, json.dumps(rows, default=str).encode("utf-8"))
+
+    # --------------------------
+    # Storage
+    # --------------------------
+    def bucket(self, name: str) -> LocalBucket:
+        with self._lock:
+            if name not in self._buckets:
+                self._buckets[name] = LocalBucket(os.path.join(self.root, "storage", name))
+            return self._buckets[name]
+
+    def upload(self, bucket: str, key: str, body: bytes, headers, upsert: bool) -> httpx.Response:
+        options = {"upsert": "true" if upsert or headers.get("x-upsert") == "true" else "false"}
+        for header in ("content-type", "cache-control", "content-encoding"):
+            if header in headers:
+                options[header] = headers[header]
+        try:
+            self.bucket(bucket).upload(key, body, options)
+        except FileExistsError as e:
+            return _json_response(400, {"statusCode": "409", "error": "Duplicate", "message": str(e)})
+        return _json_response(200, {"Key": f"{bucket}/{key}"})
+
+    def download(self, bucket: str, key: str) -> httpx.Response:
+        try:
+            data = self.bucket(bucket).download(key)
+        except OSError:
+            return _json_response(400, {"statusCode": "404", "error": "not_found", "message": "Object not found"})
+        metadata = self.bucket(bucket).metadata(key)
+        return httpx.Response(200, content=data, headers={"content-type": metadata.get("content-type", "application/octet-stream")})
+
+    def remove(self, bucket: str, keys: list) -> httpx.Response:
+        return _json_response(200, self.bucket(bucket).remove(keys))
+
+
+def local_io(transport: LocalSupabase, max_concurrency: int = None) -> SupabaseIO:
+    """SupabaseIO that talks to the stand-in"""
+    options = {"max_concurrency": max_concurrency} if max_concurrency else {}
+    return SupabaseIO(LOCAL_URL, LOCAL_KEY, transport=transport, **options)
+
+
+def local_bucket(transport: LocalSupabase, name: str, max_concurrency: int = None) -> StorageBucket:
+    """Publisher-compatible bucket on the stand-in (uploads go through the transport)"""
+    return StorageBucket(name, local_io(transport, max_concurrency))
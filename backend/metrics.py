@@ -0,0 +1,231 @@
+import os
+import sys
+import time
+import atexit
+import inspect
+import functools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+import pandas as pd
+
+try:
+    import resource  # Unix only
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+# ==============================
+# Configuration
+# ==============================
+METRIC_PREFIX = "[METRIC]"  # Hidden marker parsed by server.js (like [SUMMARY])
+PROFILE_ENV_VAR = "OSIMAP_PROFILE"  # Set to 1 (or an output folder) to enable the sampling profiler
+PROFILE_INTERVAL_ENV_VAR = "OSIMAP_PROFILE_INTERVAL_MS"
+DEFAULT_PROFILE_INTERVAL_MS = 5
+
+
+# ==============================
+# Resource usage helpers
+# ==============================
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None if unavailable)
+
+    This is the lifetime peak (ru_maxrss), not a per-stage value; stage_metrics
+    reports it as process_peak_rss_mb next to how much the stage raised it.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def emit_metric(stage: str, **fields):
+    """Print one [METRIC] line: [METRIC]stage=<name> key=value ..."""
+    parts = [f"stage={stage}"]
+    for key, value in fields.items():
+        if value is None:
+            continue
+        if isinstance(value, float):
+            value = f"{value:.3f}"
+        parts.append(f"{key}={value}")
+    print(f"{METRIC_PREFIX}{' '.join(parts)}", flush=True)
+
+
+# ==============================
+# Stage timing
+# ==============================
+class StageRecord:
+    """Mutable holder so a stage can report its row count (and extras) before it ends"""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.rows = None
+        self.extra = {}
+
+
+@contextmanager
+def stage_metrics(stage: str, rows: int = None):
+    """Time a block and emit wall time, CPU time, memory and row count
+
+    Memory is process_peak_rss_mb (the process's peak so far) and
+    peak_rss_delta_mb (how much this stage raised that peak; 0 if an earlier
+    stage already used more).
+
+    Usage:
+        with stage_metrics("clean_data") as m:
+            ...
+            m.rows = len(df)
+    """
+    record = StageRecord(stage)
+    record.rows = rows
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    peak_start = peak_rss_mb()
+    status = "ok"
+    try:
+        yield record
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        peak_end = peak_rss_mb()
+        emit_metric(
+            stage,
+            wall_s=time.perf_counter() - wall_start,
+            cpu_s=time.process_time() - cpu_start,
+            process_peak_rss_mb=peak_end,
+            peak_rss_delta_mb=peak_end - peak_start if peak_end is not None else None,
+            rows=record.rows,
+            status=status,
+            **record.extra
+        )
+
+
+def _count_rows(value):
+    """Best-effort row count for results/arguments (DataFrames, lists, dicts of frames)
+
+    A dict counts as a collection of row sets only when every value is a
+    DataFrame or list (e.g. {sheet_name: DataFrame} from read_all_sheets);
+    any other dict (e.g. {cluster_id: footprint}) counts its keys.
+    """
+    if value is None:
+        return None
+    if isinstance(value, dict) and value and all(isinstance(v, (pd.DataFrame, list)) for v in value.values()):
+        return sum(len(v) for v in value.values())
+    if hasattr(value, "__len__") and not isinstance(value, (str, bytes)):
+        return len(value)
+    return None
+
+
+def instrumented(stage: str = None, rows=None):
+    """Decorator version of stage_metrics
+
+    Args:
+        stage: Stage name (defaults to the function name)
+        rows: How to count rows -
+              None           -> len() of the return value
+              False          -> no row count
+              "arg_name"     -> len() of that argument
+              "self.attr"    -> len() of that attribute after the call
+              callable       -> rows(result, *args, **kwargs)
+    """
+    def decorator(func):
+        stage_name = stage or func.__name__
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_metrics(stage_name) as record:
+                result = func(*args, **kwargs)
+                try:
+                    if rows is None:
+                        record.rows = _count_rows(result)
+                    elif rows is False:
+                        record.rows = None
+                    elif callable(rows):
+                        record.rows = rows(result, *args, **kwargs)
+                    elif rows.startswith("self."):
+                        record.rows = _count_rows(getattr(args[0], rows[len("self."):], None))
+                    else:
+                        bound = signature.bind_partial(*args, **kwargs)
+                        record.rows = _count_rows(bound.arguments.get(rows))
+                except Exception:
+                    record.rows = None  # Never let instrumentation break the pipeline
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+# ==============================
+# Optional sampling profiler
+# ==============================
+class SamplingProfiler:
+    """Samples the main thread's stack on a timer and writes collapsed stacks
+
+    Output is the "folded" format understood by flamegraph.pl, speedscope and
+    inferno: one line per unique stack, frames joined by ';', then a count.
+    """
+
+    def __init__(self, output_path: str, interval_ms: float = DEFAULT_PROFILE_INTERVAL_MS):
+        self.output_path = output_path
+        self.interval = interval_ms / 1000.0
+        self.samples = Counter()
+        self._target_thread_id = threading.main_thread().ident
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="osimap-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target_thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join(timeout=1)
+        os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
+        with open(self.output_path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        emit_metric("profile", samples=sum(self.samples.values()), output=self.output_path)
+
+
+def maybe_start_profiler(script_name: str = None):
+    """Start the sampling profiler if OSIMAP_PROFILE is set
+
+    OSIMAP_PROFILE=1 writes to data/profiles/, any other value is used as the output folder.
+    """
+    setting = os.getenv(PROFILE_ENV_VAR)
+    if not setting or setting.lower() in ("0", "false", "no"):
+        return None
+
+    if setting.lower() in ("1", "true", "yes"):
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        output_dir = os.path.join(script_dir, "data", "profiles")
+    else:
+        output_dir = setting
+
+    if script_name is None:
+        script_name = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    output_path = os.path.join(output_dir, f"{script_name}_{timestamp}_{os.getpid()}.folded")
+
+    interval_ms = float(os.getenv(PROFILE_INTERVAL_ENV_VAR, DEFAULT_PROFILE_INTERVAL_MS))
+    return SamplingProfiler(output_path, interval_ms).start()
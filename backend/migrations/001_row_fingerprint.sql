@@ -0,0 +1,35 @@
+-- ==============================
+-- Row fingerprint as the dedup / upsert conflict key
+-- ==============================
+-- cleaning2.py sends a 64-bit fingerprint of each row's normalized natural key
+-- (barangay, lat, lng, datecommitted, timecommitted, offensetype - see
+-- row_fingerprint.py) and upserts with on_conflict=fingerprint.
+--
+-- Run in order:
+--   1. step 1 below (Supabase SQL editor)
+--   2. python row_fingerprint.py          (backfills existing rows)
+--   3. steps 2 and 3 below
+
+-- Step 1: nullable column (rows inserted before the backfill stay NULL)
+ALTER TABLE public.road_traffic_accident
+    ADD COLUMN IF NOT EXISTS fingerprint bigint;
+
+-- Step 2: after the backfill, look for rows that are the same accident
+-- (the unique index below cannot be created while any remain)
+SELECT fingerprint, COUNT(*) AS copies, ARRAY_AGG(id ORDER BY id) AS ids
+FROM public.road_traffic_accident
+WHERE fingerprint IS NOT NULL
+GROUP BY fingerprint
+HAVING COUNT(*) > 1;
+
+-- To keep the oldest copy of each, review the result above and then run:
+-- DELETE FROM public.road_traffic_accident a
+-- USING public.road_traffic_accident b
+-- WHERE a.fingerprint = b.fingerprint AND a.id > b.id;
+
+-- Step 3: unique index = upsert conflict target and the integer dedup lookup
+CREATE UNIQUE INDEX IF NOT EXISTS road_traffic_accident_fingerprint_key
+    ON public.road_traffic_accident (fingerprint);
+
+-- PostgREST needs a schema reload to see the new column
+NOTIFY pgrst, 'reload schema';
@@ -1,6 +1,24 @@
 import os
-from supabase import create_client, Client
+import sys
+import json
+import gzip
+import shutil
+import hashlib
+import argparse
+import asyncio
+import tempfile
+import threading
+from datetime import datetime, timezone
+from supabase_io import SupabaseIO, StorageBucket, run_sync
 from dotenv import load_dotenv
+from metrics import instrumented, maybe_start_profiler
+from geohash_shards import shard_files
+from delta_patches import patch_files
+
+try:
+    import brotli  # Optional: adds .br variants when installed
+except ImportError:
+    brotli = None
 
 # --------------------------
 # Load environment variables
@@ -9,46 +27,353 @@ load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 # --------------------------
 # Config
 # --------------------------
 BUCKET_NAME = "geojson"  # make sure this bucket exists in Supabase
 
-def upload_file_to_bucket(local_path: str, bucket_path: str):
-    """Upload a file to Supabase Storage bucket."""
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_FOLDER = os.path.join(BACKEND_DIR, "data")
+
+# (local file name, content type) published on every run
+ARTIFACTS = [
+    ("accidents_clustered.geojson", "application/geo+json"),
+    ("filter_index.json", "application/json"),  # Row bitmaps for accidents_clustered.geojson (filter_index.py)
+    ("cluster_centers.json", "application/json"),
+    ("cluster_footprints.geojson", "application/geo+json"),
+]
+
+# Geohash shards (data/shards, see geohash_shards.py): listed from the shard
+# index on each run; shards that disappeared are dropped from the manifest
+SHARDS_SUBFOLDER = "shards"
+
+# Versioned snapshot + delta patches (data/patches, see delta_patches.py):
+# listed from the patch index; compacted patches are dropped the same way
+PATCHES_SUBFOLDER = "patches"
+
+REMOTE_MANIFEST_KEY = "manifest.json"           # Small object clients read first
+RELEASES_PREFIX = "releases"                     # Immutable, content-addressed copies
+LOCAL_MANIFEST_FILE = os.path.join(DATA_FOLDER, ".publish_manifest.json")
+STAGING_FOLDER = os.path.join(DATA_FOLDER, ".publish")
+UPDATE_LEGACY_KEYS = True   # Keep the old fixed keys current for app builds that don't read manifest.json
+KEEP_RELEASES = 2           # Release folders kept per artifact (current + previous)
+MAX_UPLOAD_WORKERS = 4     # Uploads in flight (pooled connections for the live bucket)
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Serializes manifest read-modify-write when several artifacts are published
+# concurrently from one process (see pipeline.py)
+_manifest_lock = threading.Lock()
+
+
+class PublishError(Exception):
+    """A publish did not complete; the previous version stays current for clients"""
+
+
+def get_bucket():
+    """Storage bucket of the live Supabase project"""
+    return StorageBucket(BUCKET_NAME, SupabaseIO(SUPABASE_URL, SUPABASE_KEY, max_concurrency=MAX_UPLOAD_WORKERS))
+
+
+# --------------------------
+# Hashing / compression (streamed, never the whole file in memory)
+# --------------------------
+def file_sha256(local_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(local_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_gzip_variant(local_path: str, output_path: str):
+    with open(local_path, "rb") as src, gzip.GzipFile(output_path, "wb", compresslevel=9, mtime=0) as dst:
+        shutil.copyfileobj(src, dst, HASH_CHUNK_SIZE)
+
+
+def write_brotli_variant(local_path: str, output_path: str):
+    compressor = brotli.Compressor(quality=9)
+    with open(local_path, "rb") as src, open(output_path, "wb") as dst:
+        for chunk in iter(lambda: src.read(HASH_CHUNK_SIZE), b""):
+            dst.write(compressor.process(chunk))
+        dst.write(compressor.finish())
+
+
+COMPRESSED_VARIANTS = [("gzip", ".gz", write_gzip_variant)]
+if brotli is not None:
+    COMPRESSED_VARIANTS.append(("br", ".br", write_brotli_variant))
+
+
+# --------------------------
+# Manifests
+# --------------------------
+def load_local_manifest(manifest_file: str = LOCAL_MANIFEST_FILE) -> dict:
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"version": 0, "files": {}, "releases": {}}
+
+
+def _is_missing_object(error: Exception) -> bool:
+    if isinstance(error, FileNotFoundError):
+        return True
+    text = str(error).lower()
+    return getattr(error, "status_code", None) in (400, 404) and ("not_found" in text or "not found" in text)
+
+
+def load_remote_manifest(bucket):
+    """manifest.json as the bucket has it
+
+    Empty if the bucket has none (new or wiped bucket: everything is uploaded
+    again), None if it could not be read (network error, corrupt file).
+    """
+    try:
+        manifest = json.loads(bucket.download(REMOTE_MANIFEST_KEY))
+    except Exception as e:
+        if _is_missing_object(e):
+            return {"version": 0, "files": {}}
+        print(f" Could not read the remote manifest: {e}")
+        return None
+    return manifest if isinstance(manifest, dict) and isinstance(manifest.get("files"), dict) else None
+
+
+def save_local_manifest(manifest: dict, manifest_file: str = LOCAL_MANIFEST_FILE):
+    tmp_path = manifest_file + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_file)
+
+
+# --------------------------
+# Uploads
+# --------------------------
+@instrumented(rows=False)
+def upload_file_to_bucket(local_path: str, bucket_path: str, bucket=None, content_type: str = None, content_encoding: str = None):
+    """Upload (or overwrite in place) one object; no delete-then-upload gap."""
+    return run_sync(upload_file_async(local_path, bucket_path, bucket or get_bucket(), content_type, content_encoding))
+
+
+def _upload_from_disk(bucket, local_path: str, bucket_path: str, file_options: dict):
+    with open(local_path, "rb") as f:
+        bucket.upload(bucket_path, f, file_options)
+
+
+async def upload_file_async(local_path: str, bucket_path: str, bucket, content_type: str = None, content_encoding: str = None):
+    """upload_file_to_bucket for the event loop: pooled for the live bucket, a worker thread otherwise"""
     if not os.path.exists(local_path):
         print(f" File not found: {local_path}")
-        return
+        return False
+
+    file_options = {"upsert": "true", "cache-control": "3600"}
+    if content_type:
+        file_options["content-type"] = content_type
+    if content_encoding:
+        file_options["content-encoding"] = content_encoding
+
+    try:
+        if isinstance(bucket, StorageBucket):
+            await bucket.upload_file_async(bucket_path, local_path, file_options)
+        else:
+            await asyncio.to_thread(_upload_from_disk, bucket, local_path, bucket_path, file_options)
+        print(f" Uploaded {os.path.basename(local_path)} to bucket as {bucket_path}")
+        return True
+    except Exception as e:
+        print(f" Upload failed for {local_path}: {e}")
+        return False
+
+
+def _upload_all(bucket, jobs: list) -> bool:
+    """Run upload jobs concurrently (at most MAX_UPLOAD_WORKERS at a time); True only if every upload succeeded"""
+    if not jobs:
+        return True
+
+    async def upload_all():
+        limit = asyncio.Semaphore(MAX_UPLOAD_WORKERS)
+
+        async def upload(job):
+            async with limit:
+                return await upload_file_async(bucket=bucket, **job)
+        return await asyncio.gather(*(upload(job) for job in jobs))
+
+    return all(run_sync(upload_all()))
+
+
+def shard_artifacts(data_folder: str = DATA_FOLDER):
+    """(name, content type) for the shard index and every current shard"""
+    return [(name, "application/json" if name.endswith("/index.json") else "application/geo+json")
+            for name in shard_files(os.path.join(data_folder, SHARDS_SUBFOLDER))]
+
+
+def patch_artifacts(data_folder: str = DATA_FOLDER):
+    """(name, content type) for the patch index, the current snapshot and the listed patches"""
+    return [(name, "application/json") for name in patch_files(os.path.join(data_folder, PATCHES_SUBFOLDER))]
+
+
+@instrumented(rows=lambda published, *_, **__: len(published or []))
+def publish_artifacts(bucket=None, artifacts=ARTIFACTS, data_folder: str = DATA_FOLDER, force: bool = False,
+                      manifest_file: str = LOCAL_MANIFEST_FILE, replace_folders=()):
+    """Publish changed artifacts as a new version and return the names that were uploaded
+
+    Returns [] when everything is unchanged; raises PublishError when an
+    upload or the manifest swap fails (so callers can retry).
+
+    1. Hash every artifact and skip the ones whose hash matches the bucket's
+       current manifest.json.
+    2. Upload changed files (plus gzip/brotli variants) concurrently under
+       content-addressed keys: releases/<sha256[:16]>/<name>[.gz|.br].
+    3. Only after all of them succeed, overwrite manifest.json - the single
+       small object that tells clients which keys are current. Clients see
+       either the complete old version or the complete new one.
+
+    replace_folders: manifest entries under these folders that are not among
+    `artifacts` are removed (e.g. shards that no longer exist), and their
+    objects are deleted once the new manifest is live.
+    """
+    bucket = bucket or get_bucket()
+    # Unreadable remote manifest: nothing counts as unchanged (uploading again is harmless)
+    previous_files = (load_remote_manifest(bucket) or {}).get("files", {})
+    os.makedirs(STAGING_FOLDER, exist_ok=True)
+    staging_folder = tempfile.mkdtemp(dir=STAGING_FOLDER)
+
+    files, jobs, changed = {}, [], []
+    for name, content_type in artifacts:
+        local_path = os.path.join(data_folder, name)
+        if not os.path.exists(local_path):
+            print(f" File not found: {local_path}")
+            continue
+
+        sha256 = file_sha256(local_path)
+        if not force and previous_files.get(name, {}).get("sha256") == sha256:
+            print(f" Unchanged, skipping: {name}")
+            continue
+
+        release_folder = f"{RELEASES_PREFIX}/{sha256[:16]}"
+        entry = {
+            "sha256": sha256,
+            "size": os.path.getsize(local_path),
+            "content_type": content_type,
+            "key": f"{release_folder}/{name}",
+            "variants": {},
+        }
+        jobs.append({"local_path": local_path, "bucket_path": entry["key"], "content_type": content_type})
+
+        for encoding, suffix, writer in COMPRESSED_VARIANTS:
+            staged_path = os.path.join(staging_folder, f"{name}{suffix}")
+            os.makedirs(os.path.dirname(staged_path), exist_ok=True)  # Names may include a folder (shards/)
+            writer(local_path, staged_path)
+            entry["variants"][encoding] = {"key": entry["key"] + suffix, "size": os.path.getsize(staged_path)}
+            jobs.append({"local_path": staged_path, "bucket_path": entry["key"] + suffix,
+                         "content_type": content_type, "content_encoding": encoding})
+
+        files[name] = entry
+        changed.append(name)
 
     try:
-        with open(local_path, "rb") as f:
-            data = f.read()
+        if not changed:
+            print(" All artifacts unchanged - nothing to publish")
+            return []
+
+        if not _upload_all(bucket, jobs):
+            raise PublishError("Some uploads failed - manifest not updated, clients keep the previous version")
+
+        retired = None
+        if replace_folders:
+            current = {name for name, _ in artifacts}
+            prefixes = tuple(folder + "/" for folder in replace_folders)
+            retired = {name for name in previous_files if name.startswith(prefixes) and name not in current}
+        with _manifest_lock:
+            return _swap_manifest(bucket, files, changed, data_folder, staging_folder, manifest_file, retired)
+    finally:
+        shutil.rmtree(staging_folder, ignore_errors=True)
+
+
+def _swap_manifest(bucket, files: dict, changed: list, data_folder: str, staging_folder: str, manifest_file: str,
+                   retired=None):
+    """Merge the new entries into the live manifest, upload it, then prune old releases"""
+    local_manifest = load_local_manifest(manifest_file)
+    live_manifest = load_remote_manifest(bucket)  # Re-read under the lock: another stage may have published
+    if live_manifest is None:
+        # Merging into an unknown manifest could drop other artifacts' entries
+        raise PublishError("Remote manifest unreadable - manifest not updated, clients keep the previous version")
+    files = {name: entry for name, entry in {**live_manifest.get("files", {}), **files}.items()
+             if name not in (retired or ())}
+
+    # Atomic swap: one small object flips every client to the new version
+    version = max(int(local_manifest.get("version", 0)), int(live_manifest.get("version", 0))) + 1
+    remote_manifest = {
+        "version": version,
+        "published_at": datetime.now(timezone.utc).isoformat(),
+        "files": files,
+    }
+    manifest_path = os.path.join(staging_folder, REMOTE_MANIFEST_KEY)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(remote_manifest, f, indent=2)
+    if not upload_file_to_bucket(manifest_path, REMOTE_MANIFEST_KEY, bucket=bucket, content_type="application/json"):
+        raise PublishError("Manifest upload failed - clients keep the previous version")
 
-        # First remove existing file (if any), then upload new one
+    if UPDATE_LEGACY_KEYS:
+        # Overwritten in place (upsert), so there is no missing-file window
+        _upload_all(bucket, [
+            {"local_path": os.path.join(data_folder, name), "bucket_path": name, "content_type": files[name]["content_type"]}
+            for name in changed
+        ])
+
+    # Forget (and delete) releases that are no longer current or previous
+    releases = local_manifest.get("releases", {})
+    stale_keys = []
+
+    def drop(keys):
+        for old_key in keys:
+            stale_keys.append(old_key)
+            stale_keys.extend(old_key + suffix for _, suffix, _ in COMPRESSED_VARIANTS)
+
+    for name in changed:
+        history = [files[name]["key"]] + [k for k in releases.get(name, []) if k != files[name]["key"]]
+        releases[name] = history[:KEEP_RELEASES]
+        drop(history[KEEP_RELEASES:])
+    # Names no longer in the manifest (retired shards/patches): every release
+    # and the legacy fixed key go; nothing references them any more
+    for name in [name for name in releases if name not in files]:
+        drop(releases.pop(name))
+        if UPDATE_LEGACY_KEYS:
+            stale_keys.append(name)
+    if stale_keys:
         try:
-            supabase.storage.from_(BUCKET_NAME).remove([bucket_path])
-        except Exception:
-            pass  # ignore if file doesn't exist yet
+            bucket.remove(stale_keys)
+        except Exception as e:
+            print(f" Could not remove old releases: {e}")
+
+    save_local_manifest({"version": version, "files": files, "releases": releases}, manifest_file)
+    print(f" Published version {version}: {', '.join(changed)}")
+    return changed
 
-        supabase.storage.from_(BUCKET_NAME).upload(bucket_path, data)
-        print(f" Uploaded {local_path} to bucket as {bucket_path}")
-    except Exception as e:
-        print(f" Upload failed for {local_path}: {e}")
 
 # --------------------------
 # Main Execution
 # --------------------------
 if __name__ == "__main__":
-    backend_dir = os.path.dirname(os.path.abspath(__file__))
-
-    accident_file = os.path.join(backend_dir, "data", "accidents_clustered.geojson")
-    cluster_file = os.path.join(backend_dir, "data", "cluster_centers.json")
+    maybe_start_profiler()
 
-    print(" Starting upload to Supabase Storage...")
+    parser = argparse.ArgumentParser(description="Publish clustering artifacts to Supabase Storage")
+    parser.add_argument("--force", action="store_true", help="Upload even if the content hash is unchanged")
+    parser.add_argument("--local", metavar="DIR", help="Publish into a local folder instead of Supabase (testing)")
+    args = parser.parse_args()
 
-    upload_file_to_bucket(accident_file, "accidents_clustered.geojson")
-    upload_file_to_bucket(cluster_file, "cluster_centers.json")
+    if args.local:
+        from local_storage import LocalBucket
+        target_bucket = LocalBucket(args.local)
+        manifest_file = os.path.join(DATA_FOLDER, ".publish_manifest.local.json")
+    else:
+        target_bucket = get_bucket()
+        manifest_file = LOCAL_MANIFEST_FILE
 
+    print(" Starting upload to Supabase Storage...")
+    try:
+        publish_artifacts(target_bucket, artifacts=ARTIFACTS + shard_artifacts() + patch_artifacts(), force=args.force,
+                          manifest_file=manifest_file, replace_folders=(SHARDS_SUBFOLDER, PATCHES_SUBFOLDER))
+    except PublishError as e:
+        print(f" Upload process failed: {e}")
+        sys.exit(1)
     print(" Upload process finished.")
+    sys.exit(0)
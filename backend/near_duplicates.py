@@ -0,0 +1,227 @@
+import os
+import json
+import logging
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from date_parsing import parse_date_column, parse_time_column
+from metrics import instrumented
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# Near-duplicate detection
+# ==============================
+# Catches the same incident entered twice with slightly different coordinates
+# or time (which exact signature matching misses). Records are bucketed by
+# (day, grid cell); the grid cell is DISTANCE_TOLERANCE_M wide, so any match
+# lies in the same or one of the 26 neighbouring (day, cell) buckets and only
+# those candidates are compared. Work stays roughly linear in the record count.
+#
+# Two records are near duplicates when all of these hold:
+#   - within DISTANCE_TOLERANCE_M metres
+#   - within TIME_TOLERANCE_MINUTES (same day if either has no time)
+#   - same offense type (case/space-insensitive), if MATCH_OFFENSE_TYPE
+# and they are not exact repeats (those stay with the existing duplicate
+# handling). Matches are grouped transitively (a chain of 25 m steps can span
+# more than 25 m), so by default the groups are only flagged in the audit file;
+# with drop=True each group keeps one record.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+AUDIT_FILE = os.path.join(SCRIPT_DIR, "data", "near_duplicates_audit.jsonl")
+SNAPSHOT_FILE = os.path.join(SCRIPT_DIR, "data", "accidents.geojson")  # Written by export_geojson.py
+
+DISTANCE_TOLERANCE_M = 25.0
+TIME_TOLERANCE_MINUTES = 30.0
+MATCH_OFFENSE_TYPE = True
+METERS_PER_DEGREE = 111_320.0
+MINUTES_PER_DAY = 1440
+AUDIT_FIELDS = ["barangay", "lat", "lng", "datecommitted", "timecommitted", "offensetype"]
+
+
+def _features(df: pd.DataFrame):
+    """(x_m, y_m, day, minute of day or NaN, offense code, valid mask)"""
+    lat = pd.to_numeric(df["lat"], errors="coerce").to_numpy(dtype=np.float64)
+    lng = pd.to_numeric(df["lng"], errors="coerce").to_numpy(dtype=np.float64)
+    dates, _ = parse_date_column(df["datecommitted"])
+    day = dates.dt.normalize().to_numpy(dtype="datetime64[D]")
+    valid = np.isfinite(lat) & np.isfinite(lng) & ~np.isnat(day)
+
+    minutes = np.full(len(df), np.nan)
+    if "timecommitted" in df.columns:
+        times, _ = parse_time_column(df["timecommitted"])
+        minutes = (times.dt.total_seconds() / 60.0).to_numpy(dtype=np.float64)
+
+    # Equirectangular projection around the data's mean latitude (metres)
+    lat0 = np.radians(np.nanmean(lat[valid])) if valid.any() else 0.0
+    x = lng * METERS_PER_DEGREE * np.cos(lat0)
+    y = lat * METERS_PER_DEGREE
+
+    if MATCH_OFFENSE_TYPE and "offensetype" in df.columns:
+        offense = df["offensetype"].astype("string").str.lower().str.strip().fillna("")
+        offense_codes = pd.factorize(offense)[0]
+    else:
+        offense_codes = np.zeros(len(df), dtype=np.int64)
+    return x, y, day.astype(np.int64), minutes, offense_codes, valid
+
+
+def candidate_pairs(df: pd.DataFrame, distance_m: float = DISTANCE_TOLERANCE_M,
+                    time_minutes: float = TIME_TOLERANCE_MINUTES) -> pd.DataFrame:
+    """All near-duplicate pairs (i < j by position) with their distance and time gap"""
+    x, y, day, minutes, offense, valid = _features(df)
+    ids = np.flatnonzero(valid)
+    empty = pd.DataFrame({"i": np.array([], dtype=np.int64), "j": np.array([], dtype=np.int64),
+                          "distance_m": [], "minutes_apart": []})
+    if len(ids) < 2:
+        return empty
+
+    # Pack (day, cell_x, cell_y) into one int64 key; +1 padding so neighbour keys never wrap
+    cell_x = np.floor(x[ids] / distance_m).astype(np.int64)
+    cell_y = np.floor(y[ids] / distance_m).astype(np.int64)
+    day_index = day[ids] - day[ids].min() + 1
+    cell_x -= cell_x.min() - 1
+    cell_y -= cell_y.min() - 1
+    stride_x = int(cell_y.max()) + 2
+    stride_day = (int(cell_x.max()) + 2) * stride_x
+    keys = day_index * stride_day + cell_x * stride_x + cell_y
+
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    pairs = []
+    for dd in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                # Querying in key order keeps searchsorted cache-friendly
+                neighbour = sorted_keys + (dd * stride_day + dx * stride_x + dy)
+                lo = np.searchsorted(sorted_keys, neighbour, side="left")
+                hi = np.searchsorted(sorted_keys, neighbour, side="right")
+                counts = hi - lo
+                if not counts.any():
+                    continue
+                left = np.repeat(order, counts)
+                within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                right = order[np.repeat(lo, counts) + within]
+                i, j = ids[left], ids[right]
+                keep = i < j
+                if MATCH_OFFENSE_TYPE:
+                    keep &= offense[i] == offense[j]
+                i, j = i[keep], j[keep]
+
+                distance = np.hypot(x[i] - x[j], y[i] - y[j])
+                both_timed = ~np.isnan(minutes[i]) & ~np.isnan(minutes[j])
+                gap = np.abs((day[j] - day[i]) * MINUTES_PER_DAY + np.nan_to_num(minutes[j]) - np.nan_to_num(minutes[i]))
+                gap = np.where(both_timed, gap, np.where(day[i] == day[j], 0.0, np.inf))
+                keep = (distance <= distance_m) & (gap <= time_minutes)
+                pairs.append(pd.DataFrame({"i": i[keep], "j": j[keep],
+                                           "distance_m": distance[keep], "minutes_apart": gap[keep]}))
+
+    return pd.concat(pairs, ignore_index=True) if pairs else empty
+
+
+def load_snapshot_rows(snapshot_file: str = SNAPSHOT_FILE) -> pd.DataFrame:
+    """Rows already in the database, from the last export snapshot (empty if there is none)"""
+    try:
+        with open(snapshot_file, "r", encoding="utf-8") as f:
+            features = json.load(f).get("features", [])
+    except (OSError, ValueError) as e:
+        if os.path.exists(snapshot_file):
+            logger.warning(f" Ignoring unreadable snapshot for near-duplicate check: {e}")
+        return pd.DataFrame(columns=AUDIT_FIELDS)
+
+    rows = pd.DataFrame.from_records([feature.get("properties") or {} for feature in features])
+    coordinates = [(feature.get("geometry") or {}).get("coordinates") or [None, None] for feature in features]
+    rows["lng"] = [point[0] for point in coordinates]
+    rows["lat"] = [point[1] for point in coordinates]
+    return rows.reindex(columns=AUDIT_FIELDS)
+
+
+@instrumented(rows="records")
+def filter_near_duplicates(records, existing=None, distance_m: float = DISTANCE_TOLERANCE_M,
+                           time_minutes: float = TIME_TOLERANCE_MINUTES, audit_file: str = AUDIT_FILE,
+                           drop: bool = False):
+    """Flag (or with drop=True, drop) new records that are near duplicates of each other or of existing rows
+
+    Args:
+        records: New records (list of dicts)
+        existing: Optional rows already in the database (DataFrame or list of dicts)
+        drop: Remove all but the first record of each group instead of only flagging them
+
+    Returns (kept records, grouped pairs DataFrame); kept records are all of
+    them unless drop=True. Every pair that puts a record in a group is written
+    to audit_file (JSON lines): "duplicate" marks the records a merge removes,
+    "dropped" the ones this call removed.
+    """
+    if not records:
+        return records, pd.DataFrame()
+    new_df = pd.DataFrame.from_records(records)
+    existing_df = existing if isinstance(existing, pd.DataFrame) else pd.DataFrame.from_records(existing or [])
+    n_existing = len(existing_df)
+    columns = [col for col in AUDIT_FIELDS if col in new_df.columns]
+    combined = pd.concat([existing_df.reindex(columns=columns), new_df[columns]], ignore_index=True)
+
+    pairs = candidate_pairs(combined, distance_m, time_minutes)
+    pairs = pairs[pairs["j"] >= n_existing]  # Pairs among existing rows are not ours to fix
+    # Exact repeats are left to the upsert / signature check so they still count as duplicates
+    pairs = pairs[(pairs["distance_m"] > 0) | (pairs["minutes_apart"] > 0)]
+    if pairs.empty:
+        _write_audit([], audit_file)
+        return records, pairs
+
+    # Transitive groups; each keeps its first member (an existing row when there is one)
+    n = len(combined)
+    graph = coo_matrix((np.ones(len(pairs)), (pairs["i"].to_numpy(), pairs["j"].to_numpy())), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+    first_in_group = pd.Series(np.arange(n)).groupby(labels).transform("min").to_numpy()
+    duplicate = np.arange(n) != first_in_group
+    duplicate[:n_existing] = False
+    dropped = duplicate & drop
+
+    merged = pairs[duplicate[pairs["j"].to_numpy()] | duplicate[pairs["i"].to_numpy()]].copy()
+    merged["group"] = first_in_group[merged["i"].to_numpy()]
+    kept_records = [record for position, record in enumerate(records) if not dropped[n_existing + position]]
+
+    audit = []
+    for row in merged.itertuples(index=False):
+        audit.append({
+            "group": int(row.group),
+            "distance_m": round(float(row.distance_m), 2),
+            "minutes_apart": round(float(row.minutes_apart), 1),
+            "first": {"source": "existing" if row.i < n_existing else "upload", "duplicate": bool(duplicate[row.i]),
+                      "dropped": bool(dropped[row.i]), **_plain(combined.iloc[row.i])},
+            "second": {"source": "upload", "duplicate": bool(duplicate[row.j]), "dropped": bool(dropped[row.j]),
+                       **_plain(combined.iloc[row.j])},
+        })
+    _write_audit(audit, audit_file)
+    if drop:
+        logger.info(f" Near-duplicate filter dropped {len(records) - len(kept_records)} records "
+                    f"({len(merged)} merged pairs, see {audit_file})")
+    else:
+        logger.info(f" Near-duplicate check flagged {duplicate_count(merged)} records "
+                    f"({len(merged)} pairs, kept - see {audit_file})")
+    return kept_records, merged
+
+
+def duplicate_count(pairs: pd.DataFrame) -> int:
+    """Records a merge removes, from filter_near_duplicates' grouped pairs (every member but each group's first)"""
+    if pairs.empty:
+        return 0
+    members = np.union1d(pairs["i"].to_numpy(), pairs["j"].to_numpy())
+    return len(np.setdiff1d(members, pairs["group"].to_numpy()))
+
+
+def _plain(row: pd.Series) -> dict:
+    return {key: (None if pd.isna(value) else value.item() if hasattr(value, "item") else value)
+            for key, value in row.items()}
+
+
+def _write_audit(audit: list, audit_file: str):
+    if not audit:
+        if os.path.exists(audit_file):
+            os.remove(audit_file)  # Don't leave a previous upload's audit behind
+        return
+    os.makedirs(os.path.dirname(audit_file), exist_ok=True)
+    tmp_path = audit_file + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for entry in audit:
+            f.write(json.dumps(entry, default=str, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, audit_file)
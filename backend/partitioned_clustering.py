@@ -0,0 +1,145 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from hdbscan import HDBSCAN
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from metrics import instrumented, emit_metric
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# Spatially partitioned HDBSCAN
+# ==============================
+# One HDBSCAN over every point grows super-linearly in time and memory. Here
+# the points are split into tiles by recursive median bisection (so tiles
+# hold similar numbers of points), each tile is clustered in its own process
+# together with a halo of neighbouring points HALO_METERS wide, and clusters
+# are then stitched together across tile edges:
+#
+#   - every point takes its label from the tile that owns it (its core tile)
+#   - a point that is also in another tile's halo links its core-tile cluster
+#     to the cluster the other tile gave it; cluster pairs sharing at least
+#     MERGE_MIN_SHARED such points are merged (connected components)
+#
+# The halo gives edge points the same neighbourhood they have in the
+# monolithic run, so labels stay close to it (see compare_clustering.py).
+MAX_TILE_POINTS = 50_000
+HALO_METERS = 300.0
+MERGE_MIN_SHARED = 3
+METERS_PER_DEGREE = 111_320.0
+MAX_WORKERS = max(1, multiprocessing.cpu_count() - 1)
+
+
+def partition_bounds(lat, lon, max_points=MAX_TILE_POINTS):
+    """Tile bounds [(lat_lo, lat_hi, lon_lo, lon_hi)] covering every point
+
+    Splits at the median of the longer side until no tile holds more than
+    max_points points. Outer edges are open (infinite).
+    """
+    tiles = []
+    stack = [(np.arange(len(lat)), (-np.inf, np.inf, -np.inf, np.inf))]
+    while stack:
+        ids, (lat_lo, lat_hi, lon_lo, lon_hi) = stack.pop()
+        if len(ids) <= max_points:
+            tiles.append((lat_lo, lat_hi, lon_lo, lon_hi))
+            continue
+        lat_span = (lat[ids].max() - lat[ids].min()) * METERS_PER_DEGREE
+        lon_span = (lon[ids].max() - lon[ids].min()) * METERS_PER_DEGREE * np.cos(np.radians(lat[ids].mean()))
+        values = lat[ids] if lat_span >= lon_span else lon[ids]
+        split = float(np.median(values))
+        below = values < split
+        if below.all() or not below.any():
+            tiles.append((lat_lo, lat_hi, lon_lo, lon_hi))  # Too many identical coordinates to split
+            continue
+        if lat_span >= lon_span:
+            stack.append((ids[below], (lat_lo, split, lon_lo, lon_hi)))
+            stack.append((ids[~below], (split, lat_hi, lon_lo, lon_hi)))
+        else:
+            stack.append((ids[below], (lat_lo, lat_hi, lon_lo, split)))
+            stack.append((ids[~below], (lat_lo, lat_hi, split, lon_hi)))
+    return tiles
+
+
+def _in_bounds(lat, lon, bounds, lat_margin=0.0, lon_margin=0.0):
+    lat_lo, lat_hi, lon_lo, lon_hi = bounds
+    return ((lat >= lat_lo - lat_margin) & (lat < lat_hi + lat_margin) &
+            (lon >= lon_lo - lon_margin) & (lon < lon_hi + lon_margin))
+
+
+def _cluster_tile(coords, min_cluster_size, min_samples, cluster_selection_epsilon):
+    """HDBSCAN labels for one tile (runs in a worker process)"""
+    if len(coords) < max(min_cluster_size, min_samples + 1):
+        return np.full(len(coords), -1, dtype=np.int32)
+    clusterer = HDBSCAN(
+        min_cluster_size=min_cluster_size,
+        min_samples=min_samples,
+        metric="haversine",
+        cluster_selection_epsilon=cluster_selection_epsilon,
+    )
+    return clusterer.fit_predict(coords).astype(np.int32)
+
+
+@instrumented(rows=lambda labels, *_, **__: len(labels))
+def partitioned_hdbscan(lat, lon, min_cluster_size=15, min_samples=5, cluster_selection_epsilon=0.0001,
+                        max_tile_points=MAX_TILE_POINTS, halo_meters=HALO_METERS,
+                        merge_min_shared=MERGE_MIN_SHARED, max_workers=MAX_WORKERS):
+    """Cluster labels for every point (-1 = noise), numbered 0..k-1"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    n = len(lat)
+    tiles = partition_bounds(lat, lon, max_tile_points)
+    if len(tiles) == 1:
+        return _cluster_tile(np.radians(np.column_stack([lat, lon])), min_cluster_size,
+                             min_samples, cluster_selection_epsilon)
+
+    lat_margin = halo_meters / METERS_PER_DEGREE
+    lon_margin = halo_meters / (METERS_PER_DEGREE * np.cos(np.radians(np.abs(lat).max())))
+    members = [np.flatnonzero(_in_bounds(lat, lon, bounds, lat_margin, lon_margin)) for bounds in tiles]
+    owner = np.full(n, -1, dtype=np.int64)
+    for tile, bounds in enumerate(tiles):
+        owner[_in_bounds(lat, lon, bounds)] = tile
+
+    coords = np.radians(np.column_stack([lat, lon]))
+    workers = min(max_workers, len(tiles))
+    args = [(coords[ids], min_cluster_size, min_samples, cluster_selection_epsilon) for ids in members]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tile_labels = list(pool.map(_cluster_tile, *zip(*args)))
+    else:
+        tile_labels = [_cluster_tile(*tile_args) for tile_args in args]
+
+    # Give every tile's clusters a global id
+    offsets = np.cumsum([0] + [int(labels.max()) + 1 for labels in tile_labels])
+    labels = np.full(n, -1, dtype=np.int64)
+    links = []
+    for tile, (ids, tile_label) in enumerate(zip(members, tile_labels)):
+        global_label = np.where(tile_label >= 0, tile_label + offsets[tile], -1)
+        core = owner[ids] == tile
+        labels[ids[core]] = global_label[core]
+        links.append(pd.DataFrame({"point": ids[~core], "halo_label": global_label[~core]}))
+
+    # Stitch clusters across tile edges through the halo points
+    links = pd.concat(links, ignore_index=True)
+    links["core_label"] = labels[links["point"].to_numpy()]
+    links = links[(links["core_label"] >= 0) & (links["halo_label"] >= 0)]
+    shared = links.groupby(["core_label", "halo_label"]).size()
+    shared = shared[shared >= merge_min_shared]
+
+    n_global = int(offsets[-1])
+    graph = coo_matrix((np.ones(len(shared)), (shared.index.get_level_values(0), shared.index.get_level_values(1))),
+                       shape=(n_global, n_global))
+    _, component = connected_components(graph, directed=False)
+
+    clustered = labels >= 0
+    merged = component[labels[clustered]]
+    _, sequential = np.unique(merged, return_inverse=True)
+    result = np.full(n, -1, dtype=np.int32)
+    result[clustered] = sequential
+
+    emit_metric("partitioned_clustering", tiles=len(tiles), workers=workers,
+                max_tile=max(len(ids) for ids in members), tile_clusters=n_global,
+                merged_links=len(shared), clusters=int(sequential.max()) + 1 if len(sequential) else 0)
+    return result
@@ -0,0 +1,184 @@
+import os
+import json
+import shutil
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from hdbscan import HDBSCAN
+from cluster_hdbscan import (AccidentClusterAnalyzer, scaled_density_params,
+                             MIN_CLUSTER_SIZE, MIN_SAMPLES, CLUSTER_SELECTION_EPSILON)
+from metrics import instrumented, emit_metric, maybe_start_profiler
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# Per-period clustering (time slider)
+# ==============================
+# Hotspots computed separately for every year and every quarter, so the map
+# can animate how they move. The GeoJSON is loaded and its dates parsed once;
+# the slices are then clustered concurrently in a process pool (each worker
+# gets only the slice's coordinates and category codes).
+#
+#   data/periods/index.json                 periods, files, columns, severities
+#   data/periods/<kind>/<period>.json       {"period", "centers": [[lat, lon, accidents, barangay, danger_score, <severities...>], ...]}
+#
+# HDBSCAN thresholds are scaled to each slice's share of the data, the same
+# way as for preview samples (scaled_density_params). Each period cluster gets
+# the analyzer's danger score (calculate_danger_score, as in cluster_centers.json)
+# and centers are sorted by it. The year validation and temporal sub-clustering
+# of the main run are not applied - they judge how a hotspot spreads over
+# several years, which a single year or quarter can't show - so periods carry
+# the raw HDBSCAN clusters; index.json states this under "scoring".
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PERIODS_FOLDER = os.path.join(SCRIPT_DIR, "data", "periods")
+
+GRANULARITIES = {"year": "Y", "quarter": "Q"}  # kind -> pandas period frequency
+MIN_PERIOD_ACCIDENTS = 50  # Slices smaller than this are listed but not clustered
+MAX_WORKERS = max(1, multiprocessing.cpu_count() - 1)
+COLUMNS = ["lat", "lon", "accidents", "barangay", "danger_score"]
+SCORING = {"danger_score": "calculate_danger_score", "year_validation": False, "temporal_subclustering": False}
+
+
+def _cluster_slice(lat, lon, min_cluster_size, min_samples):
+    """HDBSCAN labels for one period (runs in a worker process)"""
+    clusterer = HDBSCAN(
+        min_cluster_size=min_cluster_size,
+        min_samples=min_samples,
+        metric="haversine",
+        cluster_selection_epsilon=CLUSTER_SELECTION_EPSILON,
+    )
+    return clusterer.fit_predict(np.radians(np.column_stack([lat, lon]))).astype(np.int32)
+
+
+def danger_scores(analyzer, df: pd.DataFrame, labels) -> pd.Series:
+    """Analyzer danger score per cluster of one period slice (df rows in label order)"""
+    clustered = labels >= 0
+    return pd.Series({int(cluster): analyzer.calculate_danger_score(subset)
+                      for cluster, subset in df[clustered].groupby(labels[clustered])}, dtype=np.float64)
+
+
+def summarize_slice(labels, lat, lon, barangay_codes, severity_codes, barangays, n_severities, danger=None):
+    """Compact center rows, most dangerous cluster first (largest first without scores)"""
+    clustered = labels >= 0
+    if not clustered.any():
+        return []
+    frame = pd.DataFrame({
+        "cluster": labels[clustered],
+        "lat": lat[clustered],
+        "lon": lon[clustered],
+        "barangay": barangay_codes[clustered],
+        "severity": severity_codes[clustered],
+    })
+    grouped = frame.groupby("cluster")
+    centers = grouped[["lat", "lon"]].mean()
+    counts = grouped.size()
+    known = frame[frame["barangay"] >= 0]
+    top_barangay = known.groupby("cluster")["barangay"].agg(lambda codes: codes.value_counts().index[0])
+    severity = (frame[frame["severity"] >= 0].groupby(["cluster", "severity"]).size()
+                .unstack(fill_value=0).reindex(index=counts.index, columns=range(n_severities), fill_value=0))
+
+    danger = danger.reindex(counts.index) if danger is not None else pd.Series(np.nan, index=counts.index)
+    order = pd.DataFrame({"danger": danger, "accidents": counts}).sort_values(["danger", "accidents"], ascending=False)
+    rows = []
+    for cluster in order.index:
+        code = top_barangay.get(cluster)
+        rows.append([
+            round(float(centers.at[cluster, "lat"]), 6),
+            round(float(centers.at[cluster, "lon"]), 6),
+            int(counts[cluster]),
+            barangays[int(code)] if code is not None else None,
+            round(float(danger[cluster]), 4) if pd.notna(danger[cluster]) else None,
+            *severity.loc[cluster].astype(int).tolist(),
+        ])
+    return rows
+
+
+@instrumented(rows=lambda index, *_, **__: len(index["periods"]))
+def cluster_periods(analyzer, folder=PERIODS_FOLDER, granularities=GRANULARITIES, max_workers=MAX_WORKERS):
+    """Cluster every year / quarter slice of analyzer.df and write the period files + index"""
+    df = analyzer.df[~analyzer.df["date_imputed"]] if "date_imputed" in analyzer.df.columns else analyzer.df
+    lat = df["latitude"].to_numpy(dtype=np.float64)
+    lon = df["longitude"].to_numpy(dtype=np.float64)
+    barangay = df["barangay"].astype("category") if "barangay" in df.columns else pd.Categorical([None] * len(df))
+    severity = df["severity"].astype("category") if "severity" in df.columns else pd.Categorical([None] * len(df))
+    barangays = [str(label) for label in barangay.cat.categories]
+    severities = [str(label) for label in severity.cat.categories]
+    barangay_codes = barangay.cat.codes.to_numpy()
+    severity_codes = severity.cat.codes.to_numpy()
+
+    slices = []  # (kind, period, start, end, row positions)
+    for kind, freq in granularities.items():
+        periods = df["date"].dt.to_period(freq)
+        for period, rows in pd.Series(np.arange(len(df))).groupby(periods.to_numpy()).groups.items():
+            slices.append((kind, str(period), period.start_time, period.end_time, np.asarray(rows)))
+
+    jobs = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for position, (_, _, _, _, rows) in enumerate(slices):
+            if len(rows) >= MIN_PERIOD_ACCIDENTS:
+                min_cluster_size, min_samples = scaled_density_params(MIN_CLUSTER_SIZE, MIN_SAMPLES, len(rows) / len(df))
+                jobs[position] = pool.submit(_cluster_slice, lat[rows], lon[rows], min_cluster_size, min_samples)
+        labels = {position: job.result() for position, job in jobs.items()}
+
+    tmp_folder = folder + ".tmp"
+    shutil.rmtree(tmp_folder, ignore_errors=True)
+    os.makedirs(tmp_folder)
+
+    entries = []
+    for position, (kind, period, start, end, rows) in enumerate(slices):
+        centers = []
+        if position in labels:
+            danger = danger_scores(analyzer, df.iloc[rows], labels[position])
+            centers = summarize_slice(labels[position], lat[rows], lon[rows], barangay_codes[rows],
+                                      severity_codes[rows], barangays, len(severities), danger)
+        relative_path = f"{kind}/{period}.json"
+        os.makedirs(os.path.join(tmp_folder, kind), exist_ok=True)
+        with open(os.path.join(tmp_folder, relative_path), "w", encoding="utf-8") as f:
+            json.dump({"period": period, "kind": kind, "centers": centers}, f, separators=(",", ":"), ensure_ascii=False)
+        entries.append({
+            "period": period,
+            "kind": kind,
+            "start": start.strftime("%Y-%m-%d"),
+            "end": end.strftime("%Y-%m-%d"),
+            "accidents": int(len(rows)),
+            "clusters": len(centers),
+            "file": relative_path,
+        })
+
+    index = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "granularities": list(granularities),
+        "columns": COLUMNS + severities,
+        "severities": severities,
+        "scoring": SCORING,
+        "periods": entries,
+    }
+    with open(os.path.join(tmp_folder, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+
+    old_folder = folder + ".old"
+    shutil.rmtree(old_folder, ignore_errors=True)
+    if os.path.exists(folder):
+        os.replace(folder, old_folder)
+    os.replace(tmp_folder, folder)
+    shutil.rmtree(old_folder, ignore_errors=True)
+
+    emit_metric("period_clustering", periods=len(entries), clustered=len(labels), workers=max_workers)
+    logger.info(f"Wrote {len(entries)} period files to {folder}")
+    return index
+
+
+def main():
+    analyzer = AccidentClusterAnalyzer()
+    if not analyzer.load_geojson_data() or not analyzer.preprocess_data():
+        return False
+    cluster_periods(analyzer)
+    return True
+
+
+if __name__ == "__main__":
+    maybe_start_profiler()
+    main()
@@ -0,0 +1,440 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from metrics import emit_metric, stage_metrics, maybe_start_profiler
+
+# ==============================
+# Cached DAG pipeline
+# ==============================
+# Declares the upload chain (import -> cleanup -> export -> cluster -> publish)
+# as stages with inputs and outputs. Like make, a stage is skipped when its
+# outputs exist and the fingerprint of its inputs + code matches the last
+# successful run. Stages whose dependencies are done run concurrently, e.g.
+# cluster_centers.json is published while the clustered GeoJSON is written.
+#
+#   python pipeline.py upload     # full chain after a spreadsheet upload
+#   python pipeline.py cluster    # export from Supabase, cluster, publish
+#   python pipeline.py cluster --force
+#   python pipeline.py periods    # per-year / per-quarter hotspots for the time slider
+#
+# Large datasets (PREVIEW_MIN_POINTS and up) are clustered as a sampled preview
+# first: the local outputs are written for the map, publishing is skipped, and a
+# detached "recluster --full" run replaces and publishes them when it finishes.
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_FOLDER = os.path.join(BACKEND_DIR, "data")
+STATE_FILE = os.path.join(DATA_FOLDER, ".pipeline_state.json")
+MAX_WORKERS = 3
+HASH_CHUNK_SIZE = 1024 * 1024
+FULL_RUN_LOG = "cluster_full_run.log"
+
+ACCIDENTS_GEOJSON = os.path.join(DATA_FOLDER, "accidents.geojson")
+CLUSTERED_GEOJSON = os.path.join(DATA_FOLDER, "accidents_clustered.geojson")
+FILTER_INDEX = os.path.join(DATA_FOLDER, "filter_index.json")
+CLUSTER_CENTERS = os.path.join(DATA_FOLDER, "cluster_centers.json")
+CLUSTER_FOOTPRINTS = os.path.join(DATA_FOLDER, "cluster_footprints.geojson")
+TILES_INDEX = os.path.join(DATA_FOLDER, "tiles", "index.json")
+PERIODS_INDEX = os.path.join(DATA_FOLDER, "periods", "index.json")
+HEATMAPS_INDEX = os.path.join(DATA_FOLDER, "heatmaps", "index.json")
+SHARDS_INDEX = os.path.join(DATA_FOLDER, "shards", "index.json")
+PATCHES_INDEX = os.path.join(DATA_FOLDER, "patches", "index.json")
+
+
+# ==============================
+# Fingerprints / state
+# ==============================
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_state(state_file: str = STATE_FILE) -> dict:
+    try:
+        with open(state_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: dict, state_file: str = STATE_FILE):
+    tmp_path = state_file + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_file)
+
+
+class Stage:
+    """One pipeline step
+
+    Args:
+        name: Unique stage name
+        func: Callable taking the shared context dict, returns True on success
+        deps: Names of stages that must finish first
+        inputs: File paths (or a callable returning them) the stage reads
+        outputs: File paths the stage produces
+        code: Backend modules whose source is part of the fingerprint
+        always_run: Never skip (for stages reading remote state, e.g. Supabase)
+        reuses: Stage whose in-memory result (context) this one needs; that stage
+            is run rather than skipped whenever this one has to run
+        final_only: Skip when this run only produced a clustering preview
+            (publish stages - the background full run publishes instead)
+    """
+
+    def __init__(self, name, func, deps=(), inputs=(), outputs=(), code=(), always_run=False, reuses=None,
+                 final_only=False):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.inputs = inputs
+        self.outputs = tuple(outputs)
+        self.code = tuple(code)
+        self.always_run = always_run
+        self.reuses = reuses
+        self.final_only = final_only
+
+    def input_paths(self):
+        paths = self.inputs() if callable(self.inputs) else self.inputs
+        return [p for p in (paths or []) if p]
+
+    def fingerprint(self, input_paths):
+        digest = hashlib.sha256(self.name.encode())
+        for module in self.code:
+            path = os.path.join(BACKEND_DIR, module)
+            digest.update(f"code:{module}:{file_sha256(path) if os.path.exists(path) else '-'}".encode())
+        for path in sorted(input_paths):
+            digest.update(f"input:{os.path.basename(path)}:{file_sha256(path)}".encode())
+        return digest.hexdigest()
+
+    def outputs_current(self, recorded: dict) -> bool:
+        """True if every output exists and still has the hash recorded after the last run"""
+        for path in self.outputs:
+            if not os.path.exists(path):
+                return False
+            if recorded.get(os.path.basename(path)) != file_sha256(path):
+                return False
+        return True
+
+
+# ==============================
+# Stage functions
+# ==============================
+def latest_upload_file():
+    """Newest spreadsheet in data/ (what cleaning2 will import), as a 0/1-item list"""
+    if not os.path.isdir(DATA_FOLDER):
+        return []
+    files = [os.path.join(DATA_FOLDER, f) for f in os.listdir(DATA_FOLDER) if f.endswith(('.xlsx', '.xls', '.csv'))]
+    return [max(files, key=os.path.getmtime)] if files else []
+
+
+def run_import(context):
+    import cleaning2
+    return cleaning2.main()
+
+
+def run_cleanup(context):
+    import cleanup_files
+    return cleanup_files.main()
+
+
+def run_export(context):
+    import export_geojson
+    return export_geojson.main()
+
+
+def run_cluster(context):
+    from cluster_hdbscan import AccidentClusterAnalyzer
+    analyzer = AccidentClusterAnalyzer()
+    if not analyzer.run_analysis(preview=context.get("preview", "auto")):
+        return False
+    if context.get("if_input") and analyzer.input_fingerprint() != context["if_input"]:
+        # A newer export arrived while this run was going; its own run owns the outputs
+        logger.info(" Input changed since this run started - leaving outputs to the newer run")
+        return False
+    if analyzer.is_preview:
+        context["preview_of"] = analyzer.input_fingerprint()  # Set before any dependent stage starts
+    analyzer.export_cluster_centers()
+    analyzer.export_cluster_footprints()
+    context["analyzer"] = analyzer  # Reused by the write_* stages
+    return True
+
+
+def analyzed(context):
+    """Analyzer from the cluster stage of this run (the scheduler runs cluster whenever a writer needs it)"""
+    analyzer = context.get("analyzer")
+    if analyzer is None:
+        logger.error(" No clustered analyzer in this run - the cluster stage did not run")
+    return analyzer
+
+
+def writer(*methods):
+    """Stage calling export methods on the shared analyzer; writers take turns so
+    none of them sees another's half-finished export state"""
+    def run_write(context):
+        analyzer = analyzed(context)
+        if analyzer is None:
+            return False
+        with context["analyzer_lock"]:
+            for method in methods:
+                getattr(analyzer, method)()
+        return True
+    return run_write
+
+
+def publish(context, artifacts, replace_folders=()):
+    import mobile_cluster_fetch
+    try:
+        mobile_cluster_fetch.publish_artifacts(artifacts=artifacts, force=context.get("force", False),
+                                               replace_folders=replace_folders)
+    except mobile_cluster_fetch.PublishError as e:
+        logger.error(f" Publish failed: {e}")
+        return False
+    return True
+
+
+def run_publish_shards(context):
+    import mobile_cluster_fetch
+    return publish(context, mobile_cluster_fetch.shard_artifacts(), replace_folders=(mobile_cluster_fetch.SHARDS_SUBFOLDER,))
+
+
+def run_publish_patches(context):
+    import mobile_cluster_fetch
+    return publish(context, mobile_cluster_fetch.patch_artifacts(), replace_folders=(mobile_cluster_fetch.PATCHES_SUBFOLDER,))
+
+
+def run_periods(context):
+    import period_clustering
+    return period_clustering.main()
+
+
+def start_full_run(input_fingerprint, data_folder=DATA_FOLDER):
+    """Detached full-fidelity recluster that replaces (and publishes) a preview's outputs"""
+    log_path = os.path.join(data_folder, FULL_RUN_LOG)
+    command = [sys.executable, os.path.abspath(__file__), "recluster", "--full", "--if-input", input_fingerprint]
+    with open(log_path, "a", encoding="utf-8") as log:
+        process = subprocess.Popen(command, cwd=BACKEND_DIR, stdin=subprocess.DEVNULL,
+                                   stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    logger.info(f" Preview written; full clustering continues in the background (pid {process.pid}, log data/{FULL_RUN_LOG})")
+    return process.pid
+
+
+def publisher(*names):
+    def run_publish(context):
+        import mobile_cluster_fetch
+        return publish(context, [artifact for artifact in mobile_cluster_fetch.ARTIFACTS if artifact[0] in names])
+    return run_publish
+
+
+STAGES = [
+    Stage("import", run_import, inputs=latest_upload_file,
+          code=["cleaning2.py", "date_parsing.py", "barangay_index.py"]),
+    Stage("cleanup", run_cleanup, deps=["import"], inputs=latest_upload_file),
+    Stage("export", run_export, deps=["cleanup"], outputs=[ACCIDENTS_GEOJSON], always_run=True),
+    Stage("cluster", run_cluster, deps=["export"], inputs=[ACCIDENTS_GEOJSON], outputs=[CLUSTER_CENTERS, CLUSTER_FOOTPRINTS],
+          code=["cluster_hdbscan.py", "date_parsing.py", "barangay_index.py", "cluster_footprints.py"]),
+    Stage("write_clustered_geojson", writer("export_to_geojson", "export_filter_index"), deps=["cluster"], reuses="cluster",
+          inputs=[ACCIDENTS_GEOJSON], outputs=[CLUSTERED_GEOJSON, FILTER_INDEX],
+          code=["cluster_hdbscan.py", "date_parsing.py", "filter_index.py"]),
+    Stage("write_tiles", writer("export_tile_pyramid"), deps=["cluster"], reuses="cluster",
+          inputs=[ACCIDENTS_GEOJSON], outputs=[TILES_INDEX],
+          code=["cluster_hdbscan.py", "date_parsing.py", "tile_pyramid.py"]),
+    Stage("write_shards", writer("export_geohash_shards"), deps=["cluster"], reuses="cluster",
+          inputs=[ACCIDENTS_GEOJSON], outputs=[SHARDS_INDEX],
+          code=["cluster_hdbscan.py", "date_parsing.py", "geohash_shards.py"]),
+    Stage("write_patches", writer("export_delta_patch"), deps=["cluster"], reuses="cluster",
+          inputs=[ACCIDENTS_GEOJSON], outputs=[PATCHES_INDEX],
+          code=["cluster_hdbscan.py", "date_parsing.py", "delta_patches.py"]),
+    Stage("write_heatmaps", writer("export_heatmaps"), deps=["cluster"], reuses="cluster",
+          inputs=[ACCIDENTS_GEOJSON], outputs=[HEATMAPS_INDEX],
+          code=["cluster_hdbscan.py", "date_parsing.py", "heatmap_rasters.py"]),
+    Stage("write_periods", run_periods, deps=["export"], inputs=[ACCIDENTS_GEOJSON], outputs=[PERIODS_INDEX],
+          code=["period_clustering.py", "cluster_hdbscan.py", "date_parsing.py"]),
+    # The publisher keeps its own content-hash manifest and skips unchanged files,
+    # so these always run (a failed upload is retried on the next run)
+    Stage("publish_centers", publisher("cluster_centers.json", "cluster_footprints.geojson"), deps=["cluster"],
+          inputs=[CLUSTER_CENTERS, CLUSTER_FOOTPRINTS], always_run=True, final_only=True),
+    Stage("publish_geojson", publisher("accidents_clustered.geojson", "filter_index.json"), deps=["write_clustered_geojson"],
+          inputs=[CLUSTERED_GEOJSON, FILTER_INDEX], always_run=True, final_only=True),
+    Stage("publish_shards", run_publish_shards, deps=["write_shards"], inputs=[SHARDS_INDEX], always_run=True, final_only=True),
+    Stage("publish_patches", run_publish_patches, deps=["write_patches"], inputs=[PATCHES_INDEX], always_run=True, final_only=True),
+]
+
+# Target -> stages it runs (dependencies outside the target count as satisfied)
+TARGETS = {
+    "upload": [stage.name for stage in STAGES],
+    "cluster": ["export", "cluster", "write_clustered_geojson", "write_shards", "write_patches", "write_tiles",
+                "write_heatmaps", "publish_centers", "publish_geojson", "publish_shards", "publish_patches"],
+    # Follow-up of a preview run: the export is already on disk
+    "recluster": ["cluster", "write_clustered_geojson", "write_shards", "write_patches", "write_tiles",
+                  "write_heatmaps", "publish_centers", "publish_geojson", "publish_shards", "publish_patches"],
+    "periods": ["export", "write_periods"],
+    "publish": ["publish_centers", "publish_geojson", "publish_shards", "publish_patches"],
+}
+
+
+# ==============================
+# Scheduler
+# ==============================
+class Pipeline:
+    def __init__(self, stages=STAGES, state_file: str = STATE_FILE, max_workers: int = MAX_WORKERS):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_file = state_file
+        self.max_workers = max_workers
+        self.state = load_state(state_file)
+        self.results = {}  # name -> {"status", "duration", "reason"}
+        self.context = {}
+
+    def _should_skip(self, stage: Stage, force: bool):
+        """(reason, input_paths, fingerprint); reason is None when the stage must run"""
+        input_paths = stage.input_paths()
+        if stage.inputs and not input_paths:
+            return "no input", input_paths, None
+        missing = [p for p in input_paths if not os.path.exists(p)]
+        if missing:
+            return f"missing input {os.path.basename(missing[0])}", input_paths, None
+
+        fingerprint = stage.fingerprint(input_paths)
+        if force or stage.always_run:
+            return None, input_paths, fingerprint
+        recorded = self.state.get(stage.name, {})
+        if recorded.get("fingerprint") == fingerprint and stage.outputs_current(recorded.get("outputs", {})):
+            return "up to date", input_paths, fingerprint
+        return None, input_paths, fingerprint
+
+    def _needed_by(self, stage: Stage, names, force: bool):
+        """First stage of the target that reuses `stage`'s result and has to run, or None"""
+        for name in names:
+            other = self.stages[name]
+            if other.reuses == stage.name and self._should_skip(other, force)[0] is None:
+                return name
+        return None
+
+    def _run_stage(self, stage: Stage, context: dict, force: bool, names=()):
+        start = time.perf_counter()
+        reason, _, fingerprint = self._should_skip(stage, force)
+        if reason == "up to date":
+            needed_by = self._needed_by(stage, names, force)
+            if needed_by:
+                logger.info(f" {stage.name} is up to date but {needed_by} needs its result - running it")
+                reason = None
+        if not reason and stage.final_only and context.get("preview_of"):
+            reason = "preview - the background full run publishes"
+        if reason:
+            return {"status": "skipped", "reason": reason, "duration": time.perf_counter() - start}
+
+        logger.info(f" ▶ {stage.name}")
+        try:
+            with stage_metrics(f"pipeline.{stage.name}"):
+                ok = bool(stage.func(context))
+        except Exception as e:
+            logger.error(f" Stage {stage.name} raised: {e}")
+            ok = False
+        duration = time.perf_counter() - start
+        if not ok:
+            return {"status": "failed", "reason": "stage returned failure", "duration": duration}
+
+        if context.get("preview_of"):
+            fingerprint = f"preview:{fingerprint}"  # Never "up to date" for the full run that follows
+        self.state[stage.name] = {
+            "fingerprint": fingerprint,
+            "outputs": {os.path.basename(p): file_sha256(p) for p in stage.outputs if os.path.exists(p)},
+            "finished_at": time.time(),
+        }
+        return {"status": "ran", "reason": None, "duration": duration}
+
+    def run(self, target: str = "upload", force: bool = False, preview="auto", if_input=None) -> bool:
+        """Run the target's stages; `preview`/`if_input` are passed to the cluster stage
+        (see AccidentClusterAnalyzer.run_analysis and main)"""
+        names = TARGETS[target]
+        pending = {name: self.stages[name] for name in names}
+        context = {"force": force, "preview": preview, "if_input": if_input, "analyzer_lock": threading.Lock()}
+        self.context = context
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            running = {}
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    deps = [d for d in stage.deps if d in names]
+                    if any(d not in self.results for d in deps):
+                        continue
+                    del pending[name]
+                    failed = [d for d in deps if self.results[d]["status"] in ("failed", "blocked")]
+                    if failed:
+                        self.results[name] = {"status": "blocked", "reason": f"{failed[0]} failed", "duration": 0.0}
+                        continue
+                    running[pool.submit(self._run_stage, stage, context, force, names)] = name
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.results[running.pop(future)] = future.result()
+
+        save_state(self.state, self.state_file)
+        self.report(names, time.perf_counter() - started)
+        return all(result["status"] != "failed" for result in self.results.values())
+
+    def critical_path(self, names):
+        """Longest chain of stage durations through the DAG: (seconds, [names])"""
+        finish = {}
+        for name in names:  # STAGES / TARGETS are declared in dependency order
+            deps = [d for d in self.stages[name].deps if d in finish]
+            before = max(deps, key=lambda d: finish[d][0]) if deps else None
+            start, chain = finish[before] if before else (0.0, [])
+            finish[name] = (start + self.results[name]["duration"], chain + [name])
+        return max(finish.values(), key=lambda item: item[0])
+
+    def report(self, names, wall_seconds: float):
+        print(" Pipeline summary:")
+        for name in names:
+            result = self.results[name]
+            detail = f" ({result['reason']})" if result["reason"] else ""
+            print(f"   {name:<24} {result['status']:<8} {result['duration']:7.2f}s{detail}")
+        path_seconds, path = self.critical_path(names)
+        print(f" Critical path: {' -> '.join(path)} = {path_seconds:.2f}s (wall {wall_seconds:.2f}s)")
+        counts = {status: sum(self.results[name]["status"] == status for name in names)
+                  for status in ("ran", "skipped", "failed", "blocked")}
+        # Hidden marker parsed by server.js (replaces what it read from direct cluster_hdbscan.py runs)
+        print(f"[SUMMARY]PIPELINE:{' '.join(f'{k}={v}' for k, v in counts.items())} "
+              f"preview={int(bool(self.context.get('preview_of')))}", flush=True)
+        emit_metric(
+            "pipeline",
+            wall_s=wall_seconds,
+            critical_path_s=path_seconds,
+            critical_path=">".join(path),
+            ran=sum(r["status"] == "ran" for r in self.results.values()),
+            skipped=sum(r["status"] == "skipped" for r in self.results.values()),
+        )
+
+
+# ==============================
+# Main Execution
+# ==============================
+if __name__ == "__main__":
+    maybe_start_profiler()
+
+    parser = argparse.ArgumentParser(description="Run the upload/cluster pipeline, skipping up-to-date stages")
+    parser.add_argument("target", nargs="?", default="upload", choices=sorted(TARGETS))
+    parser.add_argument("--force", action="store_true", help="Run every stage even if its outputs are current")
+    parser.add_argument("--full", action="store_true", help="Cluster every point, even for large datasets (no preview)")
+    parser.add_argument("--if-input", metavar="FINGERPRINT", help="Skip writing outputs if accidents.geojson changed since")
+    args = parser.parse_args()
+
+    runner = Pipeline()
+    success = runner.run(args.target, force=args.force, preview=False if args.full else "auto", if_input=args.if_input)
+    if success and runner.context.get("preview_of"):
+        start_full_run(runner.context["preview_of"])
+    sys.exit(0 if success else 1)
@@ -0,0 +1,191 @@
+import os
+import json
+import logging
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from date_parsing import parse_date_column
+from metrics import instrumented
+
+try:
+    import pyarrow  # noqa: F401  Optional: adds a .parquet copy of the cube
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# Analytics rollup cube
+# ==============================
+# Accident counts per barangay x year-month x severity x offensetype, so the
+# dashboard reads a few kilobytes instead of the whole table.
+#
+#   - cleaning2.py adds the rows each upsert actually inserted
+#   - export_geojson.py rebuilds it from every exported row (one groupby), unless
+#     the incremental cube already counts exactly that many rows and its last full
+#     rebuild is less than REBUILD_INTERVAL_HOURS old (refresh_cube). The age limit
+#     bounds drift from edits and deletes made outside the upload path.
+#
+# data/rollup_cube.json:
+#   {"dimensions": [...], "values": {dimension: [labels]}, "cells": [[i, j, k, l, count], ...], ...}
+# where i/j/k/l index into the per-dimension label lists.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CUBE_FILE = os.path.join(SCRIPT_DIR, "data", "rollup_cube.json")
+PARQUET_FILE = os.path.join(SCRIPT_DIR, "data", "rollup_cube.parquet")
+
+DIMENSIONS = ["barangay", "year_month", "severity", "offensetype"]
+UNKNOWN = "Unknown"
+REBUILD_INTERVAL_HOURS = 24
+
+
+def rows_to_frame(rows) -> pd.DataFrame:
+    """Dimension columns for Supabase rows (list of dicts or a DataFrame)"""
+    df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame.from_records(rows)
+    frame = pd.DataFrame(index=df.index)
+    for column in ("barangay", "severity", "offensetype"):
+        values = df[column] if column in df.columns else pd.Series(None, index=df.index, dtype=object)
+        frame[column] = values.astype("string").str.strip().replace("", pd.NA).fillna(UNKNOWN)
+
+    if "datecommitted" in df.columns:
+        dates, _ = parse_date_column(df["datecommitted"])
+        frame["year_month"] = dates.dt.strftime("%Y-%m").astype("string").fillna(UNKNOWN)
+    else:
+        frame["year_month"] = UNKNOWN
+    return frame[DIMENSIONS]
+
+
+@instrumented(rows=lambda cube, *_, **__: len(cube))
+def build_cube(rows) -> pd.Series:
+    """Count rows per dimension combination (Series indexed by DIMENSIONS)"""
+    frame = rows_to_frame(rows)
+    if frame.empty:
+        return pd.Series([], dtype=np.int64, index=pd.MultiIndex.from_arrays([[]] * len(DIMENSIONS), names=DIMENSIONS))
+    return frame.groupby(DIMENSIONS, sort=True).size().astype(np.int64).rename("count")
+
+
+def add_to_cube(cube: pd.Series, rows) -> pd.Series:
+    """Cube plus the counts of newly inserted rows (new combinations are added)"""
+    delta = build_cube(rows)
+    if cube is None or cube.empty:
+        return delta
+    if delta.empty:
+        return cube
+    return cube.add(delta, fill_value=0).astype(np.int64).sort_index()
+
+
+def cube_to_json(cube: pd.Series, source: str, snapshot_at: str = None) -> dict:
+    values, codes = {}, []
+    for level, name in enumerate(DIMENSIONS):
+        level_codes, labels = pd.factorize(cube.index.get_level_values(level), sort=True)
+        values[name] = [str(label) for label in labels]
+        codes.append(level_codes)
+    cells = np.column_stack(codes + [cube.to_numpy()]) if len(cube) else np.empty((0, len(DIMENSIONS) + 1))
+    now = datetime.now(timezone.utc).isoformat()
+    return {
+        "dimensions": DIMENSIONS,
+        "values": values,
+        "cells": cells.astype(np.int64).tolist(),
+        "total": int(cube.sum()),
+        "source": source,
+        "updated_at": now,
+        "snapshot_at": snapshot_at or now,  # Last full rebuild
+    }
+
+
+def cube_from_json(data: dict) -> pd.Series:
+    cells = np.asarray(data["cells"], dtype=np.int64).reshape(-1, len(DIMENSIONS) + 1)
+    arrays = [np.asarray(data["values"][name], dtype=object)[cells[:, level]] for level, name in enumerate(DIMENSIONS)]
+    index = pd.MultiIndex.from_arrays(arrays, names=DIMENSIONS)
+    return pd.Series(cells[:, -1], index=index, name="count")
+
+
+def save_cube(cube: pd.Series, source: str, cube_file: str = CUBE_FILE, snapshot_at: str = None):
+    """Write the JSON cube (and a Parquet copy when pyarrow is installed) atomically"""
+    os.makedirs(os.path.dirname(cube_file), exist_ok=True)
+    tmp_path = cube_file + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cube_to_json(cube, source, snapshot_at), f, separators=(",", ":"), ensure_ascii=False)
+    os.replace(tmp_path, cube_file)
+
+    if HAS_PARQUET:
+        parquet_file = os.path.splitext(cube_file)[0] + ".parquet"
+        cube.reset_index().to_parquet(parquet_file + ".tmp", index=False)
+        os.replace(parquet_file + ".tmp", parquet_file)
+    logger.info(f" Rollup cube saved: {len(cube)} cells, {int(cube.sum())} accidents")
+
+
+def load_cube_with_meta(cube_file: str = CUBE_FILE):
+    """(cube, meta) as saved, or (None, {}) if there is none yet (or it is unreadable)"""
+    try:
+        with open(cube_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cube_from_json(data), {key: value for key, value in data.items() if key not in ("values", "cells")}
+    except (OSError, ValueError, KeyError) as e:
+        if os.path.exists(cube_file):
+            logger.warning(f" Ignoring unreadable rollup cube: {e}")
+        return None, {}
+
+
+def load_cube(cube_file: str = CUBE_FILE):
+    """Saved cube, or None if there is none yet (or it is unreadable)"""
+    return load_cube_with_meta(cube_file)[0]
+
+
+def rebuild_cube(rows, cube_file: str = CUBE_FILE) -> pd.Series:
+    """Full rebuild from an export snapshot"""
+    cube = build_cube(rows)
+    save_cube(cube, "snapshot", cube_file)
+    return cube
+
+
+def counts_snapshot(meta: dict, row_count: int, max_age_hours: float = REBUILD_INTERVAL_HOURS) -> bool:
+    """True if a cube with this meta already counts a snapshot of `row_count` rows:
+    kept up to date by the upload path, same total, and rebuilt in full recently"""
+    if meta.get("source") != "incremental" or meta.get("total") != row_count:
+        return False
+    try:
+        snapshot_at = datetime.fromisoformat(meta["snapshot_at"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return (datetime.now(timezone.utc) - snapshot_at).total_seconds() < max_age_hours * 3600
+
+
+def refresh_cube(rows, cube_file: str = CUBE_FILE):
+    """Cube for an export snapshot: the saved one when counts_snapshot says the
+    incremental updates already cover it, otherwise a full rebuild. Returns (cube, rebuilt)"""
+    cube, meta = load_cube_with_meta(cube_file)
+    if cube is not None and counts_snapshot(meta, len(rows)):
+        logger.info(f" Rollup cube is current ({meta['total']} rows, updated incrementally) - not rebuilt")
+        return cube, False
+    return rebuild_cube(rows, cube_file), True
+
+
+def update_cube(inserted_rows, cube_file: str = CUBE_FILE):
+    """Add freshly inserted rows to the saved cube
+
+    Without a saved cube there is no baseline to add to; the next export
+    rebuilds it from the full table instead.
+    """
+    if not len(inserted_rows):
+        return None
+    cube, meta = load_cube_with_meta(cube_file)
+    if cube is None:
+        logger.info(" No rollup cube yet - it will be built by the next export")
+        return None
+    cube = add_to_cube(cube, inserted_rows)
+    save_cube(cube, "incremental", cube_file, snapshot_at=meta.get("snapshot_at"))
+    return cube
+
+
+def query_cube(cube: pd.Series, by, **filters) -> pd.Series:
+    """Counts grouped by one or more dimensions, optionally filtered
+
+    Example: query_cube(cube, "year_month", barangay="San Jose", severity="Critical")
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    mask = np.ones(len(cube), dtype=bool)
+    for name, value in filters.items():
+        allowed = value if isinstance(value, (list, tuple, set)) else [value]
+        mask &= cube.index.get_level_values(name).isin(allowed)
+    return cube[mask].groupby(level=by).sum()
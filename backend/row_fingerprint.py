@@ -0,0 +1,181 @@
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from date_parsing import parse_date_column, parse_time_column
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# 64-bit row fingerprints
+# ==============================
+# One integer per accident row, used as the dedup key in cleaning2 and as the
+# upsert conflict target (road_traffic_accident.fingerprint, unique index -
+# see migrations/001_row_fingerprint.sql).
+#
+# Fields are normalized before hashing so the same accident gives the same
+# fingerprint whether it comes from Excel or from the database:
+#   barangay, offensetype   lower-case, trimmed, inner whitespace collapsed
+#   lat, lng                rounded to 1e-6 degrees (integer micro-degrees, no float formatting)
+#   datecommitted           calendar day (any format date_parsing understands)
+#   timecommitted           seconds since midnight
+# A value that can't be parsed is hashed as normalized text instead.
+#
+# Everything is column-wise numpy: strings are hashed once per distinct value
+# (pandas' SipHash with a fixed key), then the per-field 64-bit values are
+# folded with the splitmix64 finalizer. Changing any of this changes every
+# fingerprint - bump FINGERPRINT_VERSION and re-run the backfill.
+FINGERPRINT_COLUMN = "fingerprint"
+FINGERPRINT_VERSION = 1
+HASH_KEY = "osimap-rowkey-v1"  # 16 bytes, fixed so fingerprints are stable across runs
+COORDINATE_SCALE = 1_000_000
+
+# Key variants (cleaning2.filter_duplicates): the full natural key is the
+# conflict key; the looser ones also catch rows re-entered without a time or
+# with a differently spelled barangay
+KEY_COLUMNS = ("barangay", "lat", "lng", "datecommitted", "timecommitted", "offensetype")
+KEY_VARIANTS = {
+    "primary": KEY_COLUMNS,
+    "without_time": ("barangay", "lat", "lng", "datecommitted", "offensetype"),
+    "coordinates": ("lat", "lng", "datecommitted", "offensetype"),
+}
+TEXT_COLUMNS = {"barangay", "offensetype"}
+COORDINATE_COLUMNS = {"lat", "lng"}
+
+_MISSING = np.uint64(0x9E3779B97F4A7C15)  # Value of an empty field
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer (uint64 arrays, wrapping arithmetic)"""
+    with np.errstate(over="ignore"):
+        values = values ^ (values >> np.uint64(30))
+        values = values * np.uint64(0xBF58476D1CE4E5B9)
+        values = values ^ (values >> np.uint64(27))
+        values = values * np.uint64(0x94D049BB133111EB)
+        return values ^ (values >> np.uint64(31))
+
+
+def _normalized_text(series: pd.Series) -> pd.Series:
+    text = series.astype("string").str.strip().str.lower().str.replace(r"\s+", " ", regex=True)
+    return text.fillna("")
+
+
+def _hash_text(text: pd.Series) -> np.ndarray:
+    hashed = pd.util.hash_array(text.to_numpy(dtype=object), hash_key=HASH_KEY, categorize=True)
+    return np.where(text.to_numpy(dtype=object) == "", _MISSING, hashed).astype(np.uint64)
+
+
+def _unique_values(column: str, uniques: pd.Series) -> np.ndarray:
+    """uint64 per distinct (non-null) value of one field"""
+    text = _normalized_text(uniques)
+    if column in COORDINATE_COLUMNS:
+        numeric = pd.to_numeric(uniques, errors="coerce").to_numpy(dtype=np.float64)
+        parsed = ~np.isnan(numeric)
+        integers = np.round(np.where(parsed, numeric, 0.0) * COORDINATE_SCALE).astype(np.int64)
+    elif column == "datecommitted":
+        dates, _ = parse_date_column(uniques)
+        parsed = dates.notna().to_numpy()
+        integers = dates.dt.normalize().to_numpy(dtype="datetime64[D]").astype(np.int64)
+    elif column == "timecommitted":
+        times, _ = parse_time_column(uniques)
+        parsed = times.notna().to_numpy()
+        integers = times.to_numpy(dtype="timedelta64[s]").astype(np.int64) % 86400
+    else:
+        return _hash_text(text)
+
+    # Unparseable values fall back to their text so distinct garbage stays distinct
+    values = np.where(parsed, integers.view(np.uint64), _hash_text(text))
+    return np.where(text.to_numpy(dtype=object) == "", _MISSING, values).astype(np.uint64)
+
+
+def _field_values(column: str, series: pd.Series) -> np.ndarray:
+    """One uint64 per row for one normalized field (computed once per distinct value)"""
+    codes, uniques = pd.factorize(series.to_numpy(dtype=object), use_na_sentinel=True)
+    values = _unique_values(column, pd.Series(uniques, dtype=object))
+    return np.where(codes >= 0, values[np.maximum(codes, 0)] if len(values) else _MISSING, _MISSING).astype(np.uint64)
+
+
+def _fields(df: pd.DataFrame, columns) -> dict:
+    """{column: uint64 per row}; missing columns count as empty"""
+    return {column: _field_values(column, df[column]) if column in df.columns else np.full(len(df), _MISSING)
+            for column in columns}
+
+
+def _fold(fields: dict, columns) -> np.ndarray:
+    fingerprint = np.full(len(next(iter(fields.values()))), np.uint64(FINGERPRINT_VERSION), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for position, column in enumerate(columns):
+            salt = np.uint64(position + 1) * np.uint64(0xD6E8FEB86659FD93)
+            fingerprint = _mix(fingerprint ^ _mix(fields[column] + salt))
+    return fingerprint.view(np.int64)
+
+
+def _frame(rows) -> pd.DataFrame:
+    return rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+
+
+def row_fingerprints(rows, columns=KEY_COLUMNS) -> np.ndarray:
+    """int64 fingerprint per row of a DataFrame or list of dicts"""
+    df = _frame(rows)
+    if len(df) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return _fold(_fields(df, columns), columns)
+
+
+def key_variants(rows) -> dict:
+    """{variant name: int64 fingerprints} for KEY_VARIANTS (each field normalized once)"""
+    df = _frame(rows)
+    if len(df) == 0:
+        return {name: np.zeros(0, dtype=np.int64) for name in KEY_VARIANTS}
+    fields = _fields(df, KEY_COLUMNS)
+    return {name: _fold(fields, columns) for name, columns in KEY_VARIANTS.items()}
+
+
+def add_fingerprints(records: list) -> list:
+    """Set FINGERPRINT_COLUMN on every record (in place) and return the records"""
+    if records:
+        for record, fingerprint in zip(records, row_fingerprints(records).tolist()):
+            record[FINGERPRINT_COLUMN] = fingerprint
+    return records
+
+
+# ==============================
+# Backfill (existing rows)
+# ==============================
+def backfill(table_name: str, db=None, batch_size: int = 1000, recompute: bool = False) -> int:
+    """Fill road_traffic_accident.fingerprint for rows that lack it (all rows with recompute)
+
+    Run between steps 1 and 2 of migrations/001_row_fingerprint.sql. Rows are
+    written back with a merge upsert on id; returns the number of rows updated.
+    """
+    from supabase_io import get_io
+    db = db or get_io()
+    rows = db.fetch_all_sync(table_name)
+    if not rows:
+        return 0
+    fingerprints = row_fingerprints(rows).tolist()
+    pending = [{**row, FINGERPRINT_COLUMN: fingerprint} for row, fingerprint in zip(rows, fingerprints)
+               if recompute or row.get(FINGERPRINT_COLUMN) is None]
+
+    duplicates = len(fingerprints) - len(set(fingerprints))
+    if duplicates:
+        logger.warning(f" {duplicates} rows share a fingerprint with an earlier row - "
+                       "resolve them before creating the unique index (see the migration)")
+
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    results = db.write_batches_sync(table_name, batches, upsert=True, on_conflict="id", merge=True)
+    failed = [result for result in results if isinstance(result, Exception)]
+    for error in failed[:3]:
+        logger.error(f" Backfill batch failed: {error}")
+    updated = sum(len(batch) for batch, result in zip(batches, results) if not isinstance(result, Exception))
+    logger.info(f" Backfilled {updated} of {len(pending)} fingerprints ({len(failed)} failed batches)")
+    return updated
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Backfill row fingerprints for existing accident rows")
+    parser.add_argument("--table", default="road_traffic_accident")
+    parser.add_argument("--recompute", action="store_true", help="Rewrite every fingerprint (after a version bump)")
+    args = parser.parse_args()
+    backfill(args.table, recompute=args.recompute)
@@ -8,6 +8,12 @@ import XLSX from "xlsx";
 
 const app = express();
 const PORT = process.env.PORT || 5000; 
+const HOTSPOT_SERVICE_PORT = process.env.HOTSPOT_SERVICE_PORT || 5055;
+const HOTSPOT_SERVICE_URL = process.env.HOTSPOT_SERVICE_URL || `http://127.0.0.1:${HOTSPOT_SERVICE_PORT}`;
+// "off" disables /alerts/nearby; with HOTSPOT_SERVICE_URL set the service is managed externally
+const HOTSPOT_SERVICE_ENABLED = process.env.HOTSPOT_SERVICE !== 'off';
+const HOTSPOT_STARTUP_TIMEOUT_MS = 10000;
+const HOTSPOT_RESTART_BACKOFF_MS = [1000, 5000, 30000, 120000]; // After 1, 2, 3, 4+ failed starts/exits
 
 // Enable CORS
 app.use(cors());
@@ -25,13 +31,22 @@ let uploadSummary = {
   sheetsProcessed: [],
   fileName: null,
   newRecords: 0,
-  duplicateRecords: 0
+  duplicateRecords: 0,
+  rejectedRecords: 0,
+  nearDuplicateRecords: 0,
+  flaggedNearDuplicateRecords: 0
 };
 
 // Track actual new records inserted (not duplicates)
 let actualNewRecords = 0;
 let actualDuplicates = 0;
 
+// Per-stage [METRIC] lines reported by the Python scripts for the current task
+let stageMetrics = [];
+
+// Stage counts from pipeline.py's [SUMMARY]PIPELINE marker for the current task
+let pipelineSummary = null;
+
 // Completed tasks storage (keep last 10 for status queries)
 let completedTasks = [];
 
@@ -185,6 +200,50 @@ function validateCSVFile(filePath) {
   }
 }
 
+// Header-only validation in Python (validate_upload.py): reads just the first
+// row of each sheet, so large workbooks aren't fully parsed before cleaning2.py
+// parses them again. Resolves to null when it can't run or doesn't support the
+// format, so the caller falls back to the XLSX-based validators below. Runs
+// asynchronously so other requests (status polling, map data) aren't blocked.
+const PYTHON_VALIDATION_TIMEOUT_MS = 30000;
+
+function validateWithPython(filePath, requireYearInSheetName = true) {
+  const scriptPath = path.join(process.cwd(), "validate_upload.py");
+  const args = [scriptPath, filePath];
+  if (!requireYearInSheetName) args.push("--no-require-year");
+  
+  return new Promise((resolve) => {
+    const child = spawn("python", args);
+    let stdout = "";
+    const timer = setTimeout(() => child.kill("SIGKILL"), PYTHON_VALIDATION_TIMEOUT_MS);
+    
+    child.stdout.on("data", (data) => {
+      stdout += data.toString();
+    });
+    child.on("error", () => {
+      clearTimeout(timer);
+      resolve(null);
+    });
+    child.on("close", (code) => {
+      clearTimeout(timer);
+      if (code !== 0) {
+        return resolve(null);
+      }
+      
+      try {
+        const validation = JSON.parse(stdout.trim().split(/\r?\n/).pop());
+        if (validation.valid) {
+          console.log(`✅ Validation passed: ${validation.recordsProcessed} records in ${validation.sheetsProcessed.length} sheet(s) (${validation.elapsed_ms} ms)`);
+        }
+        resolve(validation);
+      } catch (err) {
+        console.warn("Could not parse validate_upload.py output:", err.message);
+        resolve(null);
+      }
+    });
+  });
+}
+
 // Function to validate Excel file structure
 function validateExcelFile(filePath, requireYearInSheetName = true) {
   const errors = [];
@@ -307,49 +366,97 @@ function validateExcelFile(filePath, requireYearInSheetName = true) {
   }
 }
 
+// Parse a "[METRIC]stage=clean_data wall_s=1.234 rows=100" line into an object
+function parseMetricLine(line) {
+  const metric = { script: null };
+  line.replace('[METRIC]', '').trim().split(/\s+/).forEach((pair) => {
+    const separator = pair.indexOf('=');
+    if (separator === -1) return;
+    const key = pair.slice(0, separator);
+    const value = pair.slice(separator + 1);
+    metric[key] = value !== '' && !isNaN(Number(value)) ? Number(value) : value;
+  });
+  return metric;
+}
+
+// Handle one stdout line of a Python script: collect [METRIC] / [SUMMARY] markers
+// (hidden from the console) and show important lines
+function handleScriptOutputLine(line, scriptName) {
+  // Collect per-stage timing markers
+  if (line.startsWith('[METRIC]')) {
+    const metric = parseMetricLine(line);
+    metric.script = scriptName;
+    stageMetrics.push(metric);
+    if (metric.wall_s !== undefined) {
+      const rows = metric.rows !== undefined ? `, ${metric.rows} rows` : '';
+      console.log(`⏱️  [${scriptName}] ${metric.stage}: ${metric.wall_s}s${rows}`);
+    }
+    return;
+  }
+  
+  const summary = line.match(/\[SUMMARY\]([A-Z_]+):(.*)/);
+  if (summary) {
+    const [, key, value] = summary;
+    const count = parseInt(value);
+    if (key === 'INSERTED') {
+      actualNewRecords = count;
+      uploadSummary.newRecords = actualNewRecords;
+    } else if (key === 'DUPLICATES') {
+      actualDuplicates = count;
+      uploadSummary.duplicateRecords = actualDuplicates;
+    } else if (key === 'REJECTED') {
+      uploadSummary.rejectedRecords = count;
+      if (count > 0) {
+        console.log(`⚠️  ${count} rows rejected by the database (see /upload/rejects)`);
+      }
+    } else if (key === 'NEAR_DUPLICATES') {
+      uploadSummary.nearDuplicateRecords = count;
+      if (count > 0) {
+        console.log(`⚠️  ${count} near-duplicate rows merged (see /upload/near-duplicates)`);
+      }
+    } else if (key === 'NEAR_DUPLICATES_FLAGGED') {
+      uploadSummary.flaggedNearDuplicateRecords = count;
+      if (count > 0) {
+        console.log(`⚠️  ${count} possible near-duplicate rows kept for review (see /upload/near-duplicates)`);
+      }
+    } else if (key === 'PIPELINE') {
+      // "ran=5 skipped=4 failed=0 preview=1" from pipeline.py (same key=value format as [METRIC])
+      pipelineSummary = parseMetricLine(value);
+      delete pipelineSummary.script;
+      if (pipelineSummary.preview) {
+        console.log('🔎 Clustering preview written; the full run continues in the background and publishes when done');
+      }
+    }
+    return;
+  }
+  
+  // Show important output lines (checkmark or "Upsert complete" prefixed lines)
+  const trimmed = line.trim();
+  if (trimmed.startsWith('✅') || trimmed.includes('Upsert complete:')) {
+    console.log(trimmed);
+  }
+}
+
 // Function to run a Python script (using spawn instead of exec)
-function runSingleScript(scriptPath, onSuccess) {
-  const scriptName = path.basename(scriptPath);
-  const process = spawn("python", [scriptPath]);
+function runSingleScript(scriptPath, onSuccess, args = []) {
+  const scriptName = [path.basename(scriptPath), ...args].join(' ');
+  const process = spawn("python", [scriptPath, ...args]);
   
   // Track this process for potential cancellation
   currentProcesses.push(process);
 
-  // Capture stdout to parse upsert summary
+  // Capture stdout to parse upsert summary. Markers are parsed per complete line:
+  // through pipeline.py, stage output arrives in chunks that can split a line or
+  // mix markers with other output
+  let pendingStdout = '';
   process.stdout.on("data", (data) => {
-    const output = data.toString();
-    
-    // Parse ALL summary markers in this output chunk (don't return early)
-    let shouldSkipDisplay = false;
-    
-    if (output.includes('[SUMMARY]INSERTED:')) {
-      const match = output.match(/\[SUMMARY\]INSERTED:(\d+)/);
-      if (match) {
-        actualNewRecords = parseInt(match[1]);
-        uploadSummary.newRecords = actualNewRecords;
-      }
-      shouldSkipDisplay = true;
-    }
-    
-    if (output.includes('[SUMMARY]DUPLICATES:')) {
-      const match = output.match(/\[SUMMARY\]DUPLICATES:(\d+)/);
-      if (match) {
-        actualDuplicates = parseInt(match[1]);
-        uploadSummary.duplicateRecords = actualDuplicates;
-      }
-      shouldSkipDisplay = true;
-    }
-    
-    // Skip display if this was a summary marker line
-    if (shouldSkipDisplay) {
-      return;
-    }
-    
-    // Show important output lines (checkmark or "Upsert complete" prefixed lines)
-    const trimmed = output.trim();
-    if (trimmed.startsWith('✅') || trimmed.includes('Upsert complete:')) {
-      console.log(trimmed);
-    }
+    const lines = (pendingStdout + data.toString()).split(/\r?\n/);
+    pendingStdout = lines.pop();
+    lines.forEach((line) => handleScriptOutputLine(line, scriptName));
+  });
+  process.stdout.on("end", () => {
+    if (pendingStdout) handleScriptOutputLine(pendingStdout, scriptName);
+    pendingStdout = '';
   });
 
   // Only log errors from stderr
@@ -402,6 +509,8 @@ const processQueue = () => {
   processingStartTime = new Date();
   processingError = null;
   currentTask.status = 'processing';
+  stageMetrics = [];
+  pipelineSummary = null;
 
   console.log(`\n📋 Processing task from queue: ${currentTask.type} (${taskQueue.length} remaining in queue)`);
 
@@ -434,8 +543,14 @@ const completeCurrentTask = (success = true, errorMessage = null) => {
     completedTask.sheetsProcessed = uploadSummary.sheetsProcessed;
     completedTask.newRecords = uploadSummary.newRecords;
     completedTask.duplicateRecords = uploadSummary.duplicateRecords;
+    completedTask.rejectedRecords = uploadSummary.rejectedRecords;
+    completedTask.nearDuplicateRecords = uploadSummary.nearDuplicateRecords;
+    completedTask.flaggedNearDuplicateRecords = uploadSummary.flaggedNearDuplicateRecords;
   }
   
+  completedTask.stageMetrics = stageMetrics;
+  completedTask.pipeline = pipelineSummary;
+  
   // Add to completed tasks (keep last 10)
   completedTasks.unshift(completedTask);
   if (completedTasks.length > 10) {
@@ -457,56 +572,46 @@ const runUploadPipeline = () => {
   
   const script1 = path.join(process.cwd(), "cleaning2.py");
   const script2 = path.join(process.cwd(), "export_geojson.py");
-  const script3 = path.join(process.cwd(), "cluster_hdbscan.py");
   const cleanupScript = path.join(process.cwd(), "cleanup_files.py");
-  const uploadScript = path.join(process.cwd(), "mobile_cluster_fetch.py");
+  const pipelineScript = path.join(process.cwd(), "pipeline.py");
 
   console.log("📊 Starting file upload pipeline...");
 
   // Step 1: Upload to Supabase and track NEW records
   runSingleScript(script1, () => {
     runSingleScript(cleanupScript, () => {
-      runSingleScript(script2, () => {
-        // SMART DECISION: Only run clustering if we have 100+ NEW records
-        const shouldRunClustering = actualNewRecords >= 100;
-        
-        if (shouldRunClustering) {
-          console.log(`🔄 Running clustering (${actualNewRecords} new records warrant re-clustering)...`);
-          runSingleScript(script3, () => {
-            runSingleScript(uploadScript, () => {
-              console.log("✅ Upload pipeline completed!");
-              completeCurrentTask();
-            });
-          });
-        } else {
+      // SMART DECISION: Only run clustering if we have 100+ NEW records
+      const shouldRunClustering = actualNewRecords >= 100;
+      
+      if (shouldRunClustering) {
+        // pipeline.py runs export -> cluster -> writers -> publish, skipping up-to-date stages
+        console.log(`🔄 Running clustering (${actualNewRecords} new records warrant re-clustering)...`);
+        runSingleScript(pipelineScript, () => {
+          console.log("✅ Upload pipeline completed!");
+          completeCurrentTask();
+        }, ["cluster"]);
+      } else {
+        runSingleScript(script2, () => {
           console.log(`⚡ Clustering skipped (only ${actualNewRecords} new records, threshold: 100)`);
           console.log("✅ Upload pipeline completed!");
           completeCurrentTask();
-        }
-      });
+        });
+      }
     });
   });
 };
 
 // Function to run clustering pipeline
 const runClusteringPipeline = () => {
-  const script2 = path.join(process.cwd(), "export_geojson.py");
-  const script3 = path.join(process.cwd(), "cluster_hdbscan.py");
-  const uploadScript = path.join(process.cwd(), "mobile_cluster_fetch.py");
+  const pipelineScript = path.join(process.cwd(), "pipeline.py");
   
   console.log("📊 Starting clustering pipeline...");
   
-  // Step 1: Export fresh data from Supabase
-  runSingleScript(script2, () => {
-    // Step 2: Run clustering
-    runSingleScript(script3, () => {
-      // Step 3: Upload cluster results
-      runSingleScript(uploadScript, () => {
-        console.log("✅ Clustering pipeline completed!");
-        completeCurrentTask();
-      });
-    });
-  });
+  // Export fresh data from Supabase, cluster, write and publish the outputs
+  runSingleScript(pipelineScript, () => {
+    console.log("✅ Clustering pipeline completed!");
+    completeCurrentTask();
+  }, ["cluster"]);
 };
 
 
@@ -547,6 +652,11 @@ app.get("/status", (req, res) => {
         sheetsProcessed: currentTask.type === 'upload' ? uploadSummary.sheetsProcessed : undefined,
         newRecords: currentTask.type === 'upload' ? uploadSummary.newRecords : undefined,
         duplicateRecords: currentTask.type === 'upload' ? uploadSummary.duplicateRecords : undefined,
+        rejectedRecords: currentTask.type === 'upload' ? uploadSummary.rejectedRecords : undefined,
+        nearDuplicateRecords: currentTask.type === 'upload' ? uploadSummary.nearDuplicateRecords : undefined,
+        flaggedNearDuplicateRecords: currentTask.type === 'upload' ? uploadSummary.flaggedNearDuplicateRecords : undefined,
+        stageMetrics: stageMetrics,
+        pipeline: pipelineSummary,
         processingError: processingError
       });
     }
@@ -578,6 +688,11 @@ app.get("/status", (req, res) => {
         sheetsProcessed: completedTask.sheetsProcessed,
         newRecords: completedTask.newRecords,
         duplicateRecords: completedTask.duplicateRecords,
+        rejectedRecords: completedTask.rejectedRecords,
+        nearDuplicateRecords: completedTask.nearDuplicateRecords,
+        flaggedNearDuplicateRecords: completedTask.flaggedNearDuplicateRecords,
+        stageMetrics: completedTask.stageMetrics,
+        pipeline: completedTask.pipeline,
         processingError: completedTask.errorMessage
       });
     }
@@ -605,7 +720,10 @@ app.get("/status", (req, res) => {
     recordsProcessed: uploadSummary.recordsProcessed,
     sheetsProcessed: uploadSummary.sheetsProcessed,
     newRecords: uploadSummary.newRecords,
-    duplicateRecords: uploadSummary.duplicateRecords
+    duplicateRecords: uploadSummary.duplicateRecords,
+    rejectedRecords: uploadSummary.rejectedRecords,
+    nearDuplicateRecords: uploadSummary.nearDuplicateRecords,
+    flaggedNearDuplicateRecords: uploadSummary.flaggedNearDuplicateRecords
   };
   
   res.json(statusResponse);
@@ -686,6 +804,66 @@ app.post("/run-clustering", (req, res) => {
   processQueue();
 });
 
+// Nearby hotspot alerts (proxied to the Python hotspot service)
+app.get("/alerts/nearby", async (req, res) => {
+  const { lat, lon, radius_km, k } = req.query;
+  if (lat === undefined || lon === undefined) {
+    return res.status(400).json({ message: "lat and lon query parameters are required" });
+  }
+  
+  const params = new URLSearchParams({ lat, lon });
+  if (radius_km !== undefined) params.set('radius_km', radius_km);
+  if (k !== undefined) params.set('k', k);
+  
+  try {
+    await ensureHotspotService();
+    const response = await fetch(`${HOTSPOT_SERVICE_URL}/nearby?${params.toString()}`);
+    const payload = await response.json();
+    res.status(response.status).json(payload);
+  } catch (error) {
+    console.error("Hotspot service unavailable:", error.message);
+    res.status(503).json({ message: "Hotspot service unavailable", error: error.message });
+  }
+});
+
+// Rows the last upload could not insert (written by cleaning2.py)
+app.get("/upload/rejects", (req, res) => {
+  const rejectsFile = path.join(dataFolder, "upload_rejects.jsonl");
+  if (!fs.existsSync(rejectsFile)) {
+    return res.json({ total: 0, rejects: [] });
+  }
+  
+  try {
+    const rejects = fs.readFileSync(rejectsFile, "utf8")
+      .split(/\r?\n/)
+      .filter(line => line.trim())
+      .map(line => JSON.parse(line));
+    res.json({ total: rejects.length, rejects: rejects });
+  } catch (error) {
+    console.error("Error reading rejects file:", error);
+    res.status(500).json({ message: "Error reading rejects file", error: error.message });
+  }
+});
+
+// Near-duplicate pairs flagged (or merged, with MERGE_NEAR_DUPLICATES) during the last upload (written by near_duplicates.py)
+app.get("/upload/near-duplicates", (req, res) => {
+  const auditFile = path.join(dataFolder, "near_duplicates_audit.jsonl");
+  if (!fs.existsSync(auditFile)) {
+    return res.json({ total: 0, pairs: [] });
+  }
+  
+  try {
+    const pairs = fs.readFileSync(auditFile, "utf8")
+      .split(/\r?\n/)
+      .filter(line => line.trim())
+      .map(line => JSON.parse(line));
+    res.json({ total: pairs.length, pairs: pairs });
+  } catch (error) {
+    console.error("Error reading near-duplicate audit file:", error);
+    res.status(500).json({ message: "Error reading near-duplicate audit file", error: error.message });
+  }
+});
+
 // Route to check available data files
 app.get("/data-files", (req, res) => {
   try {
@@ -703,7 +881,7 @@ app.get("/data-files", (req, res) => {
 });
 
 // Upload route with validation
-app.post("/upload", upload.single("file"), (req, res) => {
+app.post("/upload", upload.single("file"), async (req, res) => {
   if (!req.file) {
     return res.status(400).json({ 
       message: "No file uploaded",
@@ -726,13 +904,15 @@ app.post("/upload", upload.single("file"), (req, res) => {
   }
   
   // Validate the file structure BEFORE processing (CSV or Excel)
-  let validation;
-  if (fileExtension === '.csv') {
-    validation = validateCSVFile(filePath);
-  } else {
-    // Pass requireYearInSheetName from metadata (defaults to true for backward compatibility)
-    const requireYear = metadata.requireYearInSheetName !== undefined ? metadata.requireYearInSheetName : true;
-    validation = validateExcelFile(filePath, requireYear);
+  // Pass requireYearInSheetName from metadata (defaults to true for backward compatibility)
+  const requireYear = metadata.requireYearInSheetName !== undefined ? metadata.requireYearInSheetName : true;
+  let validation = await validateWithPython(filePath, requireYear);
+  if (!validation) {
+    if (fileExtension === '.csv') {
+      validation = validateCSVFile(filePath);
+    } else {
+      validation = validateExcelFile(filePath, requireYear);
+    }
   }
   
   if (!validation.valid) {
@@ -745,7 +925,10 @@ app.post("/upload", upload.single("file"), (req, res) => {
       sheetsProcessed: [],
       fileName: null,
       newRecords: 0,
-      duplicateRecords: 0
+      duplicateRecords: 0,
+      rejectedRecords: 0,
+      nearDuplicateRecords: 0,
+      flaggedNearDuplicateRecords: 0
     };
     
     try {
@@ -767,7 +950,10 @@ app.post("/upload", upload.single("file"), (req, res) => {
     sheetsProcessed: validation.sheetsProcessed,
     fileName: fileName,
     newRecords: 0,
-    duplicateRecords: 0
+    duplicateRecords: 0,
+    rejectedRecords: 0,
+    nearDuplicateRecords: 0,
+    flaggedNearDuplicateRecords: 0
   };
   
   console.log(`\n${'='.repeat(60)}`);
@@ -807,6 +993,93 @@ app.post("/upload", upload.single("file"), (req, res) => {
   processQueue();
 });
 
+// Nearby-hotspot service (hot-reloads data/cluster_centers.json on its own).
+// Spawned on the first /alerts/nearby request rather than at startup, and
+// restarted on a later request after it exits, with increasing backoff.
+let hotspotService = null;      // Child process while running
+let hotspotStarting = null;     // Promise while waiting for it to answer /health
+let hotspotFailures = 0;        // Consecutive failed starts / unexpected exits
+let hotspotRetryAt = 0;         // No restart before this time (ms)
+
+const hotspotServiceHealthy = async () => {
+  try {
+    const response = await fetch(`${HOTSPOT_SERVICE_URL}/health`, { signal: AbortSignal.timeout(1000) });
+    return response.ok;
+  } catch (error) {
+    return false;
+  }
+};
+
+const hotspotServiceFailed = (reason) => {
+  const backoff = HOTSPOT_RESTART_BACKOFF_MS[Math.min(hotspotFailures, HOTSPOT_RESTART_BACKOFF_MS.length - 1)];
+  hotspotFailures += 1;
+  hotspotRetryAt = Date.now() + backoff;
+  console.error(`❌ Hotspot service ${reason}; next start attempt in ${backoff / 1000}s`);
+};
+
+const startHotspotService = async () => {
+  // Something already answers on the port (an earlier server's service, or a manual run): use it
+  if (await hotspotServiceHealthy()) {
+    hotspotFailures = 0;
+    return;
+  }
+
+  const scriptPath = path.join(process.cwd(), "hotspot_service.py");
+  const service = spawn("python", [scriptPath, "--serve", "--port", String(HOTSPOT_SERVICE_PORT)]);
+  hotspotService = service;
+  service.stderr.on("data", (data) => {
+    const output = data.toString();
+    if (output.includes('ERROR') || output.includes('Traceback') || output.includes('Address already in use')) {
+      console.error(`[hotspot_service.py] ${output}`);
+    }
+  });
+  service.on("error", (error) => {
+    if (hotspotService === service) hotspotService = null;
+    hotspotServiceFailed(`failed to start: ${error.message}`);
+  });
+  service.on("exit", (code, signal) => {
+    if (hotspotService === service) hotspotService = null;
+    hotspotServiceFailed(`exited (code ${code}, signal ${signal})`);
+  });
+
+  const deadline = Date.now() + HOTSPOT_STARTUP_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    if (hotspotService !== service) {
+      throw new Error("hotspot service exited during startup (is the port in use?)");
+    }
+    if (await hotspotServiceHealthy()) {
+      hotspotFailures = 0;
+      console.log(`🗺️  Hotspot service running on ${HOTSPOT_SERVICE_URL} (pid ${service.pid})`);
+      return;
+    }
+    await new Promise((resolve) => setTimeout(resolve, 200));
+  }
+  service.kill();
+  throw new Error(`hotspot service did not answer within ${HOTSPOT_STARTUP_TIMEOUT_MS / 1000}s`);
+};
+
+// Resolves once the service can take requests; rejects when disabled, backing off or failing to start
+const ensureHotspotService = async () => {
+  if (!HOTSPOT_SERVICE_ENABLED) {
+    throw new Error("hotspot service is disabled (HOTSPOT_SERVICE=off)");
+  }
+  if (hotspotStarting) {
+    return hotspotStarting;
+  }
+  if (process.env.HOTSPOT_SERVICE_URL || hotspotService) {
+    return; // Externally managed, or already running
+  }
+  if (Date.now() < hotspotRetryAt) {
+    throw new Error(`hotspot service restarting in ${Math.ceil((hotspotRetryAt - Date.now()) / 1000)}s`);
+  }
+  hotspotStarting = startHotspotService().finally(() => { hotspotStarting = null; });
+  return hotspotStarting;
+};
+
+process.on("exit", () => {
+  if (hotspotService) hotspotService.kill();
+});
+
 // Start server
 app.listen(PORT, () => {
   console.log(`\n🚀 OSIMAP Backend Server`);
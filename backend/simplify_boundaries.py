@@ -0,0 +1,515 @@
+import os
+import io
+import sys
+import gzip
+import json
+import struct
+import argparse
+import logging
+import numpy as np
+from barangay_index import BarangayIndex, BOUNDARY_FILE, NAME_PROPERTY, MUNICIPALITY_PROPERTY, PCODE_PROPERTY
+from metrics import instrumented, maybe_start_profiler
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ==============================
+# Simplified / quantized barangay boundaries
+# ==============================
+# Preprocessing tool for philippines_Barangay_level_4.geojson:
+#
+#   1. Quantize coordinates onto an integer grid (TopoJSON "transform").
+#   2. Cut the rings into arcs at junctions and store every shared border once,
+#      so neighbouring barangays reference the same arc.
+#   3. Simplify each arc once per zoom level (Douglas-Peucker, arc endpoints
+#      fixed). Shared borders are simplified identically for both sides, so no
+#      gaps or overlaps open up between neighbours.
+#   4. Keep only the properties the app uses and write, per zoom level,
+#      data/boundaries/barangays_z<zoom>.topojson and a compact .bin version.
+#
+#   python simplify_boundaries.py              # build + report + point-in-polygon check (exit 1 if it fails)
+#   python simplify_boundaries.py --sample 50000 --zooms 10 12 14
+#
+# Binary layout (.bin, little-endian):
+#   header   "BRGYTOPO" | uint32 version, n_arcs, n_points, n_features, n_polygons, n_rings, n_refs
+#            | float64 scale_x, scale_y, translate_x, translate_y | uint32 properties_length
+#   arrays   uint32 arc_offsets[n_arcs + 1]       arc i = points[arc_offsets[i]:arc_offsets[i + 1]]
+#            int32  points[n_points, 2]           delta-encoded per arc (first point absolute)
+#            uint32 feature_offsets[n_features + 1] -> polygons
+#            uint32 polygon_offsets[n_polygons + 1] -> rings
+#            uint32 ring_offsets[n_rings + 1]       -> refs
+#            int32  refs[n_refs]                    arc index, ~index when reversed
+#   trailer  UTF-8 JSON list of feature properties
+
+OUTPUT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "boundaries")
+KEEP_PROPERTIES = [NAME_PROPERTY, MUNICIPALITY_PROPERTY, PCODE_PROPERTY]
+QUANTIZATION = 1_000_000        # Grid steps across the bounding box (~0.1 m for a province)
+SIMPLIFY_ZOOMS = [10, 12, 14, 16]
+PIXEL_TOLERANCE = 0.5           # Max deviation in screen pixels at the target zoom
+QUANTIZATION_SLACK = 1.0        # Grid units a point may be off the original border and still change barangay
+BINARY_MAGIC = b"BRGYTOPO"
+BINARY_VERSION = 1
+
+
+# ==============================
+# Load + quantize
+# ==============================
+def load_features(path: str = BOUNDARY_FILE):
+    """[(properties, [[ring (n, 2) float array, ...] per polygon])] for every (Multi)Polygon feature"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    features = []
+    for feat in data["features"]:
+        geometry = feat.get("geometry") or {}
+        if geometry.get("type") == "Polygon":
+            polygons = [geometry["coordinates"]]
+        elif geometry.get("type") == "MultiPolygon":
+            polygons = geometry["coordinates"]
+        else:
+            continue
+        properties = feat.get("properties") or {}
+        features.append((
+            {key: properties.get(key) for key in KEEP_PROPERTIES},
+            [[np.asarray(ring, dtype=np.float64)[:, :2] for ring in polygon] for polygon in polygons],
+        ))
+    return features
+
+
+def quantize(features, quantization: int = QUANTIZATION):
+    """Snap rings to an integer grid; returns (transform, features with closed int64 rings)"""
+    points = np.vstack([ring for _, polygons in features for polygon in polygons for ring in polygon])
+    minimum, maximum = points.min(axis=0), points.max(axis=0)
+    scale = np.where(maximum > minimum, (maximum - minimum) / (quantization - 1), 1.0)
+    transform = {"scale": scale.tolist(), "translate": minimum.tolist()}
+
+    quantized = []
+    for properties, polygons in features:
+        out_polygons = []
+        for polygon in polygons:
+            out_rings = []
+            for ring in polygon:
+                q = np.round((ring - minimum) / scale).astype(np.int64)
+                keep = np.r_[True, np.any(q[1:] != q[:-1], axis=1)]  # Drop repeated points
+                q = q[keep]
+                if not np.array_equal(q[0], q[-1]):
+                    q = np.vstack([q, q[:1]])
+                if len(q) >= 4:
+                    out_rings.append(q)
+            if out_rings:
+                out_polygons.append(out_rings)
+        quantized.append((properties, out_polygons))
+    return transform, quantized
+
+
+# ==============================
+# Topology (shared arcs)
+# ==============================
+def _point_keys(points: np.ndarray) -> np.ndarray:
+    return (points[:, 0] << 32) | points[:, 1]
+
+
+def find_junctions(rings) -> set:
+    """Points where rings meet or part ways (different neighbours on different rings)"""
+    keys, pairs_a, pairs_b = [], [], []
+    for ring in rings:
+        ring_keys = _point_keys(ring[:-1])
+        prev_keys, next_keys = np.roll(ring_keys, 1), np.roll(ring_keys, -1)
+        keys.append(ring_keys)
+        pairs_a.append(np.minimum(prev_keys, next_keys))
+        pairs_b.append(np.maximum(prev_keys, next_keys))
+    keys, pairs_a, pairs_b = np.concatenate(keys), np.concatenate(pairs_a), np.concatenate(pairs_b)
+
+    # A point seen with more than one distinct (unordered) neighbour pair is a junction
+    order = np.lexsort((pairs_b, pairs_a, keys))
+    keys, pairs_a, pairs_b = keys[order], pairs_a[order], pairs_b[order]
+    new_pair = np.r_[True, (keys[1:] != keys[:-1]) | (pairs_a[1:] != pairs_a[:-1]) | (pairs_b[1:] != pairs_b[:-1])]
+    unique_keys, pair_counts = np.unique(keys[new_pair], return_counts=True)
+    return set(unique_keys[pair_counts > 1].tolist())
+
+
+def _canonical_closed(points: np.ndarray) -> np.ndarray:
+    """Rotate a closed junction-free ring to start at its smallest point"""
+    body = points[:-1]
+    start = int(np.argmin(_point_keys(body)))
+    body = np.roll(body, -start, axis=0)
+    return np.vstack([body, body[:1]])
+
+
+def build_topology(features):
+    """Cut rings at junctions and dedupe arcs; returns (arcs, features with rings as arc refs)"""
+    junctions = find_junctions([ring for _, polygons in features for polygon in polygons for ring in polygon])
+    arcs, arc_lookup = [], {}
+
+    def add_arc(points, closed):
+        forward = _canonical_closed(points) if closed else points
+        backward = _canonical_closed(points[::-1]) if closed else points[::-1]
+        if forward.tobytes() in arc_lookup:
+            return arc_lookup[forward.tobytes()]
+        if backward.tobytes() in arc_lookup:
+            return ~arc_lookup[backward.tobytes()]
+        arc_lookup[forward.tobytes()] = len(arcs)
+        arcs.append(forward)
+        return len(arcs) - 1
+
+    topo_features = []
+    for properties, polygons in features:
+        topo_polygons = []
+        for polygon in polygons:
+            topo_rings = []
+            for ring in polygon:
+                body = ring[:-1]
+                is_junction = np.fromiter((key in junctions for key in _point_keys(body).tolist()), bool, len(body))
+                cuts = np.flatnonzero(is_junction)
+                if len(cuts) == 0:
+                    topo_rings.append([add_arc(ring, closed=True)])
+                    continue
+                body = np.roll(body, -cuts[0], axis=0)
+                cuts = np.r_[cuts - cuts[0], len(body)]
+                closed_body = np.vstack([body, body[:1]])
+                topo_rings.append([add_arc(closed_body[start:end + 1], closed=False)
+                                   for start, end in zip(cuts[:-1], cuts[1:])])
+            topo_polygons.append(topo_rings)
+        topo_features.append((properties, topo_polygons))
+    return arcs, topo_features
+
+
+# ==============================
+# Simplification
+# ==============================
+def arc_significance(points: np.ndarray) -> np.ndarray:
+    """Douglas-Peucker tolerance below which each vertex is kept (endpoints: inf)
+
+    Values never exceed the parent's, so thresholding at any tolerance gives
+    exactly the Douglas-Peucker result for that tolerance.
+    """
+    points = points.astype(np.float64)
+    significance = np.full(len(points), np.inf)
+    if len(points) <= 2:
+        return significance
+    significance[1:-1] = 0.0
+
+    stack = [(0, len(points) - 1, np.inf)]
+    while stack:
+        start, end, parent = stack.pop()
+        if end - start < 2:
+            continue
+        a, b, inner = points[start], points[end], points[start + 1:end]
+        ab = b - a
+        length = np.hypot(ab[0], ab[1])
+        if length == 0:  # Closed arc: distance to the shared endpoint
+            distance = np.hypot(inner[:, 0] - a[0], inner[:, 1] - a[1])
+        else:
+            distance = np.abs(ab[0] * (inner[:, 1] - a[1]) - ab[1] * (inner[:, 0] - a[0])) / length
+        k = int(np.argmax(distance))
+        value = min(float(distance[k]), parent)
+        significance[start + 1 + k] = value
+        stack.append((start, start + 1 + k, value))
+        stack.append((start + 1 + k, end, value))
+    return significance
+
+
+def minimum_interior_points(arcs, topo_features) -> np.ndarray:
+    """Interior vertices every arc must keep so that no ring collapses below a triangle"""
+    required = np.zeros(len(arcs), dtype=np.int64)
+    for _, polygons in topo_features:
+        for polygon in polygons:
+            for ring in polygon:
+                need = {1: 2, 2: 1}.get(len(ring), 0)
+                for ref in ring:
+                    index = ref if ref >= 0 else ~ref
+                    required[index] = max(required[index], need)
+    return required
+
+
+def simplify_arcs(arcs, significance, required, tolerance: float):
+    """Keep the vertices whose significance reaches the tolerance (in quantized units)"""
+    simplified = []
+    for points, sig, need in zip(arcs, significance, required):
+        keep = sig >= tolerance
+        if need:
+            interior = sig[1:-1]
+            top = np.argsort(-interior, kind="stable")[:need] + 1
+            keep[top] = True
+        simplified.append(points[keep])
+    return simplified
+
+
+def zoom_tolerance(zoom: int, transform: dict) -> float:
+    """PIXEL_TOLERANCE screen pixels at this zoom, in quantized grid units"""
+    degrees_per_pixel = 360.0 / (256 * 2 ** zoom)
+    return PIXEL_TOLERANCE * degrees_per_pixel / max(min(transform["scale"]), 1e-15)
+
+
+# ==============================
+# Writers / readers
+# ==============================
+def to_topojson(arcs, topo_features, transform: dict) -> dict:
+    encoded_arcs = []
+    for points in arcs:
+        deltas = np.vstack([points[:1], np.diff(points, axis=0)])
+        encoded_arcs.append(deltas.tolist())
+    geometries = [
+        {"type": "MultiPolygon", "arcs": polygons, "properties": properties}
+        for properties, polygons in topo_features
+    ]
+    return {
+        "type": "Topology",
+        "transform": transform,
+        "objects": {"barangays": {"type": "GeometryCollection", "geometries": geometries}},
+        "arcs": encoded_arcs,
+    }
+
+
+def to_binary(arcs, topo_features, transform: dict) -> bytes:
+    arc_offsets = np.concatenate([[0], np.cumsum([len(points) for points in arcs])]).astype(np.uint32)
+    points = np.vstack([np.vstack([points[:1], np.diff(points, axis=0)]) for points in arcs]).astype(np.int32)
+
+    feature_offsets, polygon_offsets, ring_offsets, refs = [0], [0], [0], []
+    for _, polygons in topo_features:
+        for polygon in polygons:
+            for ring in polygon:
+                refs.extend(ring)
+                ring_offsets.append(len(refs))
+            polygon_offsets.append(len(ring_offsets) - 1)
+        feature_offsets.append(len(polygon_offsets) - 1)
+    properties = json.dumps([properties for properties, _ in topo_features], separators=(",", ":")).encode("utf-8")
+
+    buffer = io.BytesIO()
+    buffer.write(BINARY_MAGIC)
+    buffer.write(struct.pack("<7I", BINARY_VERSION, len(arcs), len(points), len(topo_features),
+                             len(polygon_offsets) - 1, len(ring_offsets) - 1, len(refs)))
+    buffer.write(struct.pack("<4d", *transform["scale"], *transform["translate"]))
+    buffer.write(struct.pack("<I", len(properties)))
+    for array in (arc_offsets, points, np.asarray(feature_offsets, dtype=np.uint32),
+                  np.asarray(polygon_offsets, dtype=np.uint32), np.asarray(ring_offsets, dtype=np.uint32),
+                  np.asarray(refs, dtype=np.int32)):
+        buffer.write(array.astype(array.dtype.newbyteorder("<"), copy=False).tobytes())
+    buffer.write(properties)
+    return buffer.getvalue()
+
+
+def read_binary(payload: bytes) -> dict:
+    """Decode a .bin file back into the TopoJSON dict"""
+    if payload[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+        raise ValueError("Not a barangay topology file")
+    offset = len(BINARY_MAGIC)
+    version, n_arcs, n_points, n_features, n_polygons, n_rings, n_refs = struct.unpack_from("<7I", payload, offset)
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported barangay topology version {version}")
+    offset += 28
+    scale_x, scale_y, translate_x, translate_y = struct.unpack_from("<4d", payload, offset)
+    offset += 32
+    (properties_length,) = struct.unpack_from("<I", payload, offset)
+    offset += 4
+
+    def take(dtype, count, columns=1):
+        nonlocal offset
+        array = np.frombuffer(payload, dtype=np.dtype(dtype).newbyteorder("<"), count=count * columns, offset=offset)
+        offset += array.nbytes
+        return array.reshape(-1, columns) if columns > 1 else array
+
+    arc_offsets = take(np.uint32, n_arcs + 1)
+    points = take(np.int32, n_points, 2)
+    feature_offsets = take(np.uint32, n_features + 1)
+    polygon_offsets = take(np.uint32, n_polygons + 1)
+    ring_offsets = take(np.uint32, n_rings + 1)
+    refs = take(np.int32, n_refs)
+    properties = json.loads(payload[offset:offset + properties_length].decode("utf-8"))
+
+    geometries = []
+    for f in range(n_features):
+        polygons = []
+        for p in range(feature_offsets[f], feature_offsets[f + 1]):
+            polygons.append([refs[ring_offsets[r]:ring_offsets[r + 1]].tolist()
+                             for r in range(polygon_offsets[p], polygon_offsets[p + 1])])
+        geometries.append({"type": "MultiPolygon", "arcs": polygons, "properties": properties[f]})
+    return {
+        "type": "Topology",
+        "transform": {"scale": [scale_x, scale_y], "translate": [translate_x, translate_y]},
+        "objects": {"barangays": {"type": "GeometryCollection", "geometries": geometries}},
+        "arcs": [points[arc_offsets[i]:arc_offsets[i + 1]].tolist() for i in range(n_arcs)],
+    }
+
+
+def topojson_to_geojson(topology: dict) -> dict:
+    """Decode arcs (delta + transform) back into a GeoJSON FeatureCollection"""
+    scale = np.asarray(topology["transform"]["scale"])
+    translate = np.asarray(topology["transform"]["translate"])
+    decoded = [np.cumsum(np.asarray(arc, dtype=np.int64).reshape(-1, 2), axis=0) * scale + translate
+               for arc in topology["arcs"]]
+
+    def ring_coordinates(refs):
+        parts = []
+        for ref in refs:
+            points = decoded[ref] if ref >= 0 else decoded[~ref][::-1]
+            parts.append(points if not parts else points[1:])  # Consecutive arcs share an endpoint
+        return np.vstack(parts).tolist()
+
+    features = []
+    for geometry in topology["objects"]["barangays"]["geometries"]:
+        coordinates = [[ring_coordinates(ring) for ring in polygon] for polygon in geometry["arcs"]]
+        features.append({"type": "Feature", "properties": geometry["properties"],
+                         "geometry": {"type": "MultiPolygon", "coordinates": coordinates}})
+    return {"type": "FeatureCollection", "features": features}
+
+
+# ==============================
+# Point-in-polygon check
+# ==============================
+def sample_points(original: BarangayIndex, accidents_path: str, sample: int, seed: int = 0):
+    """Accident coordinates (if available) plus random points in every barangay's bounding box"""
+    rng = np.random.default_rng(seed)
+    lat, lon = [], []
+    if os.path.exists(accidents_path):
+        with open(accidents_path, "r", encoding="utf-8") as f:
+            coords = np.asarray([feat["geometry"]["coordinates"][:2] for feat in json.load(f)["features"]
+                                 if feat.get("geometry")], dtype=np.float64)
+        if len(coords):
+            coords = coords[rng.choice(len(coords), min(sample, len(coords)), replace=False)]
+            lon.append(coords[:, 0])
+            lat.append(coords[:, 1])
+    boxes = original.bboxes[rng.integers(0, len(original.bboxes), sample)]
+    lon.append(rng.uniform(boxes[:, 0], boxes[:, 2]))
+    lat.append(rng.uniform(boxes[:, 1], boxes[:, 3]))
+    return np.concatenate(lat), np.concatenate(lon)
+
+
+def border_distance(arcs, x, y, chunk: int = 256) -> np.ndarray:
+    """Distance (grid units) from each quantized point to the nearest segment of the arcs"""
+    a = np.concatenate([points[:-1] for points in arcs]).astype(np.float64)
+    b = np.concatenate([points[1:] for points in arcs]).astype(np.float64)
+    dx, dy = b[:, 0] - a[:, 0], b[:, 1] - a[:, 1]
+    length2 = dx * dx + dy * dy
+    distance = np.empty(len(x))
+    for start in range(0, len(x), chunk):
+        px, py = x[start:start + chunk, None], y[start:start + chunk, None]
+        t = np.clip(((px - a[:, 0]) * dx + (py - a[:, 1]) * dy) / np.where(length2 > 0, length2, 1.0), 0.0, 1.0)
+        distance[start:start + chunk] = np.hypot(a[:, 0] + t * dx - px, a[:, 1] + t * dy - py).min(axis=1)
+    return distance
+
+
+def check_point_in_polygon(original: BarangayIndex, topology: dict, lat, lon, arcs, transform: dict,
+                           tolerance: float) -> dict:
+    """Compare which barangay (by pcode) contains each point, original vs simplified
+
+    Simplification moves a border by at most `tolerance` and quantization by
+    under a grid unit, so a point may only change barangay within
+    tolerance + QUANTIZATION_SLACK grid units of an original (quantized,
+    unsimplified) arc; "ok" is False if any changed point is further away.
+    """
+    simplified = BarangayIndex.from_geojson(topojson_to_geojson(topology), source="simplified topology")
+    before, after = original.locate(lat, lon), simplified.locate(lat, lon)
+    before_codes = np.where(before >= 0, original.pcodes[np.maximum(before, 0)], "")
+    after_codes = np.where(after >= 0, simplified.pcodes[np.maximum(after, 0)], "")
+    changed = np.flatnonzero(before_codes != after_codes)
+
+    (scale_x, scale_y), (translate_x, translate_y) = transform["scale"], transform["translate"]
+    distance = border_distance(arcs, (lon[changed] - translate_x) / scale_x, (lat[changed] - translate_y) / scale_y)
+    worst = float(distance.max()) if len(distance) else 0.0
+    allowed = tolerance + QUANTIZATION_SLACK
+    return {"points": int(len(lat)), "inside": int((before >= 0).sum()), "changed": int(len(changed)),
+            "max_border_distance": round(worst, 3), "allowed_distance": round(allowed, 3), "ok": worst <= allowed}
+
+
+# ==============================
+# Main build
+# ==============================
+@instrumented(rows=lambda report, *_, **__: len(report["levels"]))
+def build_boundaries(input_path: str = BOUNDARY_FILE, output_folder: str = OUTPUT_FOLDER,
+                     zooms=SIMPLIFY_ZOOMS, quantization: int = QUANTIZATION, sample: int = 20000):
+    """Write one TopoJSON + binary file per zoom level and return a size/vertex/PIP report"""
+    features = load_features(input_path)
+    original_vertices = sum(len(ring) for _, polygons in features for polygon in polygons for ring in polygon)
+    transform, quantized = quantize(features, quantization)
+    arcs, topo_features = build_topology(quantized)
+    significance = [arc_significance(points) for points in arcs]
+    required = minimum_interior_points(arcs, topo_features)
+
+    original = BarangayIndex.build(input_path)
+    accidents_path = os.path.join(os.path.dirname(input_path), "accidents.geojson")
+    lat, lon = sample_points(original, accidents_path, sample)
+
+    os.makedirs(output_folder, exist_ok=True)
+    with open(input_path, "rb") as f:
+        original_bytes = f.read()
+    report = {
+        "features": len(topo_features),
+        "arcs": len(arcs),
+        "original_vertices": original_vertices,
+        "original_bytes": len(original_bytes),
+        "original_gzip_bytes": len(gzip.compress(original_bytes)),
+        "levels": [],
+    }
+
+    # Quantized-only check (tolerance 0 keeps every vertex): nothing but grid rounding may move a border
+    quantized_only = read_binary(to_binary(simplify_arcs(arcs, significance, required, 0.0), topo_features, transform))
+    report["quantized_pip"] = check_point_in_polygon(original, quantized_only, lat, lon, arcs, transform, 0.0)
+
+    for zoom in zooms:
+        tolerance = zoom_tolerance(zoom, transform)
+        level_arcs = simplify_arcs(arcs, significance, required, tolerance)
+        topology = to_topojson(level_arcs, topo_features, transform)
+        topojson_bytes = json.dumps(topology, separators=(",", ":")).encode("utf-8")
+        binary_bytes = to_binary(level_arcs, topo_features, transform)
+
+        base = os.path.join(output_folder, f"barangays_z{zoom}")
+        for suffix, payload in ((".topojson", topojson_bytes), (".bin", binary_bytes)):
+            with open(base + suffix + ".tmp", "wb") as f:
+                f.write(payload)
+            os.replace(base + suffix + ".tmp", base + suffix)
+
+        # Check against the binary file so the reader is exercised too
+        pip = check_point_in_polygon(original, read_binary(binary_bytes), lat, lon, arcs, transform, tolerance)
+        report["levels"].append({
+            "zoom": zoom,
+            "vertices": int(sum(len(points) for points in level_arcs)),
+            "topojson_bytes": len(topojson_bytes),
+            "topojson_gzip_bytes": len(gzip.compress(topojson_bytes)),
+            "binary_bytes": len(binary_bytes),
+            "binary_gzip_bytes": len(gzip.compress(binary_bytes)),
+            "pip": pip,
+        })
+    report["ok"] = report["quantized_pip"]["ok"] and all(level["pip"]["ok"] for level in report["levels"])
+    return report
+
+
+def print_report(report: dict):
+    print(f" {report['features']} barangays, {report['arcs']} arcs")
+    print(f" Original: {report['original_vertices']:,} vertices, "
+          f"{report['original_bytes']:,} bytes ({report['original_gzip_bytes']:,} gzipped)")
+    print(f" {'zoom':>4} {'vertices':>10} {'topojson':>12} {'gzip':>10} {'binary':>10} {'gzip':>10}  point-in-polygon")
+    for level in report["levels"]:
+        pip = level["pip"]
+        print(f" {level['zoom']:>4} {level['vertices']:>10,} {level['topojson_bytes']:>12,} "
+              f"{level['topojson_gzip_bytes']:>10,} {level['binary_bytes']:>10,} {level['binary_gzip_bytes']:>10,}  "
+              f"{pip['changed']} of {pip['points']:,} points changed ({pip['inside']:,} inside a barangay)"
+              f"{'' if pip['ok'] else ' - FAILED'}")
+    pip = report["quantized_pip"]
+    print(f" Quantized only: {pip['changed']} of {pip['points']:,} points changed"
+          f"{'' if pip['ok'] else ' - FAILED'}")
+    for name, pip in [("quantized", report["quantized_pip"])] + [(f"z{level['zoom']}", level["pip"])
+                                                               for level in report["levels"]]:
+        if not pip["ok"]:
+            print(f" {name}: a changed point is {pip['max_border_distance']} grid units from the original "
+                  f"border (allowed {pip['allowed_distance']})")
+
+
+if __name__ == "__main__":
+    maybe_start_profiler()
+
+    parser = argparse.ArgumentParser(description="Build simplified, quantized barangay boundary files")
+    parser.add_argument("--input", default=BOUNDARY_FILE, help="Barangay boundary GeoJSON")
+    parser.add_argument("--output", default=OUTPUT_FOLDER, help="Output folder")
+    parser.add_argument("--zooms", type=int, nargs="+", default=SIMPLIFY_ZOOMS, help="Zoom levels to simplify for")
+    parser.add_argument("--quantization", type=int, default=QUANTIZATION, help="Grid steps across the extent")
+    parser.add_argument("--sample", type=int, default=20000, help="Points used by the point-in-polygon check")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        logger.error(f"Boundary file not found: {args.input}")
+        sys.exit(1)
+
+    report = build_boundaries(args.input, args.output, args.zooms, args.quantization, args.sample)
+    print_report(report)
+    sys.exit(0 if report["ok"] else 1)
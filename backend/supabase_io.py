@@ -0,0 +1,315 @@
+import os
+import random
+import asyncio
+import logging
+import threading
+from urllib.parse import quote
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# Async Supabase I/O
+# ==============================
+# PostgREST reads/writes and Storage uploads over one shared httpx.AsyncClient:
+# keep-alive connections are reused across requests, and at most
+# MAX_CONCURRENCY requests are in flight at a time. Paged reads, batch writes
+# and uploads are issued concurrently, so a run costs about
+# (requests / MAX_CONCURRENCY) round trips instead of one per request.
+#
+#   db = get_io()
+#   rows = db.fetch_all_sync("road_traffic_accident")               # sync callers
+#   rows = await db.fetch_all("road_traffic_accident")              # async callers
+#
+# The *_sync wrappers run the coroutine on one background event loop (started
+# on first use), so the connection pool survives between calls and the
+# wrappers are safe to call from any thread (pipeline.py runs stages in threads).
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+MAX_CONCURRENCY = 8          # Requests in flight per SupabaseIO
+MAX_KEEPALIVE = 8            # Idle connections kept open
+KEEPALIVE_EXPIRY = 30.0      # Seconds an idle connection is kept
+REQUEST_TIMEOUT = 60.0
+PAGE_SIZE = 1000             # PostgREST's default max-rows
+MAX_RETRIES = 3
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+RETRY_BACKOFF = 0.5          # Seconds, doubled per attempt (plus jitter)
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+# A non-idempotent request (a plain insert) is only retried when it never reached
+# the server: after a read timeout or a 5xx the rows may already be written, and
+# sending them again would duplicate them
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+UNSENT_STATUSES = {429}
+
+
+class SupabaseError(Exception):
+    """Non-2xx response; str() is the response body (PostgREST error JSON, e.g. code 23505)"""
+
+    def __init__(self, status_code: int, body: str):
+        super().__init__(body)
+        self.status_code = status_code
+
+
+def _content_range_total(response):
+    """Total from a Content-Range header ("0-999/12345" or "*/42"); None if unknown"""
+    total = response.headers.get("content-range", "").rpartition("/")[2]
+    return int(total) if total.isdigit() else None
+
+
+class SupabaseIO:
+    def __init__(self, url: str = None, key: str = None, max_concurrency: int = MAX_CONCURRENCY, transport=None):
+        """transport: optional httpx transport (e.g. httpx.MockTransport for offline runs)"""
+        self.url = (url or SUPABASE_URL or "").rstrip("/")
+        self.key = key or SUPABASE_KEY
+        if not self.url or not self.key:
+            raise ValueError("supabase_url and supabase_key are required")
+        self.max_concurrency = max_concurrency
+        self.transport = transport
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+
+    # --------------------------
+    # Connection pool
+    # --------------------------
+    def _session(self):
+        """(client, semaphore) bound to the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # httpx clients can't be shared across event loops; a new loop (e.g. a
+            # caller's own asyncio.run) gets its own pool
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._client = httpx.AsyncClient(
+                base_url=self.url,
+                headers={"apikey": self.key, "Authorization": f"Bearer {self.key}"},
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=MAX_KEEPALIVE,
+                                    keepalive_expiry=KEEPALIVE_EXPIRY),
+                timeout=REQUEST_TIMEOUT,
+                transport=self.transport,
+            )
+        return self._client, self._semaphore
+
+    async def request(self, method: str, path: str, idempotent: bool = None, **kwargs) -> httpx.Response:
+        """One request through the pool; retries transient failures, raises SupabaseError otherwise
+
+        idempotent: safe to send twice (default: by HTTP method); when False only
+        failures that prove the request was not processed are retried.
+        """
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        retry_errors = httpx.TransportError if idempotent else UNSENT_ERRORS
+        retry_statuses = RETRY_STATUSES if idempotent else UNSENT_STATUSES
+        client, semaphore = self._session()
+        for attempt in range(MAX_RETRIES + 1):
+            async with semaphore:
+                try:
+                    response = await client.request(method, path, **kwargs)
+                except httpx.TransportError as e:
+                    if attempt == MAX_RETRIES or not isinstance(e, retry_errors):
+                        raise SupabaseError(0, f"{type(e).__name__}: {e}") from e
+                    response = None
+            if response is not None:
+                if response.status_code < 400:
+                    return response
+                if response.status_code not in retry_statuses or attempt == MAX_RETRIES:
+                    raise SupabaseError(response.status_code, response.text)
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt * (1 + random.random()))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = self._loop = None
+
+    # --------------------------
+    # PostgREST
+    # --------------------------
+    async def fetch_page(self, table: str, start: int, end: int, select: str = "*", order: str = None,
+                         count: bool = False):
+        """(rows, total) for rows start..end (inclusive); total only when count=True"""
+        params = {"select": select}
+        if order:
+            params["order"] = order
+        headers = {"Range-Unit": "items", "Range": f"{start}-{end}"}
+        if count:
+            headers["Prefer"] = "count=exact"
+        response = await self.request("GET", f"/rest/v1/{table}", params=params, headers=headers)
+        return response.json(), _content_range_total(response) if count else None
+
+    async def fetch_all(self, table: str, select: str = "*", order: str = "id", page_size: int = PAGE_SIZE):
+        """Every row of a table: the first page reports the total, the rest are fetched concurrently
+
+        Pages are ordered by `order` so concurrent ranges neither overlap nor skip rows.
+        """
+        rows, total = await self.fetch_page(table, 0, page_size - 1, select, order, count=True)
+        if total is None:
+            # No count available: page sequentially until a short page
+            page = rows
+            while len(page) == page_size:
+                page, _ = await self.fetch_page(table, len(rows), len(rows) + page_size - 1, select, order)
+                rows.extend(page)
+            return rows
+
+        pages = await asyncio.gather(*(self.fetch_page(table, start, start + page_size - 1, select, order)
+                                       for start in range(page_size, total, page_size)))
+        for page, _ in pages:
+            rows.extend(page)
+        return rows
+
+    async def has_column(self, table: str, column: str) -> bool:
+        """True if `table` has `column` (zero-row select; PostgREST answers 400 / 42703 otherwise)"""
+        try:
+            await self.request("GET", f"/rest/v1/{table}", params={"select": column, "limit": "0"})
+        except SupabaseError as e:
+            if e.status_code == 400:
+                return False
+            raise
+        return True
+
+    async def write_batch(self, table: str, rows: list, upsert: bool = False, on_conflict: str = None,
+                          merge: bool = False, returning: bool = False):
+        """Insert (or upsert) one batch; returns (written rows, written count)
+
+        upsert ignores rows that conflict on `on_conflict` (the returned rows are
+        only the ones actually inserted); with merge=True they are updated instead.
+        The written rows are only sent back with returning=True ([] otherwise).
+        An upsert on `on_conflict` can be resent safely, so only it is retried
+        after errors that may have reached the database.
+        """
+        prefer = ["return=representation" if returning else "return=minimal", "count=exact"]
+        if upsert:
+            prefer.append("resolution=merge-duplicates" if merge else "resolution=ignore-duplicates")
+        params = {"on_conflict": on_conflict} if on_conflict else None
+        response = await self.request("POST", f"/rest/v1/{table}", idempotent=bool(upsert and on_conflict),
+                                      params=params, json=rows, headers={"Prefer": ",".join(prefer)})
+        written = response.json() if response.content else []
+        total = _content_range_total(response)
+        return written, total if total is not None else len(written)
+
+    async def write_batches(self, table: str, batches: list, upsert: bool = False, on_conflict: str = None,
+                            merge: bool = False, returning: bool = False):
+        """write_batch for every batch concurrently; results in batch order, failures as the exception"""
+        return await asyncio.gather(*(self.write_batch(table, batch, upsert, on_conflict, merge, returning)
+                                      for batch in batches), return_exceptions=True)
+
+    # --------------------------
+    # Storage
+    # --------------------------
+    async def upload(self, bucket: str, path: str, data: bytes, file_options: dict = None):
+        """Upload (upsert) one object; file_options as in storage3 (content-type, cache-control, upsert, ...)"""
+        options = {"cache-control": "3600", "content-type": "text/plain;charset=UTF-8", "upsert": "false",
+                   **(file_options or {})}
+        headers = {"cache-control": f"max-age={options.pop('cache-control')}", "x-upsert": str(options.pop("upsert"))}
+        headers.update({key: str(value) for key, value in options.items()})
+        # Overwriting (x-upsert) the same bytes is safe to repeat; a create-only upload is not
+        await self.request("POST", f"/storage/v1/object/{bucket}/{quote(path)}", content=data, headers=headers,
+                           idempotent=headers["x-upsert"].lower() == "true")
+        return {"path": path, "Key": f"{bucket}/{path}"}
+
+    async def upload_file(self, bucket: str, path: str, local_path: str, file_options: dict = None):
+        data = await asyncio.to_thread(_read_bytes, local_path)
+        return await self.upload(bucket, path, data, file_options)
+
+    async def download(self, bucket: str, path: str) -> bytes:
+        response = await self.request("GET", f"/storage/v1/object/{bucket}/{quote(path)}")
+        return response.content
+
+    async def remove(self, bucket: str, paths: list):
+        response = await self.request("DELETE", f"/storage/v1/object/{bucket}", json={"prefixes": list(paths)})
+        return response.json() if response.content else []
+
+    # --------------------------
+    # Sync wrappers
+    # --------------------------
+    def fetch_all_sync(self, *args, **kwargs):
+        return run_sync(self.fetch_all(*args, **kwargs))
+
+    def has_column_sync(self, *args, **kwargs):
+        return run_sync(self.has_column(*args, **kwargs))
+
+    def write_batch_sync(self, *args, **kwargs):
+        return run_sync(self.write_batch(*args, **kwargs))
+
+    def write_batches_sync(self, *args, **kwargs):
+        return run_sync(self.write_batches(*args, **kwargs))
+
+    def upload_sync(self, *args, **kwargs):
+        return run_sync(self.upload(*args, **kwargs))
+
+    def download_sync(self, *args, **kwargs):
+        return run_sync(self.download(*args, **kwargs))
+
+    def remove_sync(self, *args, **kwargs):
+        return run_sync(self.remove(*args, **kwargs))
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class StorageBucket:
+    """storage3-style bucket (upload / download / remove) backed by a SupabaseIO pool
+
+    Drop-in for supabase.storage.from_(name) in the publisher; upload_file_async
+    lets many uploads share the pool concurrently.
+    """
+
+    def __init__(self, name: str, io: "SupabaseIO" = None):
+        self.name = name
+        self.io = io or get_io()
+
+    def upload(self, path: str, file, file_options: dict = None):
+        data = file.read() if hasattr(file, "read") else file if isinstance(file, (bytes, bytearray)) else _read_bytes(file)
+        return self.io.upload_sync(self.name, path, data, file_options)
+
+    async def upload_file_async(self, path: str, local_path: str, file_options: dict = None):
+        return await self.io.upload_file(self.name, path, local_path, file_options)
+
+    def download(self, path: str) -> bytes:
+        return self.io.download_sync(self.name, path)
+
+    def remove(self, paths: list):
+        return self.io.remove_sync(self.name, paths)
+
+
+# ==============================
+# Background loop / shared instance
+# ==============================
+_loop = None
+_loop_lock = threading.Lock()
+_default_io = None
+
+
+def _background_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="supabase-io", daemon=True).start()
+        return _loop
+
+
+def run_sync(coroutine):
+    """Run a coroutine on the shared I/O loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coroutine, _background_loop()).result()
+
+
+def get_io() -> SupabaseIO:
+    """Process-wide SupabaseIO for the project in .env"""
+    global _default_io
+    with _loop_lock:
+        if _default_io is None:
+            _default_io = SupabaseIO()
+        return _default_io
+
+
+def set_default_io(io: SupabaseIO):
+    """Replace the process-wide SupabaseIO (e.g. with one on local_supabase's stand-in)"""
+    global _default_io
+    with _loop_lock:
+        _default_io = io
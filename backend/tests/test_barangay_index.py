@@ -0,0 +1,82 @@
+import math
+import numpy as np
+from barangay_index import BarangayIndex
+
+
+def square(x0, y0, size):
+    return [[x0, y0], [x0 + size, y0], [x0 + size, y0 + size], [x0, y0 + size], [x0, y0]]
+
+
+def circle(cx, cy, radius, vertices=400):
+    ring = [[cx + radius * math.cos(a), cy + radius * math.sin(a)] for a in np.linspace(0, 2 * math.pi, vertices, endpoint=False)]
+    return ring + [ring[0]]
+
+
+def feature(name, geometry_type, coordinates):
+    return {"type": "Feature", "properties": {"shape4": name, "shape3": "CITY", "adm4_pcode": name[:3]},
+            "geometry": {"type": geometry_type, "coordinates": coordinates}}
+
+
+# A square with a hole, a smaller square inside the big one (overlap: the
+# smallest polygon wins), a two-part multipolygon and a detailed circle
+# (enough edges to be split into latitude bands)
+BOUNDARIES = {"type": "FeatureCollection", "features": [
+    feature("Holed", "Polygon", [square(0, 0, 1), square(0.4, 0.4, 0.2)]),
+    feature("Inner", "Polygon", [square(0.7, 0.7, 0.2)]),
+    feature("Islands", "MultiPolygon", [[square(2, 0, 0.5)], [square(3, 0, 0.5)]]),
+    feature("Round", "Polygon", [circle(2, 2, 0.5)]),
+]}
+
+
+def reference(points):
+    """Brute force: smallest containing polygon by the even-odd rule, -1 if none"""
+    def inside(rings, x, y):
+        crossings = 0
+        for ring in rings:
+            for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+                if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                    crossings += 1
+        return crossings % 2 == 1
+
+    sizes = [1, 0.04, 0.5, math.pi * 0.25]
+    result = []
+    for x, y in points:
+        hits = []
+        for fid, feat in enumerate(BOUNDARIES["features"]):
+            geometry = feat["geometry"]
+            polygons = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+            if any(inside(rings, x, y) for rings in polygons):
+                hits.append(fid)
+        result.append(min(hits, key=lambda fid: sizes[fid]) if hits else -1)
+    return np.array(result)
+
+
+def test_locate_matches_brute_force_point_in_polygon():
+    index = BarangayIndex.from_geojson(BOUNDARIES)
+    rng = np.random.default_rng(0)
+    points = rng.uniform([-0.5, -0.5], [3.7, 2.7], size=(3000, 2))
+    assert (index.locate(points[:, 1], points[:, 0]) == reference(points)).all()
+
+    # Spot checks: in the hole, in the overlap, in each island, outside everything
+    lon, lat = np.array([0.5, 0.8, 2.2, 3.2, 1.5]), np.array([0.5, 0.8, 0.2, 0.2, 1.5])
+    assert index.assign_names(lat, lon).tolist()[1:4] == ["INNER", "ISLANDS", "ISLANDS"]
+    assert index.assign_names(lat, lon).isna().tolist() == [True, False, False, False, True]
+
+
+def test_cached_index_gives_the_same_answers(tmp_path):
+    index = BarangayIndex.from_geojson(BOUNDARIES)
+    cache = str(tmp_path / "index.npz")
+    index.save(cache)
+    cached = BarangayIndex.load(cache)
+
+    rng = np.random.default_rng(1)
+    lat, lon = rng.uniform(-0.5, 2.7, 500), rng.uniform(-0.5, 3.7, 500)
+    assert (cached.locate(lat, lon) == index.locate(lat, lon)).all()
+    assert cached.names.tolist() == index.names.tolist()
+
+
+def test_validate_reports_match_mismatch_and_outside():
+    index = BarangayIndex.from_geojson(BOUNDARIES)
+    report = index.validate([" inner", "Holed", "Round"], lat=[0.8, 2.0, -1.0], lon=[0.8, 2.0, -1.0])
+    assert report["status"].tolist() == ["match", "mismatch", "outside"]
+    assert report["polygon_barangay"].tolist()[1] == "ROUND"
@@ -0,0 +1,58 @@
+import math
+
+from cleaning2 import ExcelToSupabase, TABLE_NAME
+from supabase_io import SupabaseError
+
+
+class FakeDB:
+    """Rejects any batch containing a row in `bad`; batches made only of `existing` rows hit the unique key"""
+
+    def __init__(self, bad=(), existing=()):
+        self.bad, self.existing = set(bad), set(existing)
+        self.requests = []
+
+    def has_column_sync(self, table, column):
+        return False
+
+    def write_batch_sync(self, table, rows, upsert=False, on_conflict=None, returning=False):
+        self.requests.append([row["id"] for row in rows])
+        ids = {row["id"] for row in rows}
+        if ids & self.bad:
+            raise SupabaseError(400, '{"code": "22P02", "message": "invalid input syntax"}')
+        if ids <= self.existing:
+            raise SupabaseError(409, '{"code": "23505", "message": "duplicate key value"}')
+        return (rows if returning else []), len(rows)
+
+
+ROWS = [{"id": i} for i in range(1000)]
+
+
+def test_one_bad_row_is_isolated_in_about_two_log2_requests():
+    db = FakeDB(bad={637})
+    upload = ExcelToSupabase(None, None, db=db)
+    inserted, duplicates, requests = upload.bisect_failed_batch(TABLE_NAME, ROWS, batch_num=1)
+
+    assert (inserted, duplicates) == (999, 0)
+    assert [reject["record"]["id"] for reject in upload.rejects] == [637]
+    assert requests == len(db.requests) <= 2 * math.ceil(math.log2(len(ROWS)))
+    assert sorted(row["id"] for row in upload.inserted_rows) == [i for i in range(1000) if i != 637]
+
+
+def test_every_bad_row_is_rejected_and_every_good_row_written_once():
+    bad = {0, 1, 500, 999}
+    upload = ExcelToSupabase(None, None, db=FakeDB(bad=bad))
+    inserted, _, _ = upload.bisect_failed_batch(TABLE_NAME, ROWS, batch_num=3)
+
+    assert inserted == len(ROWS) - len(bad)
+    assert sorted(reject["record"]["id"] for reject in upload.rejects) == sorted(bad)
+    assert {reject["batch"] for reject in upload.rejects} == {3}
+    written = [row["id"] for row in upload.inserted_rows]
+    assert len(written) == len(set(written)) == len(ROWS) - len(bad)
+
+
+def test_parts_that_already_exist_count_as_duplicates_not_rejects():
+    upload = ExcelToSupabase(None, None, db=FakeDB(bad={10}, existing=range(500)))
+    inserted, duplicates, _ = upload.bisect_failed_batch(TABLE_NAME, ROWS, batch_num=1, upsert=True)
+
+    assert upload.rejects[0]["record"]["id"] == 10
+    assert inserted == 500 and duplicates == 499
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from cluster_footprints import cluster_footprints, buffered_hull, polygon_area, METERS_PER_DEGREE
+
+
+def inside_convex_ring(ring, points, tolerance=1e-9):
+    """True for points inside (or on) a closed counter-clockwise convex ring"""
+    ring = np.asarray(ring)
+    edges = ring[1:] - ring[:-1]
+    offsets = points[:, None, :] - ring[None, :-1, :]
+    cross = edges[None, :, 0] * offsets[:, :, 1] - edges[None, :, 1] * offsets[:, :, 0]
+    return (cross >= -tolerance).all(axis=1)
+
+
+def test_every_member_lies_inside_its_clusters_footprint():
+    rng = np.random.default_rng(0)
+    lat = np.r_[15.00 + rng.normal(0, 0.001, 300), 15.02 + rng.normal(0, 0.001, 300), rng.uniform(14.9, 15.1, 50)]
+    lon = np.r_[120.60 + rng.normal(0, 0.001, 300), 120.62 + rng.normal(0, 0.001, 300), rng.uniform(120.5, 120.7, 50)]
+    labels = np.r_[np.full(300, 4), np.full(300, 1), np.full(50, -1)]
+    order = rng.permutation(len(labels))  # Members need not be contiguous
+    footprints = cluster_footprints(labels[order], lat[order], lon[order])
+
+    assert sorted(footprints) == [1, 4]  # Noise gets no footprint
+    for cluster, footprint in footprints.items():
+        ring = footprint["ring"]
+        assert ring[0] == ring[-1]
+        members = np.column_stack([lon, lat])[labels == cluster]
+        assert inside_convex_ring(ring, members, tolerance=1e-6).all()
+        assert footprint["area_m2"] > 0
+
+
+def test_collinear_and_single_point_clusters_still_get_an_area():
+    # Three points on a 100 m east-west road, and one lone point
+    lat = np.array([15.0, 15.0, 15.0, 15.01])
+    lon = 120.6 + np.array([0.0, 50.0, 100.0, 0.0]) / (METERS_PER_DEGREE * np.cos(np.radians(15.0025)))
+    footprints = cluster_footprints([0, 0, 0, 1], lat, lon, buffer_meters=10.0)
+
+    # A 100 m x 20 m strip with rounded ends (octagons stand in for the circles)
+    assert footprints[0]["area_m2"] == pytest.approx(100 * 20 + np.pi * 10 ** 2, rel=0.05)
+    assert footprints[1]["area_m2"] == pytest.approx(np.pi * 10 ** 2, rel=0.15)
+
+
+def test_unbuffered_hull_area_is_exact():
+    square = np.array([[0.0, 0.0], [30.0, 0.0], [30.0, 30.0], [0.0, 30.0], [15.0, 15.0]])
+    ring = buffered_hull(square, buffer_meters=0)
+    assert len(ring) == 5 and polygon_area(ring) == pytest.approx(900.0)
+    assert cluster_footprints([-1, -1], [15.0, 15.1], [120.6, 120.7]) == {}
@@ -0,0 +1,43 @@
+import json
+import numpy as np
+import pandas as pd
+from cluster_hdbscan import AccidentClusterAnalyzer
+
+PROPERTIES = [
+    {"id": 1, "datecommitted": "2016-01-01", "timecommitted": "20:30:00", "barangay": "DOLORES", "severity": "Critical", "year": 2016},
+    {"id": 2, "datecommitted": "2016-01-01", "timecommitted": "16:30:00", "barangay": "JULIANA", "severity": "High", "year": 2016},
+    {"id": 3, "datecommitted": "not a date", "timecommitted": None, "barangay": "DOLORES", "severity": "Low", "year": None},
+    {"id": 4, "datecommitted": "2017-03-02", "timecommitted": "07:00:00", "barangay": None, "severity": "Low", "year": 2017},
+]
+COORDINATES = [[120.679, 15.040], [120.686, 15.034], [120.680, 15.037], [200.0, 15.0]]  # Last one is invalid
+
+
+def load(tmp_path):
+    features = [{"type": "Feature", "geometry": {"type": "Point", "coordinates": c}, "properties": p}
+                for c, p in zip(COORDINATES, PROPERTIES)]
+    (tmp_path / "accidents.geojson").write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+    analyzer = AccidentClusterAnalyzer(data_folder=str(tmp_path))
+    assert analyzer.load_geojson_data() and analyzer.preprocess_data()
+    return analyzer
+
+
+def test_repeated_strings_and_numbers_use_compact_dtypes(tmp_path):
+    df = load(tmp_path).df
+    for column in ("barangay", "severity", "datecommitted", "timecommitted"):
+        assert isinstance(df[column].dtype, pd.CategoricalDtype), column
+    assert df["year"].dtype == "Int16" and df["id"].dtype == np.int8
+    assert len(df) == 3  # Out-of-range longitude dropped
+
+
+def test_exported_properties_keep_the_original_values(tmp_path):
+    analyzer = load(tmp_path)
+    analyzer.df["cluster"] = np.zeros(len(analyzer.df), dtype=np.int32)
+    analyzer.clustered_df = analyzer.df
+
+    properties = [feature["properties"] for feature in analyzer.point_features()]
+    assert [p["datecommitted"] for p in properties] == ["2016-01-01", "2016-01-01", "not a date"]
+    assert [p["timecommitted"] for p in properties] == ["20:30:00", "16:30:00", None]
+    assert [p["year"] for p in properties] == [2016, 2016, None]
+    assert [p["barangay"] for p in properties] == ["DOLORES", "JULIANA", "DOLORES"]
+    assert analyzer.df["date_imputed"].tolist() == [False, False, True]
+    assert analyzer.df["date"].iloc[0] == pd.Timestamp("2016-01-01 20:30:00")
@@ -0,0 +1,109 @@
+import copy
+import json
+import os
+
+import numpy as np
+
+import delta_patches
+from delta_patches import write_versioned_output, point_key, STATE_FILE_NAME
+
+
+def run_output(rng, count=300, relabel=0):
+    """Point and center features of one clustering run; `relabel` shifts the run-local cluster ids"""
+    lat, lon = rng.uniform(15.0, 15.1, count), rng.uniform(120.6, 120.7, count)
+    clusters = (lat > 15.05).astype(int) + 2 * (lon > 120.65)  # Four quadrants
+    points = [{"type": "Feature", "geometry": {"type": "Point", "coordinates": [float(b), float(a)]},
+               "properties": {"type": "accident_point", "id": i, "cluster": int(c) + relabel, "severity": "Injury",
+                              "temporal_weight": float(rng.random())}}
+              for i, (a, b, c) in enumerate(zip(lat, lon, clusters))]
+    centers = [{"type": "Feature", "geometry": {"type": "Point", "coordinates": [120.6, 15.0]},
+                "properties": {"type": "cluster_center", "cluster_id": c + relabel, "accident_count": int((clusters == c).sum())}}
+               for c in range(4)]
+    return points, centers
+
+
+def feature_key(feature):
+    properties = feature["properties"]
+    if properties.get("type") == "cluster_center":
+        return "c" + str(properties["cluster_id"])
+    return "p" + point_key(feature)
+
+
+def read(folder, name):
+    with open(os.path.join(folder, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def client_state(folder, have=None):
+    """Features a client ends up with: its copy at version `have` (or the snapshot) plus the listed patches"""
+    index = read(folder, "index.json")
+    version, features = have if have else (index["snapshot"]["version"], None)
+    if features is None:
+        features = {feature_key(f): f for f in read(folder, index["snapshot"]["file"])["features"]}
+    features = copy.deepcopy(features)
+    for item in index["patches"]:
+        if item["from"] < version:
+            continue
+        assert item["from"] == version
+        patch = read(folder, item["file"])
+        for kind, prefix in (("points", "p"), ("centers", "c")):
+            for feature in patch[kind]["added"] + patch[kind]["changed"]:
+                features[feature_key(feature)] = feature
+            for key in patch[kind]["removed"]:
+                del features[prefix + key]
+        version = item["to"]
+    assert version == index["version"]
+    return features
+
+
+def current_state(folder):
+    state = read(folder, STATE_FILE_NAME)
+    return {feature_key(f): f for f in list(state["points"].values()) + list(state["centers"].values())}
+
+
+def test_snapshot_plus_patches_equals_the_full_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(delta_patches, "MAX_PATCH_CHAIN", 3)  # Exercise compaction too
+    folder = str(tmp_path / "patches")
+    rng = np.random.default_rng(0)
+    points, centers = run_output(rng)
+    write_versioned_output(points, centers, folder=folder)
+    first = current_state(folder)
+
+    snapshots = set()
+    for run in range(8):
+        points = [p for p in points if p["properties"]["id"] % 37 != run]  # Some rows removed
+        for feature in points[run::25]:
+            feature["properties"]["severity"] = "Fatal"  # Some changed
+        index = write_versioned_output(points, centers, folder=folder)
+        snapshots.add(index["snapshot"]["version"])
+        assert client_state(folder) == current_state(folder)
+
+    assert len(snapshots) > 1 and len(index["patches"]) == 3
+    assert index["patches"][0]["from"] > 1  # Version 1 fell off the chain
+    assert not os.path.exists(os.path.join(folder, "snapshot-1.json"))
+    assert first != current_state(folder)
+
+
+def test_client_at_an_older_version_catches_up(tmp_path):
+    folder = str(tmp_path / "patches")
+    rng = np.random.default_rng(1)
+    points, centers = run_output(rng)
+    write_versioned_output(points, centers, folder=folder)
+    at_version_1 = current_state(folder)
+
+    for run in range(3):
+        points[run]["properties"]["severity"] = "Fatal"
+        write_versioned_output(points, centers, folder=folder)
+    assert client_state(folder, have=(1, at_version_1)) == current_state(folder)
+
+
+def test_renumbered_clusters_keep_their_keys_and_unchanged_output_stays_put(tmp_path):
+    folder = str(tmp_path / "patches")
+    points, centers = run_output(np.random.default_rng(2))
+    first = write_versioned_output(points, centers, folder=folder)
+
+    # Same clusters numbered differently, new temporal weights: nothing to publish
+    points, centers = run_output(np.random.default_rng(2), relabel=10)
+    for feature in points:
+        feature["properties"]["temporal_weight"] = 0.5
+    assert write_versioned_output(points, centers, folder=folder)["version"] == first["version"] == 1
@@ -0,0 +1,52 @@
+import itertools
+import numpy as np
+import pandas as pd
+from filter_index import build_filter_index, write_filter_index, read_filter_index, query_filter_index
+
+
+def sample_frame(rows=500, seed=7):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "year": rng.choice([2021, 2022, 2023, 2024], rows),
+        "severity": rng.choice(["Critical", "Serious", "Minor", " Minor ", ""], rows),
+        "offensetype": rng.choice(["Reckless", "Hit and run", None], rows),
+        "barangay": rng.choice([f"Brgy {i}" for i in range(40)], rows),
+    })
+
+
+def brute_force(frame, **filters):
+    keep = np.ones(len(frame), dtype=bool)
+    for attribute, selected in filters.items():
+        if selected is None or selected == "all":
+            continue
+        selected = list(selected) if isinstance(selected, (list, tuple, set)) else [selected]
+        if not selected:
+            continue
+        keys = frame[attribute].map(lambda value: None if value is None else str(value).strip())
+        keep &= keys.isin([str(value).strip() for value in selected]).to_numpy()
+    return np.flatnonzero(keep)
+
+
+def test_queries_match_a_full_scan(tmp_path):
+    frame = sample_frame()
+    output = str(tmp_path / "filter_index.json")
+    write_filter_index(frame, output=output)
+    index = read_filter_index(output)
+    assert index["rows"] == len(frame)
+
+    choices = {
+        "year": [None, 2023, [2021, 2024], []],
+        "severity": ["all", "Critical", ["Minor", "Serious"], "Unknown"],
+        "offensetype": [None, "Hit and run", ["Reckless", "Hit and run"]],
+        "barangay": [None, "Brgy 3", ["Brgy 1", "Brgy 39"]],
+    }
+    for combination in itertools.product(*choices.values()):
+        filters = dict(zip(choices, combination))
+        np.testing.assert_array_equal(query_filter_index(index, **filters), brute_force(frame, **filters))
+
+
+def test_sparse_and_dense_values_use_the_smaller_encoding():
+    frame = pd.DataFrame({"severity": ["Critical"] + ["Minor"] * 999})
+    entries = build_filter_index(frame, attributes=["severity"])["attributes"]["severity"]
+    assert entries["Critical"]["encoding"] == "ids" and entries["Critical"]["count"] == 1
+    assert entries["Minor"]["encoding"] == "bitmap" and entries["Minor"]["count"] == 999
@@ -0,0 +1,50 @@
+import httpx
+import pytest
+from cleaning2 import ExcelToSupabase, TABLE_NAME
+from local_supabase import LocalSupabase, local_io
+from supabase_io import SupabaseIO
+
+ROW = {"barangay": "Poblacion", "lat": 15.1, "lng": 120.6, "datecommitted": "2024-01-05",
+       "timecommitted": "08:30:00", "offensetype": "Reckless"}
+
+
+@pytest.fixture(autouse=True)
+def no_cube_updates(monkeypatch):
+    monkeypatch.setattr(ExcelToSupabase, "update_rollup_cube", lambda self: None)
+
+
+def uploader(db):
+    return ExcelToSupabase(None, None, db=db)
+
+
+def test_migrated_table_upserts_on_the_fingerprint(tmp_path):
+    transport = LocalSupabase(root=str(tmp_path / "supabase"))
+    upload = uploader(local_io(transport))
+    assert upload.fingerprint_support(TABLE_NAME) == (True, True)
+    assert upload.upsert_data(TABLE_NAME, [dict(ROW)])
+    assert upload.inserted_rows[0]["fingerprint"] is not None
+
+
+def test_column_without_unique_index_keeps_the_old_upsert(tmp_path):
+    transport = LocalSupabase(root=str(tmp_path / "supabase"), unique_columns={TABLE_NAME: ()})
+    upload = uploader(local_io(transport))
+    assert upload.fingerprint_support(TABLE_NAME) == (True, False)
+    assert upload.conflict_target(TABLE_NAME, True) is None
+    assert upload.upsert_data(TABLE_NAME, [dict(ROW)])
+
+
+def test_unmigrated_table_sends_no_fingerprints():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.method == "GET":
+            return httpx.Response(400, json={"code": "42703", "message": "column fingerprint does not exist"})
+        return httpx.Response(201, json=[], headers={"content-range": "*/1"})
+
+    upload = uploader(SupabaseIO(url="http://supabase.test", key="key", transport=httpx.MockTransport(handler)))
+    assert upload.upsert_data(TABLE_NAME, [dict(ROW)])
+    assert upload.fingerprint_support(TABLE_NAME) == (False, False)
+    inserts = [request for request in requests if request.method == "POST"]
+    assert len(inserts) == 1 and b"fingerprint" not in inserts[0].content
+    assert "on_conflict" not in inserts[0].url.params
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from geohash_shards import geohash_encode, geohash_bounds, write_shards, shard_files
+
+
+def feature(lat, lon, kind="accident_point", **properties):
+    return {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "properties": {"type": kind, **properties}}
+
+
+def sample_features(count=500, seed=0):
+    rng = np.random.default_rng(seed)
+    lat, lon = rng.uniform(14.95, 15.10, count), rng.uniform(120.55, 120.75, count)
+    points = [feature(float(a), float(b), id=i) for i, (a, b) in enumerate(zip(lat, lon))]
+    centers = [feature(15.0, 120.6, "cluster_center", cluster_id=0), feature(15.05, 120.7, "cluster_center", cluster_id=1)]
+    return points, centers
+
+
+def test_geohash_matches_the_reference_encoding_and_its_own_bounds():
+    assert geohash_encode([42.6], [-5.6], precision=5).tolist() == ["ezs42"]
+    assert geohash_encode([57.64911], [10.40744], precision=11).tolist() == ["u4pruydqqvj"]
+
+    rng = np.random.default_rng(1)
+    lat, lon = rng.uniform(-89, 89, 1000), rng.uniform(-179, 179, 1000)
+    for a, b, geohash in zip(lat, lon, geohash_encode(lat, lon)):
+        west, south, east, north = geohash_bounds(geohash)
+        assert west <= b < east and south <= a < north
+
+
+def test_shards_read_back_to_the_input_features(tmp_path):
+    points, centers = sample_features()
+    folder = str(tmp_path / "shards")
+    index = write_shards(points, centers, folder=folder)
+
+    features = []
+    for geohash, entry in index["shards"].items():
+        with open(os.path.join(folder, f"{geohash}.json"), "rb") as f:
+            data = f.read()
+        assert hashlib.sha256(data).hexdigest() == entry["sha256"] and len(data) == entry["size"]
+        shard = json.loads(data)
+        west, south, east, north = entry["bounds"]
+        for item in shard["features"]:
+            lon, lat = item["geometry"]["coordinates"]
+            assert west - 1e-6 <= lon <= east + 1e-6 and south - 1e-6 <= lat <= north + 1e-6
+        features.extend(shard["features"])
+
+    key = lambda item: json.dumps(item, sort_keys=True)
+    assert sorted(map(key, features)) == sorted(map(key, points + centers))
+    assert sum(entry["points"] for entry in index["shards"].values()) == len(points)
+    assert sum(entry["clusters"] for entry in index["shards"].values()) == len(centers)
+    assert shard_files(folder) == ["shards/index.json"] + [f"shards/{geohash}.json" for geohash in sorted(index["shards"])]
+
+
+def test_only_the_shard_that_changed_gets_a_new_hash(tmp_path):
+    points, centers = sample_features()
+    folder = str(tmp_path / "shards")
+    before = write_shards(points, centers, folder=folder)["shards"]
+    points[7]["properties"]["severity"] = "Fatal"
+    after = write_shards(points, centers, folder=folder)["shards"]
+
+    changed = {geohash for geohash in before if before[geohash]["sha256"] != after[geohash]["sha256"]}
+    lon, lat = points[7]["geometry"]["coordinates"]
+    assert before.keys() == after.keys()
+    assert changed == {str(geohash_encode([lat], [lon])[0])}
@@ -0,0 +1,22 @@
+import numpy as np
+import heatmap_rasters
+
+
+def test_levels_too_large_for_the_grid_cap_are_coarsened(tmp_path, monkeypatch):
+    monkeypatch.setattr(heatmap_rasters, "MAX_GRID_CELLS", 200 * 200)
+    rng = np.random.default_rng(0)
+    lat, lon = rng.uniform(15.0, 15.2, 500), rng.uniform(120.5, 120.7, 500)
+    lat[0], lon[0] = 16.0, 121.5  # One far-off point stretches every grid
+
+    index = heatmap_rasters.write_heatmaps(lat, lon, np.ones(500), folder=str(tmp_path / "heatmaps"))
+
+    assert set(index["levels"]) == set(heatmap_rasters.LEVELS)
+    for name, entry in index["levels"].items():
+        assert entry["width"] * entry["height"] <= heatmap_rasters.MAX_GRID_CELLS
+        assert entry["cell_meters"] > entry["requested_cell_meters"] == heatmap_rasters.LEVELS[name][0]
+        assert (tmp_path / "heatmaps" / entry["file"]).exists()
+
+
+def test_levels_that_cannot_be_built_are_skipped(tmp_path):
+    index = heatmap_rasters.write_heatmaps(np.array([]), np.array([]), np.array([]), folder=str(tmp_path / "heatmaps"))
+    assert index["levels"] == {}
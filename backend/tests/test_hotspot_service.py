@@ -0,0 +1,113 @@
+import os
+import re
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+import hotspot_service
+
+DANGER_LEVELS_JS = os.path.join(os.path.dirname(hotspot_service.SCRIPT_DIR), "src", "utils", "dangerLevels.js")
+
+
+def test_danger_levels_match_the_frontend_bands():
+    with open(DANGER_LEVELS_JS, encoding="utf-8") as f:
+        bands = re.findall(r"threshold:\s*([\d.]+),\s*level:\s*'(\w+)'", f.read())
+    assert [(float(t), level) for t, level in bands] == hotspot_service.DANGER_LEVELS
+
+    assert hotspot_service.danger_level_for(0.71) == "CRITICAL"
+    assert hotspot_service.danger_level_for(0.7) == "HIGH"  # Bands are exclusive, as in Print.js
+    assert hotspot_service.danger_level_for(0.3) == "LOW"
+
+
+@pytest.fixture
+def service(tmp_path):
+    """Base URL of a hotspot service on a free port, serving two hotspots ~1.1 km apart"""
+    centers = tmp_path / "cluster_centers.json"
+    centers.write_text(json.dumps([
+        {"cluster_id": 1, "center_lat": 15.0400, "center_lon": 120.6800, "danger_score": 0.8},
+        {"cluster_id": 2, "center_lat": 15.0500, "center_lon": 120.6800, "danger_score": 0.2},
+    ]))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), hotspot_service.make_handler(hotspot_service.HotspotIndex(str(centers))))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_k_is_validated_and_clamped(service):
+    assert get(f"{service}/nearby?lat=15.04&lon=120.68&k=abc")[0] == 400
+    assert get(f"{service}/nearby?lat=15.04&lon=120.68&radius_km=far")[0] == 400
+    assert get(f"{service}/nearby?lon=120.68")[0] == 400
+
+    for k in ("0", "-3"):
+        status, body = get(f"{service}/nearby?lat=15.04&lon=120.68&k={k}")
+        assert status == 200 and [a["cluster_id"] for a in body["alerts"]] == [1]
+
+
+def snapshot_around(lat, lon, count=200, seed=0):
+    rng = np.random.default_rng(seed)
+    lats, lons = lat + rng.uniform(-0.05, 0.05, count), lon + rng.uniform(-0.05, 0.05, count)
+    alerts = [hotspot_service.build_alert({"cluster_id": i, "center_lat": a, "center_lon": b, "danger_score": 0.5})
+              for i, (a, b) in enumerate(zip(lats, lons))]
+    return hotspot_service.HotspotSnapshot(alerts, version="test")
+
+
+def brute_force_km(snapshot, lat, lon):
+    return snapshot._haversine_km(lat, lon, np.arange(len(snapshot.alerts)))
+
+
+def test_radius_search_matches_a_haversine_scan_in_distance_order():
+    snapshot = snapshot_around(15.04, 120.68)
+    distances = brute_force_km(snapshot, 15.041, 120.679)
+    for radius_km in (0.5, 2.0, 5.0):
+        results = snapshot.within_radius(15.041, 120.679, radius_km)
+        assert [a["cluster_id"] for a in results] == [int(i) for i in np.argsort(distances, kind="stable") if distances[i] <= radius_km]
+        assert [a["distance_km"] for a in results] == sorted(a["distance_km"] for a in results)
+    assert len(snapshot.within_radius(15.041, 120.679, 5.0, limit=3)) == 3
+
+
+def test_nearest_returns_the_k_closest_within_the_radius():
+    snapshot = snapshot_around(15.04, 120.68)
+    distances = brute_force_km(snapshot, 15.03, 120.69)
+    closest = [int(i) for i in np.argsort(distances)[:5]]
+    assert [a["cluster_id"] for a in snapshot.nearest(15.03, 120.69, k=5)] == closest
+
+    radius_km = float(np.sort(distances)[2])  # Only the 3 closest are within reach
+    assert [a["cluster_id"] for a in snapshot.nearest(15.03, 120.69, k=5, max_radius_km=radius_km)] == closest[:3]
+    assert len(snapshot.nearest(15.03, 120.69, k=10_000)) == len(snapshot.alerts)
+    assert hotspot_service.HotspotSnapshot([], version="empty").nearest(15.0, 120.0) == []
+
+
+def test_inside_alert_radius_uses_each_hotspots_own_radius():
+    alerts = [hotspot_service.build_alert({"cluster_id": 1, "center_lat": 15.0, "center_lon": 120.0, "radius_km": 0.2}),
+              hotspot_service.build_alert({"cluster_id": 2, "center_lat": 15.0, "center_lon": 120.003, "radius_km": 0.5})]
+    results = hotspot_service.HotspotSnapshot(alerts, version="test").within_radius(15.0, 120.0025, 1.0)
+    # ~0.27 km from hotspot 1 (radius 0.2) and ~0.05 km from hotspot 2 (radius 0.5)
+    assert [(a["cluster_id"], a["inside_alert_radius"]) for a in results] == [(2, True), (1, False)]
+
+
+def test_index_hot_reloads_and_keeps_the_last_good_snapshot(tmp_path):
+    centers = tmp_path / "cluster_centers.json"
+    centers.write_text(json.dumps([{"cluster_id": 1, "center_lat": 15.0, "center_lon": 120.0}]))
+    index = hotspot_service.HotspotIndex(str(centers), check_interval=0)
+    assert [a["cluster_id"] for a in index.nearest(15.0, 120.0)] == [1]
+
+    centers.write_text(json.dumps([{"cluster_id": 7, "center_lat": 15.0, "center_lon": 120.0},
+                                   {"cluster_id": 8, "center_lat": 15.1, "center_lon": 120.0}]))
+    assert [a["cluster_id"] for a in index.nearest(15.0, 120.0)] == [7, 8]
+
+    centers.write_text("[{\"cluster_id\": 9, ")  # Half-written by an exporter
+    assert [a["cluster_id"] for a in index.nearest(15.0, 120.0)] == [7, 8]
@@ -0,0 +1,93 @@
+import pytest
+
+import supabase_io
+from local_supabase import LocalSupabase, local_io, local_bucket
+from supabase_io import SupabaseError
+
+TABLE = "road_traffic_accident"
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(supabase_io, "RETRY_BACKOFF", 0)
+
+
+@pytest.fixture
+def transport(tmp_path):
+    return LocalSupabase(root=str(tmp_path / "supabase"))
+
+
+def rows(start, stop):
+    return [{"fingerprint": f"fp{i}", "barangay": "Poblacion", "count": i} for i in range(start, stop)]
+
+
+def test_paged_fetch_returns_every_row_past_the_max_rows_cap(tmp_path):
+    transport = LocalSupabase(root=str(tmp_path / "supabase"), max_rows=100)
+    transport.seed_rows(TABLE, rows(0, 950))
+    fetched = local_io(transport).fetch_all_sync(TABLE, select="id,count", page_size=100)
+    assert [row["count"] for row in fetched] == list(range(950))
+    assert set(fetched[0]) == {"id", "count"}
+
+
+def test_upsert_on_the_unique_index_ignores_or_merges_duplicates(transport):
+    db = local_io(transport)
+    assert db.write_batch_sync(TABLE, rows(0, 10), upsert=True, on_conflict="fingerprint")[1] == 10
+
+    written, count = db.write_batch_sync(TABLE, rows(5, 15), upsert=True, on_conflict="fingerprint", returning=True)
+    assert count == 5 and [row["fingerprint"] for row in written] == [f"fp{i}" for i in range(10, 15)]
+
+    changed = [{**row, "barangay": "San Jose"} for row in rows(0, 3)]
+    assert db.write_batch_sync(TABLE, changed, upsert=True, on_conflict="fingerprint", merge=True)[1] == 3
+    stored = db.fetch_all_sync(TABLE)
+    assert len(stored) == 15 == transport.row_count(TABLE)
+    assert [row["barangay"] for row in stored[:4]] == ["San Jose"] * 3 + ["Poblacion"]
+
+
+def test_plain_insert_conflicts_and_unknown_conflict_targets_are_refused(transport):
+    db = local_io(transport)
+    db.write_batch_sync(TABLE, rows(0, 3))
+    with pytest.raises(SupabaseError) as conflict:
+        db.write_batch_sync(TABLE, rows(2, 5))  # One duplicate fails the whole batch
+    assert conflict.value.status_code == 409
+    with pytest.raises(SupabaseError) as no_index:
+        db.write_batch_sync(TABLE, rows(9, 10), upsert=True, on_conflict="barangay")
+    assert no_index.value.status_code == 400
+
+    unfingerprinted = [{"barangay": "Poblacion"}] * 2  # NULL keys never conflict
+    assert db.write_batch_sync(TABLE, unfingerprinted, upsert=True, on_conflict="fingerprint")[1] == 2
+    assert transport.row_count(TABLE) == 5
+
+
+def test_rejected_row_fails_its_batch(tmp_path):
+    transport = LocalSupabase(root=str(tmp_path / "supabase"),
+                              reject_row=lambda row: "invalid date" if row["count"] == 3 else None)
+    with pytest.raises(SupabaseError) as rejected:
+        local_io(transport).write_batch_sync(TABLE, rows(0, 5))
+    assert rejected.value.status_code == 400 and transport.row_count(TABLE) == 0
+
+
+def test_storage_round_trip(transport):
+    bucket = local_bucket(transport, "hotspots")
+    bucket.upload("tiles/index.json", b'{"v": 1}', {"content-type": "application/json"})
+    assert bucket.download("tiles/index.json") == b'{"v": 1}'
+    with pytest.raises(SupabaseError):
+        bucket.upload("tiles/index.json", b'{"v": 2}')  # Create-only by default
+    bucket.upload("tiles/index.json", b'{"v": 2}', {"upsert": "true"})
+    assert bucket.download("tiles/index.json") == b'{"v": 2}'
+
+    bucket.remove(["tiles/index.json"])
+    with pytest.raises(SupabaseError):
+        bucket.download("tiles/index.json")
+
+
+def test_injected_faults_are_retried_and_reproducible(tmp_path):
+    logs = []
+    for run in range(2):
+        transport = LocalSupabase(root=str(tmp_path / f"run{run}"), error_rate=0.3, seed=7)
+        db = local_io(transport, max_concurrency=1)
+        for start in range(0, 100, 10):
+            db.write_batch_sync(TABLE, rows(start, start + 10), upsert=True, on_conflict="fingerprint")
+        assert transport.row_count(TABLE) == 100
+        logs.append(transport.requests)
+    assert logs[0] == logs[1]
+    assert any(status == 503 for _, _, status in logs[0])
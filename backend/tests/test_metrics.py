@@ -0,0 +1,72 @@
+import time
+import pandas as pd
+import pytest
+import metrics
+
+
+def metric_lines(capsys):
+    return [line for line in capsys.readouterr().out.splitlines() if line.startswith(metrics.METRIC_PREFIX)]
+
+
+def parse(line):
+    return dict(pair.split("=", 1) for pair in line[len(metrics.METRIC_PREFIX):].split())
+
+
+def test_instrumented_counts_rows_by_each_rule(capsys):
+    class Loader:
+        frames = [1, 2, 3]
+
+        @metrics.instrumented()
+        def sheets(self):
+            return {"2023": pd.DataFrame({"a": range(4)}), "2024": [1, 2]}  # Dict of row sets: 4 + 2
+
+        @metrics.instrumented(rows="records")
+        def insert(self, batch, records):
+            return None
+
+        @metrics.instrumented(rows="self.frames")
+        def load(self):
+            return None
+
+        @metrics.instrumented(stage="renamed", rows=lambda result, *_: result * 10)
+        def computed(self):
+            return 7
+
+    loader = Loader()
+    loader.sheets()
+    loader.insert(1, records=[{}] * 5)
+    loader.load()
+    loader.computed()
+
+    lines = [parse(line) for line in metric_lines(capsys)]
+    assert [(m["stage"], m["rows"]) for m in lines] == [("sheets", "6"), ("insert", "5"), ("load", "3"), ("renamed", "70")]
+    assert all(m["status"] == "ok" and float(m["wall_s"]) >= 0 for m in lines)
+
+
+def test_failures_are_reported_and_raised(capsys):
+    @metrics.instrumented(rows=lambda result, *_: 1 / 0)  # A broken row counter never breaks the stage
+    def fine():
+        return "done"
+
+    @metrics.instrumented()
+    def broken():
+        raise ValueError("boom")
+
+    assert fine() == "done"
+    with pytest.raises(ValueError):
+        broken()
+
+    first, second = (parse(line) for line in metric_lines(capsys))
+    assert first["status"] == "ok" and "rows" not in first
+    assert second["stage"] == "broken" and second["status"] == "error"
+
+
+def test_stage_metrics_reports_rows_and_extras_set_inside_the_block(capsys):
+    with metrics.stage_metrics("clean_data") as record:
+        time.sleep(0.01)
+        record.rows = 42
+        record.extra["dropped"] = 3
+
+    metric = parse(metric_lines(capsys)[0])
+    assert metric["rows"] == "42" and metric["dropped"] == "3"
+    assert float(metric["wall_s"]) >= 0.01
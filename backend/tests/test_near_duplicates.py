@@ -0,0 +1,41 @@
+import json
+from near_duplicates import filter_near_duplicates, duplicate_count
+
+
+def record(lat, lng, time, offense="Reckless"):
+    return {"barangay": "Poblacion", "lat": lat, "lng": lng, "datecommitted": "2024-03-01",
+            "timecommitted": time, "offensetype": offense}
+
+
+# A chain: each record is ~11 m / 20 min from the next, the ends are ~22 m / 40 min apart
+CHAIN = [record(15.10000, 120.6, "08:00:00"), record(15.10010, 120.6, "08:20:00"), record(15.10020, 120.6, "08:40:00")]
+OTHER = record(15.20000, 120.6, "08:00:00")
+
+
+def read_audit(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_default_only_flags(tmp_path):
+    audit_file = str(tmp_path / "audit.jsonl")
+    records = CHAIN + [OTHER]
+    kept, pairs = filter_near_duplicates(records, audit_file=audit_file)
+    assert kept == records
+    assert duplicate_count(pairs) == 2
+    audit = read_audit(audit_file)
+    assert audit and not any(entry[side]["dropped"] for entry in audit for side in ("first", "second"))
+
+
+def test_drop_merges_transitive_groups(tmp_path):
+    audit_file = str(tmp_path / "audit.jsonl")
+    kept, pairs = filter_near_duplicates(CHAIN + [OTHER], audit_file=audit_file, drop=True)
+    assert kept == [CHAIN[0], OTHER]
+    assert duplicate_count(pairs) == 2
+    assert any(entry["second"]["dropped"] for entry in read_audit(audit_file))
+
+
+def test_existing_rows_are_never_flagged(tmp_path):
+    audit_file = str(tmp_path / "audit.jsonl")
+    kept, pairs = filter_near_duplicates(CHAIN[1:2], existing=CHAIN[:1], audit_file=audit_file, drop=True)
+    assert kept == [] and duplicate_count(pairs) == 1
@@ -0,0 +1,53 @@
+import numpy as np
+from sklearn.metrics import adjusted_rand_score
+
+from partitioned_clustering import partition_bounds, partitioned_hdbscan, _cluster_tile, _in_bounds
+
+
+def blobs(centers, per_blob=200, spread=0.0008, seed=0):
+    rng = np.random.default_rng(seed)
+    lat = np.concatenate([rng.normal(c_lat, spread, per_blob) for c_lat, _ in centers])
+    lon = np.concatenate([rng.normal(c_lon, spread, per_blob) for _, c_lon in centers])
+    return lat, lon
+
+
+def test_tiles_cover_every_point_exactly_once_and_stay_under_the_limit():
+    rng = np.random.default_rng(1)
+    lat, lon = 15.0 + rng.normal(0, 0.05, 5000), 120.6 + rng.normal(0, 0.08, 5000)
+    tiles = partition_bounds(lat, lon, max_points=600)
+
+    owners = np.array([_in_bounds(lat, lon, bounds) for bounds in tiles])
+    assert (owners.sum(axis=0) == 1).all()
+    assert owners.sum(axis=1).max() <= 600
+    assert partition_bounds(lat, lon, max_points=len(lat)) == [(-np.inf, np.inf, -np.inf, np.inf)]
+
+
+def test_identical_coordinates_stop_the_bisection():
+    lat, lon = np.full(100, 15.0), np.full(100, 120.6)
+    assert len(partition_bounds(lat, lon, max_points=10)) == 1
+
+
+def monolithic(lat, lon):
+    return _cluster_tile(np.radians(np.column_stack([lat, lon])), 15, 5, 0.0001)
+
+
+def test_clusters_cut_by_a_tile_edge_are_stitched_back_together():
+    # One dense patch: the median split runs straight through it
+    rng = np.random.default_rng(1)
+    lat, lon = 15.0 + rng.normal(0, 0.0008, 800), 120.6 + rng.normal(0, 0.0015, 800)
+    assert len(partition_bounds(lat, lon, 400)) == 2
+
+    stitched = partitioned_hdbscan(lat, lon, max_tile_points=400, max_workers=1)
+    unstitched = partitioned_hdbscan(lat, lon, max_tile_points=400, halo_meters=0, max_workers=1)
+    assert adjusted_rand_score(monolithic(lat, lon), stitched) > 0.95
+    assert stitched.max() < unstitched.max()  # Without the halo each tile keeps its half
+
+
+def test_separated_blobs_match_the_monolithic_run():
+    centers = [(15.0 + 0.02 * i, 120.6 + 0.03 * j) for i in range(3) for j in range(3)]
+    lat, lon = blobs(centers, seed=2)
+    partitioned = partitioned_hdbscan(lat, lon, max_tile_points=500, max_workers=1)
+
+    assert len(partition_bounds(lat, lon, 500)) > 1
+    assert sorted(set(partitioned)) == list(range(len(centers)))  # Numbered 0..k-1
+    assert adjusted_rand_score(monolithic(lat, lon), partitioned) > 0.95
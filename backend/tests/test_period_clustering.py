@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+from period_clustering import summarize_slice, COLUMNS
+
+
+def test_centers_carry_the_danger_score_and_are_sorted_by_it():
+    labels = np.array([0, 0, 0, 1, 1, -1])
+    lat = np.array([15.0, 15.0, 15.0, 15.1, 15.1, 15.2])
+    lon = np.array([120.6, 120.6, 120.6, 120.7, 120.7, 120.8])
+    barangay_codes = np.array([0, 0, 1, 1, 1, -1])
+    severity_codes = np.array([0, 1, 1, 0, 0, -1])
+    danger = pd.Series({0: 0.2, 1: 0.5})
+
+    rows = summarize_slice(labels, lat, lon, barangay_codes, severity_codes, ["A", "B"], 2, danger)
+
+    score = COLUMNS.index("danger_score")
+    assert [row[score] for row in rows] == [0.5, 0.2]  # Smaller but more dangerous cluster first
+    assert rows[0][:4] == [15.1, 120.7, 2, "B"] and rows[0][score + 1:] == [2, 0]
+    assert rows[1][:4] == [15.0, 120.6, 3, "A"] and rows[1][score + 1:] == [1, 2]
@@ -0,0 +1,119 @@
+import os
+import json
+import functools
+import numpy as np
+import pipeline
+from pipeline import Pipeline, Stage
+
+
+def touch(path, content="x"):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return True
+
+
+def make_stages(tmp_path, calls):
+    source = str(tmp_path / "source.txt")
+    touch(source)
+    centers, written = str(tmp_path / "centers.json"), str(tmp_path / "written.json")
+
+    def run_cluster(context):
+        calls.append("cluster")
+        context["analyzer"] = object()
+        return touch(centers)
+
+    def run_write(context):
+        calls.append("write")
+        return pipeline.analyzed(context) is not None and touch(written)
+
+    return [
+        Stage("cluster", run_cluster, inputs=[source], outputs=[centers]),
+        Stage("write", run_write, deps=["cluster"], reuses="cluster", inputs=[source], outputs=[written]),
+    ]
+
+
+def run(tmp_path, monkeypatch, stages):
+    monkeypatch.setitem(pipeline.TARGETS, "test", [stage.name for stage in stages])
+    runner = Pipeline(stages=stages, state_file=str(tmp_path / "state.json"))
+    return runner.run("test"), runner.results
+
+
+def test_cluster_runs_again_when_a_writer_needs_its_result(tmp_path, monkeypatch):
+    calls = []
+    stages = make_stages(tmp_path, calls)
+    assert run(tmp_path, monkeypatch, stages)[0]
+    assert calls == ["cluster", "write"]
+
+    calls.clear()
+    ok, results = run(tmp_path, monkeypatch, stages)
+    assert ok and calls == [] and results["cluster"]["status"] == "skipped"
+
+    # Only the writer's output is gone: cluster must run again instead of being skipped
+    os.remove(str(tmp_path / "written.json"))
+    calls.clear()
+    ok, results = run(tmp_path, monkeypatch, stages)
+    assert ok and calls == ["cluster", "write"]
+    assert results["cluster"]["status"] == "ran"
+
+
+def test_failed_publish_fails_the_stage(tmp_path, monkeypatch, capsys):
+    import mobile_cluster_fetch
+
+    def refuse(*args, **kwargs):
+        raise mobile_cluster_fetch.PublishError("upload refused")
+
+    monkeypatch.setattr(mobile_cluster_fetch, "publish_artifacts", refuse)
+    stages = [Stage("publish", pipeline.publisher("cluster_centers.json"), always_run=True)]
+    ok, results = run(tmp_path, monkeypatch, stages)
+    assert not ok and results["publish"]["status"] == "failed"
+    # server.js reads the stage counts from this marker
+    assert "[SUMMARY]PIPELINE:ran=0 skipped=0 failed=1 blocked=0 preview=0" in capsys.readouterr().out
+
+
+def write_accidents(path, count, seed=0):
+    """`count` points around a few hotspots in accidents.geojson's shape"""
+    rng = np.random.default_rng(seed)
+    hotspots = np.array([[120.68, 15.04], [120.61, 15.11], [120.65, 15.07]])
+    coordinates = hotspots[rng.integers(len(hotspots), size=count)] + rng.normal(0, 0.002, size=(count, 2))
+    features = [{
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [round(lon, 6), round(lat, 6)]},
+        "properties": {"id": i + 1, "datecommitted": f"{2016 + i % 10}-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+                       "timecommitted": "12:00:00", "severity": ("Low", "Medium", "High")[i % 3]},
+    } for i, (lon, lat) in enumerate(coordinates.tolist())]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f)
+
+
+def test_large_dataset_is_previewed_and_not_published(tmp_path, monkeypatch):
+    import cluster_hdbscan
+    import mobile_cluster_fetch
+
+    accidents, centers = str(tmp_path / "accidents.geojson"), str(tmp_path / "cluster_centers.json")
+    write_accidents(accidents, cluster_hdbscan.PREVIEW_MIN_POINTS)
+    monkeypatch.setattr(cluster_hdbscan, "AccidentClusterAnalyzer",
+                        functools.partial(cluster_hdbscan.AccidentClusterAnalyzer, data_folder=str(tmp_path)))
+    published = []
+    monkeypatch.setattr(mobile_cluster_fetch, "publish_artifacts", lambda *args, **kwargs: published.append(kwargs))
+
+    stages = [
+        Stage("cluster", pipeline.run_cluster, inputs=[accidents], outputs=[centers]),
+        Stage("publish_centers", pipeline.publisher("cluster_centers.json"), deps=["cluster"], always_run=True,
+              final_only=True),
+    ]
+    monkeypatch.setitem(pipeline.TARGETS, "test", [stage.name for stage in stages])
+    runner = Pipeline(stages=stages, state_file=str(tmp_path / "state.json"))
+    assert runner.run("test")
+
+    with open(centers, encoding="utf-8") as f:
+        assert all(center["preview"] is True for center in json.load(f))
+    assert runner.results["publish_centers"]["status"] == "skipped" and not published
+    input_fingerprint = runner.context["preview_of"]  # __main__ starts the background full run from this
+    assert input_fingerprint
+
+    # The full run that follows re-clusters (the preview state never counts as up to date) and publishes
+    runner = Pipeline(stages=stages, state_file=str(tmp_path / "state.json"))
+    assert runner.run("test", preview=False, if_input=input_fingerprint)
+    with open(centers, encoding="utf-8") as f:
+        assert not any(center.get("preview") for center in json.load(f))
+    assert runner.results["cluster"]["status"] == "ran" and len(published) == 1
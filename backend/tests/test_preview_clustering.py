@@ -0,0 +1,52 @@
+import json
+import functools
+
+import numpy as np
+import pytest
+from sklearn.metrics import adjusted_rand_score
+
+import cluster_hdbscan
+import pipeline
+from cluster_hdbscan import AccidentClusterAnalyzer
+from test_pipeline import write_accidents
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    write_accidents(str(tmp_path / "accidents.geojson"), 8000)
+    analyzer = AccidentClusterAnalyzer(data_folder=str(tmp_path))
+    assert analyzer.load_geojson_data() and analyzer.preprocess_data()
+    return analyzer
+
+
+def test_sample_takes_the_same_fraction_of_every_cell(analyzer):
+    rows, fraction = analyzer.stratified_sample(sample_size=2000, cell_meters=250)
+    assert fraction == pytest.approx(2000 / len(analyzer.df))
+    assert len(rows) == pytest.approx(2000, rel=0.05) and (np.diff(rows) > 0).all()
+
+    cell_degrees = 250 / 111_320.0
+    cells = (analyzer.df[["latitude", "longitude"]] // cell_degrees).astype(int).apply(tuple, axis=1)
+    counts = cells.value_counts()
+    sampled = cells.iloc[rows].value_counts()
+    busy = counts[counts >= 200].index  # Rounding dominates in sparse cells
+    assert len(busy) and np.allclose(sampled[busy] / counts[busy], fraction, atol=0.01)
+
+
+def test_preview_labels_agree_with_the_full_run(analyzer):
+    full = analyzer.perform_clustering().copy()
+    preview = analyzer.perform_preview_clustering(sample_size=2000)
+    assert adjusted_rand_score(full, preview) > 0.9
+
+
+def test_background_run_leaves_a_newer_export_alone(tmp_path, monkeypatch):
+    write_accidents(str(tmp_path / "accidents.geojson"), 2000)
+    monkeypatch.setattr(cluster_hdbscan, "AccidentClusterAnalyzer",
+                        functools.partial(AccidentClusterAnalyzer, data_folder=str(tmp_path)))
+    context = {"preview": False, "if_input": "0:0"}  # The export this run was started for was replaced
+    assert not pipeline.run_cluster(context)
+    assert "analyzer" not in context and not (tmp_path / "cluster_centers.json").exists()
+
+    context["if_input"] = AccidentClusterAnalyzer(data_folder=str(tmp_path)).input_fingerprint()
+    assert pipeline.run_cluster(context)
+    with open(tmp_path / "cluster_centers.json", encoding="utf-8") as f:
+        assert json.load(f) and "preview_of" not in context
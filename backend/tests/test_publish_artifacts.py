@@ -0,0 +1,102 @@
+import os
+import json
+import pytest
+import mobile_cluster_fetch
+from local_storage import LocalBucket
+from local_supabase import LocalSupabase, local_bucket
+
+
+def write(folder, name, content):
+    path = os.path.join(folder, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def remote_manifest(bucket):
+    return json.loads(bucket.download(mobile_cluster_fetch.REMOTE_MANIFEST_KEY))
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    data = tmp_path / "data"
+    data.mkdir()
+    monkeypatch.setattr(mobile_cluster_fetch, "STAGING_FOLDER", str(tmp_path / "staging"))
+    write(str(data), "cluster_centers.json", "[1, 2, 3]")
+    write(str(data), "accidents_clustered.geojson", '{"features": []}')
+    return {"data": str(data), "manifest": str(tmp_path / "manifest.local.json")}
+
+
+ARTIFACTS = [("cluster_centers.json", "application/json"), ("accidents_clustered.geojson", "application/geo+json")]
+
+
+def publish(bucket, workspace, artifacts=ARTIFACTS, **kwargs):
+    return mobile_cluster_fetch.publish_artifacts(bucket, artifacts=artifacts, data_folder=workspace["data"],
+                                                  manifest_file=workspace["manifest"], **kwargs)
+
+
+def test_unchanged_artifacts_are_skipped(tmp_path, workspace):
+    bucket = LocalBucket(str(tmp_path / "bucket"))
+    assert sorted(publish(bucket, workspace)) == sorted(name for name, _ in ARTIFACTS)
+
+    manifest = remote_manifest(bucket)
+    for name, _ in ARTIFACTS:
+        assert bucket.download(manifest["files"][name]["key"])
+    assert publish(bucket, workspace) == []
+
+
+def test_wiped_bucket_is_republished(tmp_path, workspace):
+    publish(LocalBucket(str(tmp_path / "bucket")), workspace)
+
+    # Same local manifest, empty bucket: the remote manifest decides what is missing
+    fresh = LocalBucket(str(tmp_path / "fresh"))
+    assert sorted(publish(fresh, workspace)) == sorted(name for name, _ in ARTIFACTS)
+    assert set(remote_manifest(fresh)["files"]) == {name for name, _ in ARTIFACTS}
+
+
+def test_retired_shards_are_deleted(tmp_path, workspace):
+    bucket = LocalBucket(str(tmp_path / "bucket"))
+    write(workspace["data"], "shards/a.json", "a")
+    write(workspace["data"], "shards/b.json", "b")
+    shards = [("shards/a.json", "application/json"), ("shards/b.json", "application/json")]
+    publish(bucket, workspace, artifacts=shards, replace_folders=("shards",))
+    retired_key = remote_manifest(bucket)["files"]["shards/b.json"]["key"]
+
+    os.remove(os.path.join(workspace["data"], "shards/b.json"))
+    write(workspace["data"], "shards/a.json", "a2")
+    publish(bucket, workspace, artifacts=shards[:1], replace_folders=("shards",))
+
+    assert set(remote_manifest(bucket)["files"]) == {"shards/a.json"}
+    for key in (retired_key, retired_key + ".gz", "shards/b.json"):
+        with pytest.raises(FileNotFoundError):
+            bucket.download(key)
+
+
+def test_publish_through_the_storage_api(tmp_path, workspace):
+    # Same flow over HTTP (StorageBucket + the local PostgREST/Storage stand-in)
+    transport = LocalSupabase(root=str(tmp_path / "supabase"))
+    bucket = local_bucket(transport, mobile_cluster_fetch.BUCKET_NAME)
+    assert sorted(publish(bucket, workspace)) == sorted(name for name, _ in ARTIFACTS)
+    assert publish(bucket, workspace) == []
+
+    write(workspace["data"], "cluster_centers.json", "[4]")
+    assert publish(bucket, workspace) == ["cluster_centers.json"]
+    key = remote_manifest(bucket)["files"]["cluster_centers.json"]["key"]
+    assert bucket.download(key) == b"[4]"
+
+
+class FailingBucket(LocalBucket):
+    def upload(self, path, file, file_options=None):
+        raise OSError("upload refused")
+
+
+def test_failed_upload_raises_and_keeps_the_manifest(tmp_path, workspace):
+    bucket = LocalBucket(str(tmp_path / "bucket"))
+    publish(bucket, workspace)
+    before = remote_manifest(bucket)
+
+    write(workspace["data"], "cluster_centers.json", "[4]")
+    failing = FailingBucket(str(tmp_path / "bucket"))
+    with pytest.raises(mobile_cluster_fetch.PublishError):
+        publish(failing, workspace)
+    assert remote_manifest(bucket) == before
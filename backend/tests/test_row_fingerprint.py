@@ -0,0 +1,53 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from local_supabase import LocalSupabase, local_io
+from row_fingerprint import row_fingerprints, key_variants, add_fingerprints, backfill, FINGERPRINT_COLUMN
+
+ROW = {"barangay": "Poblacion", "lat": 15.1, "lng": 120.6, "datecommitted": "2024-01-05",
+       "timecommitted": "08:30:00", "offensetype": "Reckless"}
+
+
+def test_fingerprints_are_pinned():
+    # Changing the normalization or the hash changes every stored fingerprint:
+    # bump FINGERPRINT_VERSION and re-run the backfill, then update this value
+    assert row_fingerprints([ROW]).tolist() == [5613162113905203814]
+
+
+def test_excel_and_database_spellings_of_a_row_agree():
+    from_excel = {"barangay": "  POBLACION ", "lat": "15.1000001", "lng": 120.6, "datecommitted": pd.Timestamp("2024-01-05"),
+                  "timecommitted": datetime.time(8, 30), "offensetype": "reckless"}
+    assert row_fingerprints([ROW, from_excel]).tolist() == row_fingerprints([ROW, ROW]).tolist()
+    assert (row_fingerprints(pd.DataFrame([ROW])) == row_fingerprints([ROW])).all()
+
+
+@pytest.mark.parametrize("column, value", [("barangay", "San Jose"), ("lat", 15.100002), ("lng", None),
+                                           ("datecommitted", "2024-01-06"), ("timecommitted", "08:31"),
+                                           ("offensetype", "Speeding")])
+def test_every_key_field_counts(column, value):
+    other = {**ROW, column: value}
+    assert row_fingerprints([ROW])[0] != row_fingerprints([other])[0]
+
+
+def test_looser_variants_ignore_the_dropped_fields():
+    retyped = {**ROW, "timecommitted": None, "barangay": "Pob."}
+    mine, theirs = key_variants([ROW]), key_variants([retyped])
+    assert mine["primary"][0] != theirs["primary"][0]
+    assert mine["without_time"][0] != theirs["without_time"][0]
+    assert mine["coordinates"][0] == theirs["coordinates"][0]
+    assert mine["primary"][0] == row_fingerprints([ROW])[0]
+
+
+def test_backfill_fills_only_missing_fingerprints(tmp_path):
+    transport = LocalSupabase(root=str(tmp_path / "supabase"))
+    table = "road_traffic_accident"
+    stored = add_fingerprints([{**ROW, "offensetype": "Speeding"}])
+    transport.seed_rows(table, stored + [dict(ROW)])
+
+    db = local_io(transport)
+    assert backfill(table, db=db) == 1
+    rows = db.fetch_all_sync(table, order="id")
+    assert [row[FINGERPRINT_COLUMN] for row in rows] == row_fingerprints(rows).tolist()
+    assert backfill(table, db=db) == 0
@@ -0,0 +1,14 @@
+import simplify_boundaries
+
+
+def test_boundary_levels_pass_the_point_in_polygon_check(tmp_path):
+    report = simplify_boundaries.build_boundaries(output_folder=str(tmp_path), zooms=[10, 16], sample=2000)
+    assert report["ok"]
+    assert report["quantized_pip"]["max_border_distance"] <= simplify_boundaries.QUANTIZATION_SLACK
+
+
+def test_check_fails_beyond_the_allowed_distance(tmp_path, monkeypatch):
+    # A negative allowance that no level can meet
+    monkeypatch.setattr(simplify_boundaries, "QUANTIZATION_SLACK", -1e9)
+    report = simplify_boundaries.build_boundaries(output_folder=str(tmp_path), zooms=[10], sample=2000)
+    assert not report["ok"]
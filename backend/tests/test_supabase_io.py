@@ -0,0 +1,47 @@
+import httpx
+import pytest
+import supabase_io
+from supabase_io import SupabaseIO, SupabaseError, run_sync
+
+
+def client(fail_with, calls):
+    """SupabaseIO whose first request fails with `fail_with` (an exception or a status code)"""
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            if isinstance(fail_with, int):
+                return httpx.Response(fail_with, text="gateway error")
+            raise fail_with
+        return httpx.Response(201, headers={"content-range": "*/2"})
+    return SupabaseIO(url="http://supabase.test", key="key", transport=httpx.MockTransport(handler))
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(supabase_io, "RETRY_BACKOFF", 0)
+
+
+ROWS = [{"id": 1}, {"id": 2}]
+
+
+@pytest.mark.parametrize("failure", [httpx.ReadTimeout("read timed out"), 502])
+def test_plain_insert_is_not_resent_after_it_may_have_landed(failure):
+    calls = []
+    with pytest.raises(SupabaseError):
+        run_sync(client(failure, calls).write_batch("accidents", ROWS))
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("failure", [httpx.ConnectError("connection refused"), 429])
+def test_plain_insert_is_retried_when_it_was_not_sent(failure):
+    calls = []
+    assert run_sync(client(failure, calls).write_batch("accidents", ROWS)) == ([], 2)
+    assert len(calls) == 2
+
+
+def test_upsert_on_conflict_is_retried_and_returns_minimal_by_default():
+    calls = []
+    db = client(httpx.ReadTimeout("read timed out"), calls)
+    assert run_sync(db.write_batch("accidents", ROWS, upsert=True, on_conflict="fingerprint")) == ([], 2)
+    assert len(calls) == 2
+    assert "return=minimal" in calls[-1].headers["prefer"]
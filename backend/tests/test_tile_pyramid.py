@@ -0,0 +1,75 @@
+import json
+import os
+from collections import Counter
+
+import numpy as np
+
+from tile_pyramid import write_tile_pyramid, mercator_fraction
+
+LABELS = ["Fatal", "Injury", "Property"]
+
+
+def sample_points(count=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    lat = 15.03 + rng.normal(0, 0.02, count)
+    lon = 120.68 + rng.normal(0, 0.02, count)
+    severity = rng.integers(-1, len(LABELS), count)  # -1 = unknown severity
+    clusters = rng.integers(-1, 4, count)
+    return lat, lon, severity, clusters
+
+
+def read_pyramid(folder):
+    with open(os.path.join(folder, "index.json"), encoding="utf-8") as f:
+        index = json.load(f)
+    tiles = {}
+    for zoom, entries in index["tiles"].items():
+        for tile_x, tile_y, _ in entries:
+            with open(os.path.join(folder, zoom, str(tile_x), f"{tile_y}.json"), encoding="utf-8") as f:
+                tiles[(int(zoom), tile_x, tile_y)] = json.load(f)
+    return index, tiles
+
+
+def test_tiles_read_back_to_the_points_they_were_built_from(tmp_path):
+    lat, lon, severity, clusters = sample_points()
+    folder = str(tmp_path / "tiles")
+    count = write_tile_pyramid(lat, lon, severity, LABELS, clusters, folder=folder, zooms=[10, 14], cell_bits=4)
+    index, tiles = read_pyramid(folder)
+    assert count == len(tiles)
+    assert index["columns"] == ["cx", "cy", "total"] + LABELS + ["dominant_cluster"]
+
+    x, y = mercator_fraction(lat, lon)
+    for zoom in (10, 14):
+        # Every point lands in exactly one cell: rebuild each cell by brute force and compare
+        scale = 1 << (zoom + 4)
+        expected = {}
+        for cx, cy, sev, cluster in zip((x * scale).astype(int), (y * scale).astype(int), severity, clusters):
+            expected.setdefault((cx, cy), []).append((sev, cluster))
+
+        cells = {}
+        for (tile_zoom, tile_x, tile_y), tile in tiles.items():
+            if tile_zoom == zoom:
+                for row in tile["cells"]:
+                    cells[(tile_x * 16 + row[0], tile_y * 16 + row[1])] = row
+        assert cells.keys() == expected.keys()
+
+        for cell, points in expected.items():
+            row = cells[cell]
+            assert row[2] == len(points)
+            assert row[3:3 + len(LABELS)] == [sum(sev == code for sev, _ in points) for code in range(len(LABELS))]
+            counts = Counter(cluster for _, cluster in points if cluster >= 0)
+            dominant = min(counts, key=lambda c: (-counts[c], c)) if counts else -1
+            assert row[-1] == dominant
+
+        assert sum(total for _, _, total in index["tiles"][str(zoom)]) == len(lat)
+
+
+def test_rewrite_replaces_the_previous_pyramid(tmp_path):
+    folder = str(tmp_path / "tiles")
+    lat, lon, severity, clusters = sample_points()
+    write_tile_pyramid(lat, lon, severity, LABELS, clusters, folder=folder, zooms=[12])
+    write_tile_pyramid(lat[:1] + 1.0, lon[:1], severity[:1], LABELS, clusters[:1], folder=folder, zooms=[12])
+
+    _, tiles = read_pyramid(folder)
+    on_disk = [name for _, _, files in os.walk(folder) for name in files if name != "index.json"]
+    assert len(tiles) == len(on_disk) == 1  # No stale tiles from the first run
+    assert not os.path.exists(folder + ".tmp") and not os.path.exists(folder + ".old")
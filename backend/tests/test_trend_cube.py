@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import trend_cube
+
+
+def sample_rows(count, seed):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2022-01-01") + pd.to_timedelta(rng.integers(0, 900, count), unit="D")
+    return [{"lat": float(lat), "lng": float(lng), "datecommitted": date.strftime("%Y-%m-%d")}
+            for lat, lng, date in zip(rng.uniform(15.0, 15.1, count), rng.uniform(120.5, 120.7, count), dates)]
+
+
+def fingerprint(rows):
+    points = trend_cube.rows_to_points(rows)
+    return trend_cube.points_fingerprint(points["lat"].to_numpy(), points["lon"].to_numpy(), points["date"])
+
+
+def test_fingerprint_follows_content_not_order_or_count():
+    rows = sample_rows(200, seed=1)
+    assert fingerprint(rows) == fingerprint(rows[::-1])
+
+    moved = [dict(row) for row in rows]
+    moved[0]["lat"] += 0.01  # Same number of points, different data
+    assert fingerprint(moved) != fingerprint(rows)
+
+
+def test_incremental_update_matches_a_rebuild(tmp_path):
+    cube_file = str(tmp_path / "trend_cube.npz")
+    first, inserted = sample_rows(300, seed=2), sample_rows(40, seed=3)
+    trend_cube.rebuild_cube(first, cube_file)
+    trend_cube.update_cube(inserted, cube_file)
+    updated, meta = trend_cube.load_cube_with_meta(cube_file)
+
+    rebuilt_file = str(tmp_path / "rebuilt.npz")
+    trend_cube.rebuild_cube(first + inserted, rebuilt_file)
+    rebuilt, rebuilt_meta = trend_cube.load_cube_with_meta(rebuilt_file)
+    pd.testing.assert_series_equal(updated, rebuilt)
+    assert meta["fingerprint"] == rebuilt_meta["fingerprint"] == fingerprint(first + inserted)
+
+
+def test_export_keeps_a_current_incremental_cube(tmp_path):
+    cube_file = str(tmp_path / "trend_cube.npz")
+    first, inserted = sample_rows(300, seed=4), sample_rows(25, seed=5)
+    inserted.append({"lat": None, "lng": None, "datecommitted": "2023-01-01"})  # Counted as a row, not a point
+    trend_cube.rebuild_cube(first, cube_file)
+    trend_cube.update_cube(inserted, cube_file)
+
+    _, rebuilt = trend_cube.refresh_cube(first + inserted, cube_file)
+    assert not rebuilt
+
+    _, rebuilt = trend_cube.refresh_cube(first + inserted[:-1], cube_file)  # A row deleted elsewhere
+    assert rebuilt
@@ -0,0 +1,60 @@
+from openpyxl import Workbook
+from openpyxl.styles import Font
+import validate_upload
+from upload_columns import ALL_NEEDED_COLUMNS
+
+ROW = ["SAN JOSE", 15.04, 120.68, "2024-01-05", "10:30", "DAMAGE TO PROPERTY", 1, 1, 0, 0, 1, 0]
+
+
+def write_xlsx(path, layout):
+    """layout: "H" header, "D" data row, "-" empty row, "s" row with only a styled empty cell"""
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Accidents 2024"
+    for row_number, kind in enumerate(layout, start=1):
+        values = ALL_NEEDED_COLUMNS if kind == "H" else ROW if kind == "D" else None
+        if values:
+            for column, value in enumerate(values, start=1):
+                sheet.cell(row=row_number, column=column, value=value)
+        elif kind == "s":
+            sheet.cell(row=row_number, column=2).font = Font(bold=True)
+    workbook.save(path)
+    return str(path)
+
+
+def test_xlsx_counts_only_non_empty_rows_after_the_first_non_empty_row(tmp_path):
+    path = write_xlsx(tmp_path / "upload.xlsx", "--sHDD-sD--s")
+    report = validate_upload.validate_upload(path)
+    assert report["valid"], report["errors"]
+    assert report["recordsProcessed"] == 3
+
+    # The openpyxl fallback agrees
+    assert validate_upload.count_xlsx_rows_openpyxl(path, "Accidents 2024") == validate_upload.count_xlsx_rows(path, "Accidents 2024") == 4
+    assert validate_upload.read_xlsx_headers_openpyxl(path)[0][1][:3] == ALL_NEEDED_COLUMNS[:3]
+
+
+def test_xlsx_with_only_a_header_and_empty_rows_has_no_data(tmp_path):
+    report = validate_upload.validate_upload(write_xlsx(tmp_path / "upload.xlsx", "-Hs--"))
+    assert not report["valid"] and "no data rows" in report["errors"][0]
+
+
+def test_row_count_does_not_depend_on_chunk_boundaries(tmp_path, monkeypatch):
+    path = write_xlsx(tmp_path / "upload.xlsx", "H" + "D-s" * 40)
+    monkeypatch.setattr(validate_upload, "COUNT_CHUNK_SIZE", 37)
+    assert validate_upload.count_xlsx_rows(path, "Accidents 2024") == 41
+
+
+def test_csv_skips_empty_lines(tmp_path):
+    path = tmp_path / "upload.csv"
+    data = ",".join(str(value) for value in ROW)
+    path.write_text("\n,,,\n" + ",".join(ALL_NEEDED_COLUMNS) + "\r\n" + data + "\r\n\r\n" + data + "\n \n" + data)
+    report = validate_upload.validate_upload(str(path))
+    assert report["valid"], report["errors"]
+    assert report["recordsProcessed"] == 3
+
+    # Same count whichever chunk a line ends in
+    validate_upload.COUNT_CHUNK_SIZE, chunk_size = 5, validate_upload.COUNT_CHUNK_SIZE
+    try:
+        assert validate_upload.count_lines(str(path)) == 4
+    finally:
+        validate_upload.COUNT_CHUNK_SIZE = chunk_size
@@ -0,0 +1,150 @@
+import os
+import json
+import shutil
+import logging
+from datetime import datetime, timezone
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# Configuration
+# ==============================
+# Pre-aggregated grid tiles for the accident map. Tiles follow the usual
+# web-mercator z/x/y scheme (same as the Leaflet base map), and every tile is
+# divided into a 2^CELL_BITS x 2^CELL_BITS grid of cells:
+#
+#   data/tiles/index.json           zoom levels, columns, tiles per zoom
+#   data/tiles/<z>/<x>/<y>.json     {"cells": [[cx, cy, total, <severities...>, dominant_cluster], ...]}
+#
+# cx/cy are the cell's position inside its tile (0 .. 2^CELL_BITS - 1, y down).
+# dominant_cluster is the most common cluster id in the cell (-1 = noise only).
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TILES_FOLDER = os.path.join(SCRIPT_DIR, "data", "tiles")
+
+MIN_ZOOM = 8
+MAX_ZOOM = 15    # Above this the map shows the individual points
+CELL_BITS = 6    # 64 x 64 cells per 256px tile (4px cells)
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def mercator_fraction(lat, lon):
+    """Web-mercator position of each point as fractions of the world (0..1, y down)"""
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(np.radians(lat)) + 1.0 / np.cos(np.radians(lat))) / np.pi) / 2.0
+    return np.clip(x, 0.0, np.nextafter(1.0, 0)), np.clip(y, 0.0, np.nextafter(1.0, 0))
+
+
+def aggregate_zoom(x, y, severity_codes, n_severities, clusters, zoom, cell_bits=CELL_BITS):
+    """Aggregate points into the cell grid of one zoom level
+
+    Returns a dict of per-cell arrays: cell_x, cell_y (global cell indices),
+    total, severity (n_cells x n_severities) and dominant_cluster.
+    """
+    scale = 1 << (zoom + cell_bits)
+    cell_x = (x * scale).astype(np.int64)
+    cell_y = (y * scale).astype(np.int64)
+    cells, inverse = np.unique(cell_x * scale + cell_y, return_inverse=True)
+    n_cells = len(cells)
+
+    total = np.bincount(inverse, minlength=n_cells)
+    known = severity_codes >= 0
+    severity = np.bincount(
+        inverse[known] * n_severities + severity_codes[known], minlength=n_cells * n_severities
+    ).reshape(n_cells, n_severities)
+
+    # Dominant cluster: count (cell, cluster) pairs, then keep the largest per cell
+    # (ties go to the lower cluster id)
+    dominant = np.full(n_cells, -1, dtype=np.int64)
+    clustered = clusters >= 0
+    if clustered.any():
+        stride = int(clusters[clustered].max()) + 1
+        pairs, pair_counts = np.unique(inverse[clustered] * stride + clusters[clustered], return_counts=True)
+        pair_cells, pair_clusters = pairs // stride, pairs % stride
+        order = np.lexsort((-pair_counts, pair_cells))
+        first_cells, first_index = np.unique(pair_cells[order], return_index=True)
+        dominant[first_cells] = pair_clusters[order][first_index]
+
+    return {
+        "cell_x": cells // scale,
+        "cell_y": cells % scale,
+        "total": total,
+        "severity": severity,
+        "dominant_cluster": dominant,
+    }
+
+
+def split_into_tiles(aggregate, zoom, cell_bits=CELL_BITS):
+    """Yield (tile_x, tile_y, rows) for every non-empty tile of one zoom level"""
+    tile_x = aggregate["cell_x"] >> cell_bits
+    tile_y = aggregate["cell_y"] >> cell_bits
+    mask = (1 << cell_bits) - 1
+    columns = np.column_stack([
+        aggregate["cell_x"] & mask,
+        aggregate["cell_y"] & mask,
+        aggregate["total"],
+        aggregate["severity"],
+        aggregate["dominant_cluster"],
+    ]).astype(np.int64)
+
+    tile_ids = tile_x * (1 << zoom) + tile_y
+    order = np.argsort(tile_ids, kind="stable")
+    tile_ids, columns = tile_ids[order], columns[order]
+    starts = np.flatnonzero(np.r_[True, tile_ids[1:] != tile_ids[:-1]])
+    ends = np.r_[starts[1:], len(tile_ids)]
+    for start, end in zip(starts, ends):
+        tile_id = int(tile_ids[start])
+        yield tile_id >> zoom, tile_id & ((1 << zoom) - 1), columns[start:end].tolist()
+
+
+def write_tile_pyramid(lat, lon, severity_codes, severity_labels, clusters, folder=TILES_FOLDER,
+                       zooms=range(MIN_ZOOM, MAX_ZOOM + 1), cell_bits=CELL_BITS):
+    """Write every zoom level's tiles plus index.json; returns the number of tiles
+
+    The pyramid is built in a sibling temp folder and swapped in at the end, so
+    the map never reads a mix of old and new tiles.
+    """
+    x, y = mercator_fraction(lat, lon)
+    severity_codes = np.asarray(severity_codes, dtype=np.int64)
+    clusters = np.asarray(clusters, dtype=np.int64)
+    severity_labels = [str(label) for label in severity_labels]
+
+    tmp_folder = folder + ".tmp"
+    shutil.rmtree(tmp_folder, ignore_errors=True)
+    os.makedirs(tmp_folder)
+
+    tile_list = {}
+    for zoom in zooms:
+        aggregate = aggregate_zoom(x, y, severity_codes, len(severity_labels), clusters, zoom, cell_bits)
+        tile_list[str(zoom)] = []
+        for tile_x, tile_y, rows in split_into_tiles(aggregate, zoom, cell_bits):
+            tile_folder = os.path.join(tmp_folder, str(zoom), str(tile_x))
+            os.makedirs(tile_folder, exist_ok=True)
+            with open(os.path.join(tile_folder, f"{tile_y}.json"), "w", encoding="utf-8") as f:
+                json.dump({"z": zoom, "x": tile_x, "y": tile_y, "cells": rows}, f, separators=(",", ":"))
+            tile_list[str(zoom)].append([tile_x, tile_y, sum(row[2] for row in rows)])
+
+    index = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "scheme": "xyz",
+        "cell_bits": cell_bits,
+        "zooms": [int(zoom) for zoom in zooms],
+        "columns": ["cx", "cy", "total"] + severity_labels + ["dominant_cluster"],
+        "severities": severity_labels,
+        "bounds": [float(np.min(lon)), float(np.min(lat)), float(np.max(lon)), float(np.max(lat))] if len(x) else None,
+        "tiles": tile_list,  # zoom -> [[x, y, accident_count], ...]
+    }
+    with open(os.path.join(tmp_folder, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+
+    old_folder = folder + ".old"
+    shutil.rmtree(old_folder, ignore_errors=True)
+    if os.path.exists(folder):
+        os.replace(folder, old_folder)
+    os.replace(tmp_folder, folder)
+    shutil.rmtree(old_folder, ignore_errors=True)
+
+    tile_count = sum(len(tiles) for tiles in tile_list.values())
+    logger.info(f"Wrote {tile_count} tiles for zooms {index['zooms'][0]}-{index['zooms'][-1]} to {folder}")
+    return tile_count
@@ -0,0 +1,257 @@
+import os
+import io
+import json
+import logging
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from date_parsing import parse_date_column
+from metrics import instrumented
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# Spatio-temporal count cube (trend analysis)
+# ==============================
+# Accident counts per fixed grid cell x calendar month. The grid is anchored at
+# 0,0 (cell = floor(degrees / CELL_DEGREES)), so a cell means the same patch of
+# ground in every run and the counts can be kept and added to instead of
+# re-binned from the data's extent each time.
+#
+#   - cleaning2.py adds the rows each upsert actually inserted
+#   - export_geojson.py rebuilds it from every exported row, unless the
+#     incremental cube already counts exactly that many source rows and its last
+#     full rebuild is less than REBUILD_INTERVAL_HOURS old (refresh_cube)
+#   - cluster_hdbscan.py reads per-cell trends from it (global and per-cluster passes)
+#
+# data/trend_cube.npz: int32 columns cell_lat, cell_lon, month (year * 12 + month - 1)
+# and count, sorted by cell then month, plus a JSON "meta" entry. meta["fingerprint"]
+# is an order-independent hash of the counted points (coordinates + day), a sum of
+# per-point hashes so inserts can be added to it; the analyzer only trusts a cube
+# whose fingerprint matches the points it loaded.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CUBE_FILE = os.path.join(SCRIPT_DIR, "data", "trend_cube.npz")
+
+CELL_DEGREES = 0.005      # ~550 m, close to the old 30-bin grid over the city
+MIN_MONTHS = 3            # Months with accidents needed before a cell has a trend
+MIN_CORRELATION = 0.3     # |r| below this counts as no trend
+LEVELS = ["cell_lat", "cell_lon", "month"]
+REBUILD_INTERVAL_HOURS = 24
+
+
+def point_cells(lat, lon, cell_degrees: float = CELL_DEGREES):
+    """(cell_lat, cell_lon) int32 grid indices for coordinate arrays"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    return (np.floor(lat / cell_degrees).astype(np.int32),
+            np.floor(lon / cell_degrees).astype(np.int32))
+
+
+def cell_keys(cell_lat, cell_lon) -> np.ndarray:
+    """One int64 per cell (lat index in the high 32 bits)"""
+    return (np.asarray(cell_lat, dtype=np.int64) << 32) | (np.asarray(cell_lon, dtype=np.int64) & 0xFFFFFFFF)
+
+
+def month_index(dates: pd.Series) -> np.ndarray:
+    return (dates.dt.year * 12 + dates.dt.month - 1).to_numpy(dtype=np.int32)
+
+
+def rows_to_points(rows) -> pd.DataFrame:
+    """lat / lon / date for Supabase rows (list of dicts or a DataFrame), as export_geojson filters them"""
+    df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame.from_records(rows)
+    lat = pd.to_numeric(df["lat"], errors="coerce") if "lat" in df.columns else pd.Series(np.nan, index=df.index)
+    lon = pd.to_numeric(df["lng"], errors="coerce") if "lng" in df.columns else pd.Series(np.nan, index=df.index)
+    if "datecommitted" in df.columns:
+        dates, _ = parse_date_column(df["datecommitted"])
+    else:
+        dates = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+    valid = lat.notna() & lon.notna() & (lat != 0) & (lon != 0)
+    return pd.DataFrame({"lat": lat[valid], "lon": lon[valid], "date": dates[valid]})
+
+
+def points_fingerprint(lat, lon, dates: pd.Series) -> str:
+    """Hash of the dated points' (lat, lon, day) multiset, independent of row order"""
+    dates = pd.Series(dates).reset_index(drop=True)
+    dated = dates.notna().to_numpy()
+    dates = dates[dated]
+    frame = pd.DataFrame({
+        "lat": np.round(np.asarray(lat, dtype=np.float64)[dated] * 1e7).astype(np.int64),
+        "lon": np.round(np.asarray(lon, dtype=np.float64)[dated] * 1e7).astype(np.int64),
+        "day": (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).to_numpy(dtype=np.int64),
+    })
+    hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy(dtype=np.uint64)
+    return f"{int(hashes.sum(dtype=np.uint64)):016x}"  # uint64 sum wraps around
+
+
+def add_fingerprints(first: str, second: str) -> str:
+    return f"{(int(first, 16) + int(second, 16)) % 2 ** 64:016x}"
+
+
+@instrumented(rows=lambda cube, *_, **__: len(cube))
+def build_cube(lat, lon, dates: pd.Series, cell_degrees: float = CELL_DEGREES) -> pd.Series:
+    """Count points per (cell_lat, cell_lon, month); points without a date are left out"""
+    dates = pd.Series(dates).reset_index(drop=True)
+    dated = dates.notna().to_numpy()
+    cell_lat, cell_lon = point_cells(np.asarray(lat)[dated], np.asarray(lon)[dated], cell_degrees)
+    frame = pd.DataFrame({"cell_lat": cell_lat, "cell_lon": cell_lon, "month": month_index(dates[dated])})
+    if frame.empty:
+        return pd.Series([], dtype=np.int64, index=pd.MultiIndex.from_arrays([[]] * len(LEVELS), names=LEVELS))
+    return frame.groupby(LEVELS, sort=True).size().astype(np.int64).rename("count")
+
+
+def build_cube_from_rows(rows):
+    """(cube, fingerprint) for Supabase rows"""
+    points = rows_to_points(rows)
+    lat, lon = points["lat"].to_numpy(), points["lon"].to_numpy()
+    return build_cube(lat, lon, points["date"]), points_fingerprint(lat, lon, points["date"])
+
+
+def add_to_cube(cube: pd.Series, delta: pd.Series) -> pd.Series:
+    if cube is None or cube.empty:
+        return delta
+    if delta.empty:
+        return cube
+    return cube.add(delta, fill_value=0).astype(np.int64).sort_index()
+
+
+def save_cube(cube: pd.Series, source: str, cube_file: str = CUBE_FILE, fingerprint: str = None,
+              rows: int = None, snapshot_at: str = None):
+    """Write the cube atomically (compressed int32 columns)
+
+    rows is the number of source rows counted (points without coordinates or a
+    date included), snapshot_at the time of the last full rebuild.
+    """
+    os.makedirs(os.path.dirname(cube_file), exist_ok=True)
+    now = datetime.now(timezone.utc).isoformat()
+    meta = {
+        "cell_degrees": CELL_DEGREES,
+        "total": int(cube.sum()),
+        "rows": rows,
+        "fingerprint": fingerprint,
+        "source": source,
+        "updated_at": now,
+        "snapshot_at": snapshot_at or now,
+    }
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        **{level: cube.index.get_level_values(level).to_numpy(dtype=np.int32) for level in LEVELS},
+        count=cube.to_numpy(dtype=np.int32),
+        meta=np.array(json.dumps(meta)),
+    )
+    tmp_path = cube_file + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp_path, cube_file)
+    logger.info(f" Trend cube saved: {len(cube)} cells x months, {meta['total']} accidents")
+
+
+def load_cube_with_meta(cube_file: str = CUBE_FILE):
+    """(cube, meta) as saved, or (None, {}) if there is none yet (or it is unreadable / on another grid)"""
+    try:
+        with np.load(cube_file) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("cell_degrees") != CELL_DEGREES:
+                logger.info(" Trend cube was built on another grid - ignoring it")
+                return None, {}
+            index = pd.MultiIndex.from_arrays([data[level].astype(np.int32) for level in LEVELS], names=LEVELS)
+            return pd.Series(data["count"].astype(np.int64), index=index, name="count"), meta
+    except (OSError, ValueError, KeyError) as e:
+        if os.path.exists(cube_file):
+            logger.warning(f" Ignoring unreadable trend cube: {e}")
+        return None, {}
+
+
+def load_cube(cube_file: str = CUBE_FILE):
+    """Saved cube, or None if there is none yet (or it is unreadable / on another grid)"""
+    return load_cube_with_meta(cube_file)[0]
+
+
+def rebuild_cube(rows, cube_file: str = CUBE_FILE) -> pd.Series:
+    """Full rebuild from an export snapshot"""
+    cube, fingerprint = build_cube_from_rows(rows)
+    save_cube(cube, "snapshot", cube_file, fingerprint, rows=len(rows))
+    return cube
+
+
+def counts_snapshot(meta: dict, row_count: int, max_age_hours: float = REBUILD_INTERVAL_HOURS) -> bool:
+    """True if a cube with this meta already counts a snapshot of `row_count` rows:
+    kept up to date by the upload path, same source row count, and rebuilt in full recently"""
+    if meta.get("source") != "incremental" or meta.get("rows") != row_count:
+        return False
+    try:
+        snapshot_at = datetime.fromisoformat(meta["snapshot_at"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return (datetime.now(timezone.utc) - snapshot_at).total_seconds() < max_age_hours * 3600
+
+
+def refresh_cube(rows, cube_file: str = CUBE_FILE):
+    """Cube for an export snapshot: the saved one when counts_snapshot says the
+    incremental updates already cover it, otherwise a full rebuild. Returns (cube, rebuilt)"""
+    cube, meta = load_cube_with_meta(cube_file)
+    if cube is not None and counts_snapshot(meta, len(rows)):
+        logger.info(f" Trend cube is current ({meta['rows']} rows, updated incrementally) - not rebuilt")
+        return cube, False
+    return rebuild_cube(rows, cube_file), True
+
+
+def update_cube(inserted_rows, cube_file: str = CUBE_FILE):
+    """Add freshly inserted rows to the saved cube (the next export rebuilds it if there is none)"""
+    if not len(inserted_rows):
+        return None
+    cube, meta = load_cube_with_meta(cube_file)
+    if cube is None:
+        logger.info(" No trend cube yet - it will be built by the next export")
+        return None
+    delta, delta_fingerprint = build_cube_from_rows(inserted_rows)
+    fingerprint = add_fingerprints(meta["fingerprint"], delta_fingerprint) if meta.get("fingerprint") else None
+    cube = add_to_cube(cube, delta)
+    rows = meta["rows"] + len(inserted_rows) if meta.get("rows") is not None else None
+    save_cube(cube, "incremental", cube_file, fingerprint, rows=rows, snapshot_at=meta.get("snapshot_at"))
+    return cube
+
+
+# ==============================
+# Trends
+# ==============================
+def cell_trends(cube: pd.Series) -> pd.Series:
+    """Monthly-count slope per cell, indexed by cell_keys
+
+    Same rule as the per-bin linregress it replaces: x is the position of each
+    month with accidents (0, 1, 2, ...), y its count; cells with fewer than
+    MIN_MONTHS such months or |r| <= MIN_CORRELATION get 0. All cells are
+    fitted at once from per-cell sums.
+    """
+    if cube is None or cube.empty:
+        return pd.Series([], dtype=np.float64)
+    keys = cell_keys(cube.index.get_level_values("cell_lat"), cube.index.get_level_values("cell_lon"))
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])  # Cube is sorted by cell, then month
+    group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(keys)]))
+    x = np.arange(len(keys), dtype=np.float64) - starts[group]
+    y = cube.to_numpy(dtype=np.float64)
+
+    def sums(values):
+        return np.bincount(group, weights=values, minlength=len(starts))
+
+    n = sums(np.ones_like(y))
+    sx, sy = sums(x), sums(y)
+    sxx = sums(x * x) - sx * sx / n
+    syy = sums(y * y) - sy * sy / n
+    sxy = sums(x * y) - sx * sy / n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = sxy / sxx
+        r = sxy / np.sqrt(sxx * syy)
+    # Integer counts: a spread this small is rounding error on a flat series (r = 0)
+    significant = (n >= MIN_MONTHS) & (syy > 1e-9) & np.isfinite(r) & (np.abs(r) > MIN_CORRELATION)
+    return pd.Series(np.where(significant, slope, 0.0), index=keys[starts]).sort_index()
+
+
+def point_trends(trends: pd.Series, lat, lon) -> np.ndarray:
+    """Trend of each point's cell (0 for cells the cube has no history for)"""
+    keys = cell_keys(*point_cells(lat, lon))
+    if trends.empty:
+        return np.zeros(len(keys))
+    cells = trends.index.to_numpy()
+    position = np.clip(np.searchsorted(cells, keys), 0, len(cells) - 1)
+    return np.where(cells[position] == keys, trends.to_numpy()[position], 0.0)
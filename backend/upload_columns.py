@@ -0,0 +1,34 @@
+import re
+
+# ==============================
+# Upload column rules
+# ==============================
+# Shared by cleaning2.clean_data (import) and validate_upload.py (pre-check),
+# so a file that passes validation maps its columns exactly like the import.
+REQUIRED_COLUMNS = ['barangay', 'lat', 'lng', 'datecommitted', 'timecommitted', 'offensetype']
+SEVERITY_CALC_COLUMNS = ['victimcount', 'suspectcount', 'victiminjured', 'victimkilled', 'victimunharmed', 'suspectkilled']
+ALL_NEEDED_COLUMNS = REQUIRED_COLUMNS + SEVERITY_CALC_COLUMNS
+
+
+def normalize_column_name(name) -> str:
+    """'Date Committed ' -> 'date_committed' (strip, lowercase, spaces to _, drop non-word chars)"""
+    return re.sub(r'[^\w]', '', str(name).strip().lower().replace(' ', '_'))
+
+
+def map_columns(available_columns) -> dict:
+    """{needed column: matching normalized column} for the needed columns that are present
+
+    Exact names win; otherwise the first column containing the name (ignoring
+    underscores) is used, e.g. 'victim_count_total' for 'victimcount'.
+    """
+    available_columns = list(available_columns)
+    column_mapping = {}
+    for req_col in ALL_NEEDED_COLUMNS:
+        if req_col in available_columns:
+            column_mapping[req_col] = req_col
+        else:
+            for avail_col in available_columns:
+                if req_col.replace('_', '').lower() in avail_col.replace('_', '').lower():
+                    column_mapping[req_col] = avail_col
+                    break
+    return column_mapping
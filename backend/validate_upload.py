@@ -0,0 +1,304 @@
+import os
+import re
+import sys
+import csv
+import json
+import time
+import zipfile
+import argparse
+import posixpath
+from xml.etree.ElementTree import iterparse
+from upload_columns import REQUIRED_COLUMNS, SEVERITY_CALC_COLUMNS, normalize_column_name, map_columns
+
+# ==============================
+# Header-only upload validation
+# ==============================
+# Called by server.js before an upload is queued. Only the header row of each
+# sheet is parsed; rows are counted by scanning the raw bytes, so even very
+# large workbooks are checked without being parsed twice. .xlsx files are
+# streamed straight from the zip (stopping after the header row, and after the
+# last shared string the headers use); openpyxl in read-only mode is the
+# fallback for workbooks that reader can't handle.
+#
+# Like the importer, empty rows/lines are ignored: the header is the first
+# non-empty row and only non-empty rows after it count as records.
+#
+#   python validate_upload.py data/upload.xlsx [--no-require-year]
+#
+# Prints one JSON object: {"valid", "errors", "recordsProcessed", "sheetsProcessed", "elapsed_ms"}.
+# Exit code 2 means the format is not supported here (e.g. legacy .xls) and
+# the caller should use its own validator.
+
+YEAR_PATTERN = re.compile(r'\b(19|20)\d{2}\b')
+COUNT_CHUNK_SIZE = 1024 * 1024
+XLSX_ROW_TAG = re.compile(rb"<row[\s>/]")
+XLSX_CELL_VALUE = re.compile(rb"<v[\s>]|<is[\s>]")  # A cell value or an inline string
+EXIT_UNSUPPORTED = 2
+
+
+def check_columns(headers, label: str) -> list:
+    """Errors for needed columns that clean_data would not find in this header row"""
+    normalized = [normalize_column_name(h) for h in headers if h is not None and str(h).strip()]
+    column_mapping = map_columns(normalized)
+    errors = []
+    missing_basic = [col for col in REQUIRED_COLUMNS if col not in column_mapping]
+    missing_severity = [col for col in SEVERITY_CALC_COLUMNS if col not in column_mapping]
+    if missing_basic:
+        errors.append(f"❌ {label} is missing basic columns: {', '.join(missing_basic)}")
+    if missing_severity:
+        errors.append(f"❌ {label} is missing severity columns: {', '.join(missing_severity)}")
+    return errors
+
+
+def is_empty_line(line: bytes) -> bool:
+    """A CSV line with no values (only separators, quotes and whitespace)"""
+    return not line.strip(b' \t\r\n,"')
+
+
+def count_lines(path: str) -> int:
+    """Number of non-empty lines, counted over raw byte chunks"""
+    lines, tail = 0, b""
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COUNT_CHUNK_SIZE), b""):
+            parts = (tail + chunk).split(b"\n")
+            tail = parts.pop()  # Unfinished last line, completed by the next chunk
+            lines += sum(1 for line in parts if not is_empty_line(line))
+    return lines + (0 if is_empty_line(tail) else 1)
+
+
+def validate_csv(path: str) -> dict:
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        headers = next((row for row in csv.reader(f) if any(str(h).strip() for h in row)), None)
+    if not headers:
+        return result(["❌ CSV file is completely empty - please add data to this file"])
+
+    errors = check_columns(headers, "CSV file")
+    data_rows = count_lines(path) - 1
+    if data_rows < 1:
+        errors.append("❌ CSV file only has column headers but no data rows")
+    return result(errors, data_rows, ["CSV_Data"])
+
+
+# ==============================
+# .xlsx header streaming
+# ==============================
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+def _column_index(cell_ref: str) -> int:
+    index = 0
+    for char in cell_ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + (ord(char.upper()) - 64)
+    return index - 1
+
+
+def _sheet_paths(archive: zipfile.ZipFile):
+    """[(sheet name, worksheet part path)] in workbook order"""
+    targets = {}
+    with archive.open("xl/_rels/workbook.xml.rels") as f:
+        for _, element in iterparse(f):
+            if element.tag == f"{PACKAGE_REL_NS}Relationship":
+                target = element.get("Target")
+                targets[element.get("Id")] = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+    sheets = []
+    with archive.open("xl/workbook.xml") as f:
+        for _, element in iterparse(f):
+            if element.tag == f"{MAIN_NS}sheet":
+                sheets.append((element.get("name"), targets[element.get(f"{REL_NS}id")]))
+    return sheets
+
+
+def _first_row(archive: zipfile.ZipFile, sheet_path: str):
+    """Header cells as (column, type, raw value): the first row holding any value"""
+    cells = []
+    with archive.open(sheet_path) as f:
+        for _, element in iterparse(f):
+            if element.tag != f"{MAIN_NS}row":
+                continue
+            for position, cell in enumerate(element.iter(f"{MAIN_NS}c")):
+                cell_type = cell.get("t", "n")
+                if cell_type == "inlineStr":
+                    value = "".join(t.text or "" for t in cell.iter(f"{MAIN_NS}t"))
+                else:
+                    value_element = cell.find(f"{MAIN_NS}v")
+                    value = value_element.text if value_element is not None else None
+                column = _column_index(cell.get("r")) if cell.get("r") else position
+                if value not in (None, ""):
+                    cells.append((column, cell_type, value))
+            if cells:
+                break  # Only the header row is needed; leading empty (e.g. styled-only) rows are skipped
+            element.clear()
+    return cells
+
+
+def _shared_strings(archive: zipfile.ZipFile, needed: set) -> dict:
+    """Only the shared strings the header rows refer to (stops after the last one)"""
+    if not needed or "xl/sharedStrings.xml" not in archive.namelist():
+        return {}
+    strings, index, last_needed = {}, 0, max(needed)
+    with archive.open("xl/sharedStrings.xml") as f:
+        for _, element in iterparse(f):
+            if element.tag == f"{MAIN_NS}si":
+                if index in needed:
+                    # Plain <t> or rich-text runs <r><t>; phonetic hints (<rPh>) are not part of the value
+                    strings[index] = "".join(t.text or "" for t in element.findall(f"{MAIN_NS}t")) + \
+                        "".join(t.text or "" for t in element.findall(f"{MAIN_NS}r/{MAIN_NS}t"))
+                element.clear()
+                if index >= last_needed:
+                    break
+                index += 1
+    return strings
+
+
+def read_xlsx_headers(path: str):
+    """[(sheet name, header values)] without reading any data rows"""
+    with zipfile.ZipFile(path) as archive:
+        sheets = [(name, _first_row(archive, sheet_path)) for name, sheet_path in _sheet_paths(archive)]
+        needed = {int(value) for _, cells in sheets for _, cell_type, value in cells if cell_type == "s"}
+        strings = _shared_strings(archive, needed)
+
+    result_sheets = []
+    for name, cells in sheets:
+        headers = [None] * (max((column for column, _, _ in cells), default=-1) + 1)
+        for column, cell_type, value in cells:
+            headers[column] = strings.get(int(value)) if cell_type == "s" else value
+        result_sheets.append((name, headers))
+    return result_sheets
+
+
+def is_empty_row(values) -> bool:
+    return all(value is None or (isinstance(value, str) and not value.strip()) for value in values)
+
+
+def read_xlsx_headers_openpyxl(path: str):
+    """Fallback: same result via openpyxl's read-only (streaming) mode"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheets = []
+        for sheet_name in workbook.sheetnames:
+            rows = workbook[sheet_name].iter_rows(values_only=True)
+            headers = next((row for row in rows if not is_empty_row(row)), None)
+            sheets.append((sheet_name, list(headers or [])))
+        return sheets
+    finally:
+        workbook.close()
+
+
+def count_xlsx_rows_openpyxl(path: str, sheet_name: str) -> int:
+    """Fallback count of non-empty rows: stream the sheet through openpyxl"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name]
+        worksheet.reset_dimensions()
+        return sum(1 for row in worksheet.iter_rows(values_only=True) if not is_empty_row(row))
+    finally:
+        workbook.close()
+
+
+def count_xlsx_rows(path: str, sheet_name: str) -> int:
+    """Count the <row> elements of a sheet that hold at least one value
+
+    Scans the decompressed XML bytes instead of parsing cells, which is far
+    faster than iterating the sheet with openpyxl. Rows with only styled empty
+    cells (and the sheet's stored <dimension>, which includes them) are ignored.
+    """
+    with zipfile.ZipFile(path) as archive:
+        sheet_path = dict(_sheet_paths(archive))[sheet_name]
+        rows, tail = 0, b""
+        with archive.open(sheet_path) as f:
+            for chunk in iter(lambda: f.read(COUNT_CHUNK_SIZE), b""):
+                data = tail + chunk
+                starts = [match.start() for match in XLSX_ROW_TAG.finditer(data)]
+                if not starts:
+                    tail = data
+                    continue
+                # The last row may continue in the next chunk: carry it over
+                rows += sum(1 for start, end in zip(starts, starts[1:]) if XLSX_CELL_VALUE.search(data, start, end))
+                tail = data[starts[-1]:]
+        end = tail.find(b"</sheetData>")
+        if XLSX_ROW_TAG.match(tail) and XLSX_CELL_VALUE.search(tail, 0, end if end >= 0 else len(tail)):
+            rows += 1
+    return rows
+
+
+def validate_xlsx(path: str, require_year: bool = True) -> dict:
+    try:
+        sheets = read_xlsx_headers(path)
+        count_rows = count_xlsx_rows
+    except (KeyError, ValueError, SyntaxError):
+        sheets = read_xlsx_headers_openpyxl(path)
+        count_rows = count_xlsx_rows_openpyxl
+
+    if not sheets:
+        return result(["❌ Excel file contains no sheets - please add at least one sheet with data"])
+
+    errors, total_records, valid_sheets = [], 0, []
+    for sheet_name, headers in sheets:
+        if require_year and not YEAR_PATTERN.search(sheet_name):
+            errors.append(f"❌ Sheet name \"{sheet_name}\" must include a 4-digit year "
+                          f"(e.g., \"2023\", \"Accidents_2024\", or \"Data_2025\")")
+
+        if not headers or is_empty_row(headers):
+            errors.append(f"❌ Sheet \"{sheet_name}\" is completely empty - please add data to this sheet")
+            continue
+
+        errors.extend(check_columns(headers, f"Sheet \"{sheet_name}\""))
+
+        data_rows = count_rows(path, sheet_name) - 1  # Non-empty rows after the header
+        if data_rows < 1:
+            errors.append(f"❌ Sheet \"{sheet_name}\" only has column headers but no data rows")
+        else:
+            total_records += data_rows
+            valid_sheets.append(sheet_name)
+    return result(errors, total_records, valid_sheets)
+
+
+def result(errors, records: int = 0, sheets=None) -> dict:
+    valid = not errors
+    return {
+        "valid": valid,
+        "errors": errors,
+        "recordsProcessed": records if valid else 0,
+        "sheetsProcessed": (sheets or []) if valid else [],
+    }
+
+
+def validate_upload(path: str, require_year: bool = True) -> dict:
+    """Validate an uploaded .csv/.xlsx by its header rows; returns None for unsupported formats"""
+    extension = os.path.splitext(path)[1].lower()
+    started = time.perf_counter()
+    if extension == ".csv":
+        report = validate_csv(path)
+    elif extension in (".xlsx", ".xlsm"):
+        report = validate_xlsx(path, require_year)
+    else:
+        return None
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate an upload's sheets and header rows")
+    parser.add_argument("path", help="Uploaded .csv or .xlsx file")
+    parser.add_argument("--no-require-year", action="store_true", help="Don't require a year in sheet names")
+    args = parser.parse_args()
+
+    try:
+        report = validate_upload(args.path, require_year=not args.no_require_year)
+    except FileNotFoundError:
+        report = result(["❌ File could not be found - please try uploading again"])
+    except Exception:
+        report = result(["❌ Unable to read file - it may be corrupted, password-protected, or have an invalid format"])
+
+    if report is None:
+        sys.exit(EXIT_UNSUPPORTED)
+    print(json.dumps(report, ensure_ascii=False))
+    sys.exit(0)
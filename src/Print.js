@@ -6,6 +6,7 @@ import { supabase } from './supabaseClient';
 import { DateTime } from './DateTime';
 import { logSystemEvent } from './utils/loggingUtils';
 import { LoadingSpinner } from './components/LoadingSpinner'; 
+import { dangerLevelFor, CRITICAL_THRESHOLD } from './utils/dangerLevels';
 
 const fetchAllRecords = async (tableName, orderField = 'id', filters = {}) => {
   const pageSize = 1000;
@@ -420,7 +421,7 @@ function Print() {
             </div>
             <div className="border-2 border-blue-300 p-3 text-center bg-blue-50">
               <p className="text-sm font-semibold text-blue-600 mb-1">HIGH-RISK ZONES</p>
-              <p className="text-3xl font-bold text-blue-700">{clusters.filter(c => c.danger_score > 0.7).length}</p>
+              <p className="text-3xl font-bold text-blue-700">{clusters.filter(c => c.danger_score > CRITICAL_THRESHOLD).length}</p>
             </div>
             <div className="border-2 border-orange-300 p-3 text-center bg-orange-50">
               <p className="text-sm font-semibold text-orange-600 mb-1">LOCATIONS AFFECTED</p>
@@ -574,7 +575,7 @@ function Print() {
           {clusters.length > 0 ? (
             <>
               <div className="mb-3 p-2 bg-yellow-50 border-l-4 border-yellow-500">
-                <p className="font-semibold text-yellow-800 text-sm">⚠️ ALERT: {clusters.filter(c => c.danger_score > 0.7).length} locations identified as CRITICAL RISK zones</p>
+                <p className="font-semibold text-yellow-800 text-sm">⚠️ ALERT: {clusters.filter(c => c.danger_score > CRITICAL_THRESHOLD).length} locations identified as CRITICAL RISK zones</p>
               </div>
               <table className="w-full border-collapse border border-gray-300 text-sm">
                 <thead>
@@ -589,7 +590,7 @@ function Print() {
                 </thead>
                 <tbody>
                   {clusters.slice(0, 15).map((c, index) => {
-                    const dangerLevel = c.danger_score > 0.7 ? 'CRITICAL' : c.danger_score > 0.5 ? 'HIGH' : c.danger_score > 0.3 ? 'MODERATE' : 'LOW';
+                    const dangerLevel = dangerLevelFor(c.danger_score);
                     const dangerColor = dangerLevel === 'CRITICAL' ? 'bg-red-100' : dangerLevel === 'HIGH' ? 'bg-orange-100' : dangerLevel === 'MODERATE' ? 'bg-yellow-100' : '';
                     return (
                       <tr key={c.cluster_id} className={dangerColor}>
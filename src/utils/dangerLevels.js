@@ -0,0 +1,17 @@
+/**
+ * Cluster danger_score bands (0..1), highest first.
+ * A score belongs to the first band whose threshold it exceeds; anything else is LOW.
+ * backend/hotspot_service.py mirrors these in DANGER_LEVELS (a backend test keeps them equal).
+ */
+export const DANGER_LEVELS = [
+  { threshold: 0.7, level: 'CRITICAL' },
+  { threshold: 0.5, level: 'HIGH' },
+  { threshold: 0.3, level: 'MODERATE' },
+];
+
+export const dangerLevelFor = (score) => {
+  const band = DANGER_LEVELS.find(({ threshold }) => score > threshold);
+  return band ? band.level : 'LOW';
+};
+
+export const CRITICAL_THRESHOLD = DANGER_LEVELS[0].threshold;